@@ -8,6 +8,7 @@ from agents.llm_agents.all_characters_list import ALL_CHARACTERS
 from all_classes.manager_class import ManagerAgent
 from entities import MANAGER
 from run_one_test import test_active_one_session
+from services.logging_service import configure_logging
 
 advisory_manager = None
 keep_running = True
@@ -69,6 +70,7 @@ async def run_main_test():
 
 
 if __name__ == "__main__":
+    configure_logging()
     signal.signal(signal.SIGINT, signal_handler)
     if hasattr(signal, 'SIGTERM'):
         signal.signal(signal.SIGTERM, signal_handler)
@@ -1,15 +1,23 @@
-import json
-import os
-from openai import OpenAI
-from google import genai
-from anthropic import Anthropic
+import time
+from contextlib import contextmanager
 from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel
-from entities import PROJECT_NAME, DEFAULT_CLAUDE_MODEL, SECRET_SERVICE_NAME
-from services.secret_manager_service import SecretManagerService
+from entities import DEFAULT_CLAUDE_MODEL
+from services.llm_client_registry import LLM_CLIENTS
+from services.metrics_service import METRICS
+from services.logging_service import get_logger
+from services.tracing_service import start_span
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = get_logger(__name__)
+
+LLM_LATENCY = METRICS.histogram("llm_request_duration_seconds", "LLM provider request time per agent and provider")
+LLM_ERRORS = METRICS.counter("llm_request_errors_total", "Failed LLM provider requests per agent and provider")
+LLM_RATE_LIMITED = METRICS.counter(
+    "llm_rate_limited_total", "LLM provider requests rejected with HTTP 429, per agent and provider"
+)
+
 
 class UserRequest(BaseModel):
     request: str
@@ -23,22 +31,26 @@ class LLMBaseAgent:
         self.agent_charcter = ""
         self.event_description = ""
         self.system_prompt = ""
+        self.system_prompt_template = None
         self.user_prompt = ""
         self.output_classes = UserRequest
+        self.response_field = "next_message"  # Field of the parsed output to return; None returns the whole model
         self.available_actions = []
         self.available_handlers = []
         self.system_message = ""
-        self.secret_manager = SecretManagerService(SECRET_SERVICE_NAME)
 
-        self.anthropic_client = Anthropic(
-            api_key=self._get_anthropic_api_key(),
-        )
-        self.gemini_client = genai.client.Client(
-            api_key=self._get_gemini_api_key(),
-        )
-        self.openai_client = OpenAI(
-            api_key=self._get_openai_api_key(),
-        )
+    # SDK clients are shared by every agent in the process; an agent only looks them up when it calls a provider
+    @property
+    def anthropic_client(self):
+        return LLM_CLIENTS.anthropic()
+
+    @property
+    def openai_client(self):
+        return LLM_CLIENTS.openai()
+
+    @property
+    def gemini_client(self):
+        return LLM_CLIENTS.gemini()
 
     def update_agent_info(self, agent_info):
         self.agent_name = agent_info.get("agent_name", "")
@@ -60,7 +72,9 @@ class LLMBaseAgent:
         self.user_prompt = self.get_user_prompt(chat_history)
 
     def get_system_prompt(self):
-        return self.system_prompt.format(
+        # Agents that run on every turn of a session keep the unformatted prompt in system_prompt_template
+        template = self.system_prompt_template if self.system_prompt_template is not None else self.system_prompt
+        return template.format(
             agent_name=self.agent_name,
             agent_character=self.agent_charcter,
             event_description=self.event_description,
@@ -80,22 +94,22 @@ class LLMBaseAgent:
             max_tokens=1000,
             model=DEFAULT_CLAUDE_MODEL
     ):
-        message = self.anthropic_client.messages.create(
-            model=model,
-            max_tokens=max_tokens,
-            system=self.system_prompt,
-            messages=[
-                {
-                    "role": "user",
-                    "content": self.user_prompt
-                },
-            ]
-        )
+        with self._track_llm_call("anthropic"):
+            message = self.anthropic_client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                system=self.system_prompt,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": self.user_prompt
+                    },
+                ]
+            )
         try:
-            parsed_response = self.output_parser.parse(message.content[0].text)
-            return parsed_response.next_message
+            return self._parse_response(message.content[0].text)
         except Exception as e:
-            print(f"Error parsing response: {e}")
+            logger.error("%s error parsing response: %s", self.agent_name, e)
             return None
 
     def generate_response_from_openai(
@@ -108,18 +122,18 @@ class LLMBaseAgent:
             {"role": "user", "content": self.user_prompt}
         ]
         try:
-            response = self.openai_client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=0.7
-            )
+            with self._track_llm_call("openai"):
+                response = self.openai_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=0.7
+                )
 
             response_text = response.choices[0].message.content
-            parsed_response = self.output_parser.parse(response_text)
-            return parsed_response.next_message
+            return self._parse_response(response_text)
         except Exception as e:
-            print(f"Error generating OpenAI response: {e}")
+            logger.error("%s error generating OpenAI response: %s", self.agent_name, e)
             return None
 
     def generate_response_from_gemini(
@@ -128,43 +142,37 @@ class LLMBaseAgent:
     ):
         full_prompt = f"{self.system_prompt}\n\nUser: {self.user_prompt}"
         try:
-            response = self.gemini_client.models.generate_content(
-                model=f"models/{model}",
-                contents=[{
-                    "parts": [{"text": full_prompt}]
-                }],
-            )
+            with self._track_llm_call("gemini"):
+                response = self.gemini_client.models.generate_content(
+                    model=f"models/{model}",
+                    contents=[{
+                        "parts": [{"text": full_prompt}]
+                    }],
+                )
 
             response_text = response.candidates[0].content.parts[0].text
-            parsed_response = self.output_parser.parse(response_text)
-            return parsed_response.next_message
+            return self._parse_response(response_text)
         except Exception as e:
-            print(f"Error generating Gemini response: {e}")
+            logger.error("%s error generating Gemini response: %s", self.agent_name, e)
             return None
 
-    def _get_anthropic_api_key(self):
-        try:
-            secrets = json.loads(self.secret_manager.access_secret(PROJECT_NAME))
-            anthropic_api_key = secrets["claude_key"]
-        except Exception as e:
-            print(f"Error accessing Anthropic API key from secret manager: {e}")
-            anthropic_api_key = os.getenv("LOCAL_CLAUDE_KEY")
-        return anthropic_api_key
-
-    def _get_openai_api_key(self):
-        try:
-            secrets = json.loads(self.secret_manager.access_secret(PROJECT_NAME))
-            openai_api_key = secrets["openai_key"]
-        except Exception as e:
-            print(f"Error accessing OpenAI API key from secret manager: {e}")
-            openai_api_key = os.getenv("LOCAL_OPENAI_KEY")
-        return openai_api_key
+    def _parse_response(self, response_text):
+        parsed_response = self.output_parser.parse(response_text)
+        if self.response_field is None:
+            return parsed_response
+        return getattr(parsed_response, self.response_field)
 
-    def _get_gemini_api_key(self):
+    @contextmanager
+    def _track_llm_call(self, provider):
+        """Record latency, failures and a trace span for one provider request of this agent"""
+        start_time = time.perf_counter()
         try:
-            secrets = json.loads(self.secret_manager.access_secret(PROJECT_NAME))
-            gemini_api_key = secrets["gemini_key"]
+            with start_span(f"llm.{provider}", agent=self.agent_name):
+                yield
         except Exception as e:
-            print(f"Error accessing Gemini API key from secret manager: {e}")
-            gemini_api_key = os.getenv("LOCAL_GEMINI_KEY")
-        return gemini_api_key
+            LLM_ERRORS.inc(agent=self.agent_name, provider=provider)
+            if getattr(e, "status_code", None) == 429 or getattr(e, "code", None) == 429:
+                LLM_RATE_LIMITED.inc(agent=self.agent_name, provider=provider)
+            raise
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - start_time, agent=self.agent_name, provider=provider)
@@ -1,7 +1,11 @@
 from entities import PATIENT
+from helper_methods import hash_user_id
 from agents.llm_agents.all_characters_list import ALL_CHARACTERS
 from agents.llm_agents.llm_fake_patient_agent import LLMFakeUserAgent
 from services.pubsub_functions import PubsubFunctions
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
 
 
 class UserAgent(PubsubFunctions):
@@ -10,21 +14,24 @@ class UserAgent(PubsubFunctions):
             agent_name,
             agent_character,
             agent_permissions,
+            pubsub_backend=None,
     ):
-        super().__init__(agent_permissions, agent_name)
+        super().__init__(agent_permissions, agent_name, pubsub_backend)
         self.llm_options = LLMFakeUserAgent(agent_character[0], agent_character[1])
         self.agent_name = agent_name
 
     def handle_incoming_message(self, message):
-        print(f"TestAgent received message: {message}")
+        logger.info("%s received message", self.agent_name, extra={"size": len(str(message))})
 
-    def publish_one_message(self, message: str, topic: str):
+    def publish_one_message(self, message: str, topic: str, ordering_key: str = None):
         if self.sending_to and topic in self.sending_to:
             try:
-                print(f"{self.agent_name} Publishing to topic: {topic}, message: {message}")
-                self.pubsub_service.publish_message(topic, message)
+                if ordering_key is None and isinstance(message, dict) and message.get("user_id"):
+                    ordering_key = hash_user_id(message["user_id"])
+                logger.debug("%s publishing to topic %s", self.agent_name, topic)
+                self.pubsub_service.publish_message(topic, message, ordering_key=ordering_key)
             except Exception as e:
-                print(f"{self.agent_name} Failed to publish message: {message}", e)
+                logger.error("%s failed to publish message: %s", self.agent_name, e)
 
     @staticmethod
     def get_one_patient_data(patinet_idx):
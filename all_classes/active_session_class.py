@@ -1,54 +1,117 @@
 import threading
 from talk_to_mongo import MongoConnection
 from medical_analyzer import MedicalAnalyzerCoordinator
+from medical_analyzer.emergency_detection_agent import EmergencyAnalysis
+from medical_analyzer.medical_details_agent import MedicalDetailsAnalysis
+from medical_analyzer.staff_analysis_agent import StaffAnalysis
+from services.logging_service import get_logger
+from services.tracing_service import start_span
+
+logger = get_logger(__name__)
+
+# Agent results stored as plain dicts in the session document, and the models the coordinator expects back
+STORED_ANALYSIS_MODELS = {
+    "emergency_analysis": EmergencyAnalysis,
+    "staff_analysis": StaffAnalysis,
+    "details_analysis": MedicalDetailsAnalysis,
+}
 
 
 class ActiveSession:
     def __init__(
             self,
             session_id: str,
-            user_id: str
+            user_id: str,
+            session_doc: dict = None
     ):
         self.session_id = session_id
         self.user_id = user_id
         self._lock = threading.Lock()
-        self.mongo_connection = MongoConnection()
-        self.medical_analyzer = MedicalAnalyzerCoordinator()
+        self._persist_lock = threading.Lock()
+        self._persist_pending = False  # Analysis results not written to Mongo yet
+        self._work_lock = threading.Lock()
+        self._pending_work = 0  # Messages of this session still buffered or queued in the manager pipeline
         self.medical_analysis_results = None
         self.session_guidance = None
-        print(f"user: {user_id} activated new session")
-        self.mongo_connection.create_new_session(session_id, user_id)
+        self._case_inputs = {}  # Latest known value of each case field, carried across turns
+        with start_span("session.create", session=session_id[:8]):
+            self.mongo_connection = MongoConnection()
+            self.medical_analyzer = MedicalAnalyzerCoordinator()
+            if session_doc:
+                # Returning user whose session was evicted from memory; its document already exists
+                self._restore(session_doc)
+                logger.info("Rehydrated session", extra={"session": session_id[:8]})
+            else:
+                logger.info("Activated new session", extra={"session": session_id[:8]})
+                self.mongo_connection.create_new_session(session_id, user_id)
+
+    def _restore(self, session_doc):
+        stored_analysis = session_doc.get("medical_analysis")
+        if not stored_analysis:
+            return
+        self.medical_analysis_results = {}
+        for key, model in STORED_ANALYSIS_MODELS.items():
+            analysis = stored_analysis.get(key)
+            if analysis:
+                try:
+                    analysis = model(**analysis)
+                except Exception as e:
+                    logger.warning("Could not restore %s: %s", key, e, extra={"session": self.session_id[:8]})
+                    analysis = None
+            self.medical_analysis_results[key] = analysis
+        self.medical_analysis_results["session_guidance"] = stored_analysis.get("session_guidance")
+        self.session_guidance = stored_analysis.get("session_guidance")
 
     def analyze_medical_case(self, patient_info, chief_complaint, symptoms="", medical_history="",
                              medications="", allergies="", vital_signs="", physical_exam="",
-                             additional_info="", severity="", duration=""):
+                             additional_info="", severity="", duration="", persist=True):
         """
         Perform comprehensive medical case analysis and update session guidance.
+        Fields left empty keep their value from earlier turns, and only the agents that read a
+        field whose value changed are run again. With persist=False the Mongo write is left to a
+        later persist_analysis() call.
         """
-        with self._lock:
-            self.medical_analysis_results = self.medical_analyzer.analyze_medical_case(
-                patient_info=patient_info,
-                chief_complaint=chief_complaint,
-                symptoms=symptoms,
-                medical_history=medical_history,
-                medications=medications,
-                allergies=allergies,
-                vital_signs=vital_signs,
-                physical_exam=physical_exam,
-                additional_info=additional_info,
-                severity=severity,
-                duration=duration
+        new_inputs = dict(
+            patient_info=patient_info, chief_complaint=chief_complaint, symptoms=symptoms,
+            medical_history=medical_history, medications=medications, allergies=allergies,
+            vital_signs=vital_signs, physical_exam=physical_exam, additional_info=additional_info,
+            severity=severity, duration=duration
+        )
+        with start_span("session.analyze_medical_case", session=self.session_id[:8]) as span, self._lock:
+            case = dict(self._case_inputs or new_inputs)
+            case.update((field, value) for field, value in new_inputs.items() if value)
+            changed_fields = {field for field, value in case.items() if value != self._case_inputs.get(field)}
+            if self.medical_analysis_results is None or not self._case_inputs:
+                # First analysis, or a rehydrated session whose inputs were not kept: run every agent
+                changed_fields = None
+            span.set_attribute("changed_fields", sorted(changed_fields) if changed_fields is not None else "all")
+
+            self.medical_analysis_results = self.medical_analyzer.reanalyze_medical_case(
+                case, self.medical_analysis_results, changed_fields
             )
-
+            self._case_inputs = case
             self.session_guidance = self.medical_analysis_results["session_guidance"]
+            if changed_fields is not None and not changed_fields:
+                logger.info("Case unchanged, reusing previous analysis", extra={"session": self.session_id[:8]})
+                return self.medical_analysis_results
+
+            self._persist_pending = True
+            if persist:
+                self.persist_analysis()
+
+            return self.medical_analysis_results
 
-            # Store analysis results in MongoDB
+    def persist_analysis(self):
+        """Store the latest analysis results in MongoDB if they changed since the last write"""
+        with self._persist_lock:
+            if not self._persist_pending:
+                return False
+            self._persist_pending = False
             self.mongo_connection.store_medical_analysis(
                 self.session_id,
                 self.medical_analysis_results
             )
-
-            return self.medical_analysis_results
+            return True
 
     def get_emergency_status(self):
         """
@@ -102,5 +165,22 @@ class ActiveSession:
         emergency_status = self.get_emergency_status()
         return emergency_status and emergency_status.get("is_emergency", False)
 
+    def hold(self):
+        """Count one more message of this session in flight; the session is not evicted until it is released"""
+        with self._work_lock:
+            self._pending_work += 1
+
+    def release(self):
+        with self._work_lock:
+            self._pending_work -= 1
+
+    def is_busy(self):
+        """True while messages of this session are in flight, an analysis runs or its results are not stored yet"""
+        return self._pending_work > 0 or self._lock.locked() or self._persist_pending
+
     def cleanup(self):
-        pass
+        """Release the session's connections once it is evicted from memory"""
+        try:
+            self.mongo_connection.close()
+        except Exception as e:
+            logger.warning("Error closing session Mongo connection: %s", e, extra={"session": self.session_id[:8]})
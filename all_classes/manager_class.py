@@ -1,10 +1,81 @@
 import asyncio
-import hashlib
+import os
 import threading
 import time
+from concurrent.futures import Future, InvalidStateError
 from agents.llm_agents.llm_manager_agent import LLMManagerAgent
 from all_classes.active_session_class import ActiveSession
+from all_classes.message_coalescer_class import MessageCoalescer
+from all_classes.session_store_class import SessionStore
+from entities import MANAGER_TO_PATINET, MANAGER_TO_PATIENT_EMERGENCY, MANAGER_CONTROL
+from helper_methods import hash_user_id
+from medical_analyzer.red_flag_matcher import RED_FLAG_MATCHER
+from services.emergency_alert_publisher import EmergencyAlertPublisher
 from services.pubsub_functions import PubsubFunctions
+from services.metrics_service import METRICS, start_metrics_server
+from services.logging_service import get_logger
+from services.priority_work_queue import PRIORITY_CLASSES, priority_rank
+from services.staged_pipeline import PipelineStage, StagedPipeline, stage_from_env
+from services.shard_ring import ShardAssignment, SHARD_REBALANCE_MESSAGE
+from services.tracing_service import start_span
+from talk_to_mongo import MongoConnection
+
+logger = get_logger(__name__)
+
+ACTIVE_SESSIONS = METRICS.gauge("manager_active_sessions", "Sessions held in ManagerAgent.active_sessions")
+SESSION_BUILD_STRIPES = 64
+SESSION_BUILD_SECONDS = METRICS.histogram("manager_session_build_seconds", "Time to build or rehydrate a session")
+PRETRIAGE_ALERTS = METRICS.counter("pretriage_alerts_total", "Emergency alerts sent by local pre-triage")
+PRETRIAGE_ALERT_SECONDS = METRICS.histogram(
+    "pretriage_alert_seconds", "Message handling start until the pre-triage emergency alert was confirmed"
+)
+PRETRIAGE_LLM_OUTCOME = METRICS.counter(
+    "pretriage_llm_outcome_total", "LLM emergency analysis after a pre-triage alert: confirmed, overruled or failed"
+)
+SESSIONS_REHYDRATED = METRICS.counter(
+    "manager_sessions_rehydrated_total", "Sessions rebuilt from their Mongo document after eviction"
+)
+SHARD_FOREIGN_MESSAGES = METRICS.counter(
+    "manager_shard_foreign_messages_total", "Messages skipped because another shard owns the user"
+)
+HANDOFF_TIMEOUT_SECONDS = 30
+SENDER_PRIORITY_CAP = "urgent"  # Highest "priority" a message payload can ask for
+
+
+class MedicalAnalysisFailed(Exception):
+    """The LLM analysis of a case produced no emergency assessment (provider error or unparsable reply)"""
+
+
+class _CaseJob:
+    """
+    One message, or a coalesced burst of them, on its way through the manager pipeline. waiters are
+    the Futures handed back to Pub/Sub for its messages, which are acked once finish() completes them.
+    """
+    __slots__ = ("user_id", "session_id", "message", "message_id", "triage", "priority", "session", "case",
+                 "analyzed_at", "error", "waiters")
+
+    def __init__(self, user_id, message, triage, priority, waiters=None):
+        self.user_id = user_id
+        self.session_id = hash_user_id(user_id)
+        self.message = message
+        self.message_id = message.get("message_id") if isinstance(message, dict) else None
+        self.triage = triage
+        self.priority = priority
+        self.session = None
+        self.case = None
+        self.analyzed_at = None
+        self.error = None  # Reported when the job finishes, after the remaining stages ran
+        self.waiters = [Future()] if waiters is None else waiters
+
+    def finish(self, error=None):
+        for waiter in self.waiters:
+            try:
+                if error is None:
+                    waiter.set_result(True)
+                else:
+                    waiter.set_exception(error)
+            except InvalidStateError:
+                pass  # Already completed
 
 
 class ManagerAgent(PubsubFunctions):
@@ -12,7 +83,8 @@ class ManagerAgent(PubsubFunctions):
             self,
             agent_name,
             agent_character,
-            agent_permissions
+            agent_permissions,
+            pubsub_backend=None
     ):
         self._lock = threading.Lock()
         self.running = False
@@ -21,14 +93,50 @@ class ManagerAgent(PubsubFunctions):
         self.init_callback = None
         self.init_event = threading.Event()
 
-        self.active_sessions: dict[str, ActiveSession] = {}
+        self.active_sessions = SessionStore.from_env(
+            name=f"{agent_name}-sessions",
+            on_evict=lambda *_: ACTIVE_SESSIONS.set(len(self.active_sessions), manager=self.agent_name),
+        )
+        self._mongo_connection = None  # For session lookups, opened on the first new session
+        # Sessions under construction, striped by session id: hashed user id -> Future of the session
+        self._session_builds = [(threading.Lock(), {}) for _ in range(SESSION_BUILD_STRIPES)]
+        # ingest -> extract -> analyze -> persist -> respond, each stage with its own workers and bounded queue.
+        # A session's jobs run one at a time and in arrival order at every stage. Between extract and analyze,
+        # bursts of medical messages from one session are merged into one analysis; the analyze stage holds
+        # workers back for emergencies and is fed only by the coalescer, which keeps at most one batch per
+        # session in it, so its queue is not bounded. A message is acked once its job leaves the pipeline
+        self._pipeline = StagedPipeline(f"{agent_name}-pipeline", [
+            stage_from_env("ingest", self._ingest_stage, workers=4),
+            stage_from_env("extract", self._extract_stage, workers=1),
+            PipelineStage(
+                "analyze",
+                self._analyze_stage,
+                int(os.getenv("MANAGER_ANALYSIS_WORKERS", "8")),
+                int(os.getenv("MANAGER_RESERVED_EMERGENCY_WORKERS", "2")),
+                0,
+            ),
+            stage_from_env("persist", self._persist_stage, workers=2),
+            stage_from_env("respond", self._respond_stage, workers=1),
+        ], key=lambda job: job.session_id, on_error=lambda job, error: job.finish(error))
+        self._coalescer = MessageCoalescer.from_env(
+            self._analyze_coalesced, self._pipeline.queues["analyze"], name=f"{agent_name}-coalescer"
+        )
         self._lock = threading.Lock()
         self._running = False
-        print("Manager Agent initialized")
+        # Which users this process serves when several managers share the load (MANAGER_SHARD_COUNT > 1)
+        self._shard = ShardAssignment.from_env()
+        logger.info("Manager Agent initialized", extra={"shard": self._shard.index, "shards": self._shard.shard_count})
         self.agent_name = agent_name
 
-        super().__init__(agent_permissions, agent_name)
+        super().__init__(agent_permissions, agent_name, pubsub_backend,
+                         subscription_suffix=self._shard.subscription_suffix)
         self.llm_options = LLMManagerAgent(agent_character[0], agent_character[1])
+        # Alerts skip the shared publisher: own client, own topic, confirmed before send returns
+        self._emergency_publisher = EmergencyAlertPublisher.from_env(
+            self.pubsub_service,
+            f"{MANAGER_TO_PATIENT_EMERGENCY}{self.pubsub_postfix}",
+            fallback=lambda alert: self.publish_one_message(alert, f"{MANAGER_TO_PATINET}{self.pubsub_postfix}"),
+        )
 
     def set_init_callback(self, callback):
         self.init_callback = callback
@@ -58,100 +166,317 @@ class ManagerAgent(PubsubFunctions):
             await asyncio.sleep(0.1)
         return self.initialized
 
-    def stop(self):
+    def stop(self, drain_timeout=None):
+        """Drain in-flight messages (see PubSubService.close) and stop; returns the drain report"""
         self.running = False
+        report = None
+        # Start the buffered analyses now; messages handled while draining are then analyzed without a window
+        self._coalescer.stop(timeout=0)
         if hasattr(self, 'pubsub_service'):
-            self.pubsub_service.close()
+            # Waits for the jobs in the pipeline, whose messages are only acked when they finish; the
+            # messages of jobs that miss the deadline are nacked, so their queued work is dropped here
+            report = self.pubsub_service.close(drain_timeout=drain_timeout)
+        self._pipeline.shutdown(timeout=0, discard_pending=True)
+        self._emergency_publisher.stop()
+        self.active_sessions.stop()
         if hasattr(self, 'listener_thread') and self.listener_thread and self.listener_thread.is_alive():
             self.listener_thread.join(timeout=2)
+        return report
 
     def start(self):
         self.running = True
         try:
+            start_metrics_server()
             self.initialize()
             while self.running:
                 time.sleep(1)
 
         except KeyboardInterrupt:
-            print("\nShutting down gracefully...")
+            logger.info("Shutting down gracefully...")
         except Exception as e:
-            print(f"Error in message listener: {str(e)}")
+            logger.exception("Error in message listener: %s", e)
         finally:
+            self._coalescer.stop(timeout=0)
             if hasattr(self, 'pubsub_service'):
                 self.pubsub_service.close()
+            self._pipeline.shutdown(timeout=0, discard_pending=True)
             self.running = False
 
-    def publish_one_message(self, message, topic):
-        pass
+    def publish_one_message(self, message, topic, ordering_key=None):
+        if topic not in self.sending_to:
+            logger.error("%s is not allowed to publish to %s", self.agent_name, topic)
+            return None
+        if ordering_key is None and isinstance(message, dict):
+            if message.get("session_id"):
+                ordering_key = message["session_id"]
+            elif message.get("user_id"):
+                ordering_key = hash_user_id(message["user_id"])
+        return self.pubsub_service.publish_message(topic, message, ordering_key=ordering_key)
 
     def get_or_create_session(self, user_id: str) -> ActiveSession:
         """Get existing session or create new one for hashed user_id"""
-        hashed_user_id = hashlib.sha256(user_id.encode()).hexdigest()
+        hashed_user_id = hash_user_id(user_id)
         
+        session = self.active_sessions.get(hashed_user_id)
+        if session is not None:
+            return session
+
+        # Single flight per user: the first caller builds, concurrent first messages of that user wait for it,
+        # and other users are not blocked since the build runs outside any shared lock
+        stripe_lock, builds = self._session_builds[int(hashed_user_id[:8], 16) % SESSION_BUILD_STRIPES]
+        with stripe_lock:
+            session = self.active_sessions.get(hashed_user_id)
+            if session is not None:
+                return session
+            build = builds.get(hashed_user_id)
+            is_builder = build is None
+            if is_builder:
+                build = builds[hashed_user_id] = Future()
+
+        if not is_builder:
+            return build.result()
+
+        try:
+            with start_span("manager.get_or_create_session"), SESSION_BUILD_SECONDS.time():
+                new_session = self._build_session(hashed_user_id, user_id)
+            build.set_result(new_session)
+            return new_session
+        except Exception as e:
+            build.set_exception(e)
+            raise
+        finally:
+            with stripe_lock:
+                builds.pop(hashed_user_id, None)
+
+    def _build_session(self, hashed_user_id, user_id):
+        # Not in memory: either a new user, or one whose session was evicted and lives on in Mongo
         with self._lock:
-            if hashed_user_id in self.active_sessions:
-                return self.active_sessions[hashed_user_id]
-            else:
-                # Create new session with hashed user_id as session_id
-                new_session = ActiveSession(hashed_user_id, user_id)
-                self.active_sessions[hashed_user_id] = new_session
-                print(f"Created new session for user {user_id} with hash {hashed_user_id[:8]}...")
-                return new_session
+            if self._mongo_connection is None:
+                self._mongo_connection = MongoConnection()
+        session_doc = self._mongo_connection.get_session(hashed_user_id)
+
+        # Create new session with hashed user_id as session_id
+        new_session = ActiveSession(hashed_user_id, user_id, session_doc=session_doc)
+        self.active_sessions.put(hashed_user_id, new_session)
+        ACTIVE_SESSIONS.set(len(self.active_sessions), manager=self.agent_name)
+        if session_doc:
+            SESSIONS_REHYDRATED.inc(manager=self.agent_name)
+        else:
+            logger.info("Created new session", extra={"session": hashed_user_id[:8]})
+        return new_session
+
+    def get_session_stats(self):
+        stats = self.active_sessions.get_stats()
+        stats["rehydrated"] = SESSIONS_REHYDRATED.get(manager=self.agent_name)
+        stats["coalescer_pending"] = self._coalescer.pending()
+        stats["pipeline"] = self._pipeline.get_stats()
+        stats["shard"] = self._shard.index
+        stats["shard_count"] = self._shard.shard_count
+        return stats
+
+    def rebalance(self, shard_count):
+        """
+        Move to a ring of shard_count shards. Sessions of users that now belong to another shard get their
+        buffered messages analyzed, then are evicted once idle; their state is in Mongo, and the new owner
+        rehydrates it on the user's next message. Runs in the background and returns the handoff thread.
+        A session stays busy while any of its messages is buffered, queued or being analyzed (the hold taken
+        at ingest), so the handoff never evicts one before its last analysis is persisted.
+        """
+        still_member = self._shard.rebalance(shard_count)
+        if not still_member:
+            logger.warning("Shard %s is not part of a %s shard ring anymore and can be stopped",
+                           self._shard.index, shard_count)
+
+        def moved_away(session_id):
+            return not self._shard.owns(session_id)
+
+        def hand_off():
+            moved = [session_id for session_id in self.active_sessions.session_ids() if moved_away(session_id)]
+            self._coalescer.flush(moved)
+            deadline = time.monotonic() + HANDOFF_TIMEOUT_SECONDS
+            busy = self.active_sessions.evict_matching(moved_away, "handoff")
+            while busy and time.monotonic() < deadline:
+                time.sleep(0.2)  # Wait for the flushed and queued analyses to finish and persist
+                busy = self.active_sessions.evict_matching(moved_away, "handoff")
+            ACTIVE_SESSIONS.set(len(self.active_sessions), manager=self.agent_name)
+            logger.info("Shard handoff finished", extra={
+                "shard": self._shard.index, "moved": len(moved), "still_busy": busy
+            })
+
+        thread = threading.Thread(target=hand_off, daemon=True, name=f"{self.agent_name}-handoff")
+        thread.start()
+        return thread
+
+    def message_handler_for(self, topic):
+        if topic == MANAGER_CONTROL:
+            return self.handle_control_message
+        return self.handle_incoming_message
+
+    def handle_control_message(self, message):
+        """Operator commands from the internal control topic; anything malformed is logged and dropped"""
+        if not isinstance(message, dict) or message.get("type") != SHARD_REBALANCE_MESSAGE:
+            logger.warning("Unknown control message dropped", extra={"size": len(str(message))})
+            return
+        try:
+            self.rebalance(message.get("shard_count"))
+        except ValueError as e:
+            logger.warning("Invalid shard rebalance dropped: %s", e)
 
     def handle_incoming_message(self, message):
-        print(f"ManagerAgent received message: {message}")
+        logger.info("ManagerAgent received message", extra={"size": len(str(message)), "sample_rate": 0.1})
         if hasattr(message, 'user_id') or (isinstance(message, dict) and 'user_id' in message):
             user_id = message.user_id if hasattr(message, 'user_id') else message['user_id']
-            session = self.get_or_create_session(user_id)
-            print(f"Message routed to session: {session.session_id[:8]}...")
-            
-            # Trigger medical analysis if this is a new medical case
-            if self._is_medical_case_message(message):
-                self._process_medical_case(session, message)
-                
+            if not self._shard.owns(hash_user_id(user_id)):
+                SHARD_FOREIGN_MESSAGES.inc(manager=self.agent_name)
+                return
+            start_time = time.perf_counter()
+            triage = self._pre_triage(message)
+            if triage is not None and triage.is_emergency:
+                # Clear red flags: alert before building the session or waiting for the LLM, which confirms later
+                self._send_emergency_alert(hash_user_id(user_id), triage.to_emergency_status(), start_time)
+                PRETRIAGE_ALERTS.inc(manager=self.agent_name)
+                PRETRIAGE_ALERT_SECONDS.observe(time.perf_counter() - start_time)
+                logger.warning("EMERGENCY PRE-TRIAGE: %s", ", ".join(triage.reasons),
+                               extra={"session": hash_user_id(user_id)[:8]})
+
+            # Session lookup, extraction, analysis and the reply continue on the pipeline's own workers;
+            # the returned Future completes when they are done, and only then is the message acked
+            job = _CaseJob(user_id, message, triage, self._message_priority(message, triage))
+            job.waiters[0].add_done_callback(lambda waiter: self._send_reply(job, waiter))
+            self._pipeline.submit("ingest", job, job.priority)
+            return job.waiters[0]
+
         else:
-            print("Warning: Message does not contain user_id")
+            logger.warning("Message does not contain user_id")
     
     @staticmethod
-    def _is_medical_case_message(message):
-        """Check if message contains medical case information that needs analysis"""
-        if isinstance(message, dict):
-            medical_keywords = ['symptoms', 'chief_complaint', 'medical_history', 'pain', 'fever', 'illness']
-            message_text = str(message).lower()
-            return any(keyword in message_text for keyword in medical_keywords)
-        return False
-    
-    def _process_medical_case(self, session: ActiveSession, message):
+    def _pre_triage(message):
+        """Red flag and medical-term scan of a message's fields; None when it is not a dict"""
+        if not isinstance(message, dict):
+            return None
+        with start_span("manager.pre_triage"):
+            return RED_FLAG_MATCHER.match_message(message)
+
+    @staticmethod
+    def _message_priority(message, triage):
+        """
+        The pre-triage class, raised to the sender's "priority" when that is higher. A sender can ask for no
+        more than SENDER_PRIORITY_CAP: the emergency class and its reserved workers are kept for red flags.
+        """
+        priority = triage.priority if triage is not None else "routine"
+        requested = message.get("priority") if isinstance(message, dict) else None
+        if requested in PRIORITY_CLASSES:
+            requested = max(requested, SENDER_PRIORITY_CAP, key=priority_rank)
+            priority = min(priority, requested, key=priority_rank)
+        return priority
+
+    def _ingest_stage(self, job):
+        # Pin the session in memory until the message is done, so eviction cannot close it under a queued job
+        while True:
+            session = self.get_or_create_session(job.user_id)
+            if self.active_sessions.hold(job.session_id, session):
+                break
+        job.session = session
+        job.waiters[0].add_done_callback(lambda _: session.release())
+        logger.debug("Message routed to session", extra={"session": job.session.session_id[:8]})
+        # Only medical messages go on to analysis
+        if job.triage is not None and job.triage.is_medical:
+            return job
+        job.finish()
+        return None
+
+    def _extract_stage(self, job):
+        case = {
+            "patient_info": self._extract_patient_info(job.message),
+            "chief_complaint": self._extract_chief_complaint(job.message),
+            "symptoms": self._extract_symptoms(job.message),
+        }
+        # Analyzed once the session's burst of messages ends; the coalescer queues it at the analyze stage
+        self._coalescer.submit(job.session, case, job.triage, job.priority, job.waiters)
+
+    def _analyze_coalesced(self, session: ActiveSession, case, triage, priority, waiters):
+        job = _CaseJob(session.user_id, None, triage, priority, waiters)
+        job.session = session
+        job.case = case
+        self._pipeline.run("analyze", job, priority)
+
+    def _analyze_stage(self, job):
         """Process medical case through the medical analyzer"""
-        try:
-            # Extract medical information from message
-            patient_info = self._extract_patient_info(message)
-            chief_complaint = self._extract_chief_complaint(message)
-            symptoms = self._extract_symptoms(message)
-            
-            # Run medical analysis
-            analysis_results = session.analyze_medical_case(
-                patient_info=patient_info,
-                chief_complaint=chief_complaint,
-                symptoms=symptoms
-            )
-            
-            # Check for emergency
-            if session.is_emergency_case():
-                emergency_status = session.get_emergency_status()
-                print(f"🚨 EMERGENCY DETECTED: {emergency_status['alert_message']}")
-                # Send emergency alert to patient immediately
-                self._send_emergency_alert(session, emergency_status)
+        with start_span("manager.process_medical_case", session=job.session.session_id[:8]):
+            results = job.session.analyze_medical_case(persist=False, **job.case)
+        job.analyzed_at = time.perf_counter()
+        if not results or results.get("emergency_analysis") is None:
+            # The agents log and swallow provider errors; report it with the message so Pub/Sub flow control
+            # counts the failure instead of a fast success
+            job.error = MedicalAnalysisFailed("emergency analysis returned no result")
+        return job
+
+    def _persist_stage(self, job):
+        job.session.persist_analysis()
+        return job
+
+    def _respond_stage(self, job):
+        session, triage = job.session, job.triage
+        pre_alerted = triage is not None and triage.is_emergency
+        if pre_alerted:
+            if job.error is not None:
+                outcome = "failed"  # No assessment to go by, so the alert stands
             else:
-                # Process non-emergency case
-                required_staff = session.get_required_staff()
-                questions = session.get_questions_to_ask()
-                print(f"Required staff: {required_staff}")
-                print(f"Questions to ask: {questions}")
-                
+                outcome = "confirmed" if session.is_emergency_case() else "overruled"
+            PRETRIAGE_LLM_OUTCOME.inc(outcome=outcome)
+            if outcome == "overruled":
+                logger.warning("LLM analysis did not confirm pre-triage emergency (%s)", ", ".join(triage.reasons),
+                               extra={"session": session.session_id[:8]})
+                self._send_emergency_update(session.session_id, triage)
+
+        # Check for emergency
+        if session.is_emergency_case():
+            emergency_status = session.get_emergency_status()
+            logger.warning("EMERGENCY DETECTED: %s", emergency_status['alert_message'],
+                           extra={"session": session.session_id[:8]})
+            # Send emergency alert to patient immediately, unless pre-triage already did
+            if not pre_alerted:
+                self._send_emergency_alert(session.session_id, emergency_status, job.analyzed_at)
+        else:
+            # Process non-emergency case
+            required_staff = session.get_required_staff()
+            questions = session.get_questions_to_ask()
+            logger.info("Analysis complete", extra={
+                "session": session.session_id[:8],
+                "required_staff": len(required_staff),
+                "questions": len(questions)
+            })
+        job.finish(job.error)
+
+    def _send_reply(self, job, waiter):
+        """
+        Answer one patient message once its job is done, with the session's latest guidance. The reply echoes
+        the message_id and user_id of the request, so the sender can match it even when the message was
+        analyzed together with others of the same burst.
+        """
+        reply = {
+            "type": "analysis_complete",
+            "session_id": job.session_id,
+            "user_id": job.user_id,
+            "message_id": job.message_id,
+        }
+        session = job.session
+        if waiter.cancelled() or waiter.exception() is not None:
+            reply["type"] = "analysis_failed"
+        elif job.triage is None or not job.triage.is_medical:
+            reply["type"] = "message_received"
+        else:
+            reply.update({
+                "is_emergency": bool(session.is_emergency_case()),
+                "required_staff": session.get_required_staff(),
+                "questions_to_ask": session.get_questions_to_ask(),
+                "next_steps": session.get_next_steps(),
+            })
+        try:
+            self.publish_one_message(reply, f"{MANAGER_TO_PATINET}{self.pubsub_postfix}")
         except Exception as e:
-            print(f"Error processing medical case: {e}")
-    
+            logger.error("Failed to send reply: %s", e, extra={"session": job.session_id[:8]})
+
     def _extract_patient_info(self, message):
         """Extract patient information from message"""
         # This would parse the message to extract patient details
@@ -165,14 +490,29 @@ class ManagerAgent(PubsubFunctions):
         """Extract symptoms from message"""
         return str(message.get('symptoms', '')) if isinstance(message, dict) else str(message)
     
-    def _send_emergency_alert(self, session: ActiveSession, emergency_status):
-        """Send immediate emergency alert to patient"""
+    def _send_emergency_alert(self, session_id, emergency_status, detected_at=None):
+        """Send immediate emergency alert to patient; detected_at (time.perf_counter()) starts the SLA clock"""
         alert_message = {
             "type": "emergency_alert",
             "message": emergency_status['alert_message'],
             "emergency_level": emergency_status['emergency_level'],
             "reason": emergency_status['reason'],
-            "session_id": session.session_id
+            "session_id": session_id
+        }
+        # Publish on the emergency topic and wait for the confirmation
+        return self._emergency_publisher.send(alert_message, detected_at)
+
+    def _send_emergency_update(self, session_id, triage):
+        """Follow up a pre-triage alert the LLM analysis overruled, on the topic the alert went out on"""
+        update_message = {
+            "type": "emergency_update",
+            "is_emergency": False,
+            "message": "Our full review did not confirm an emergency. If you are still worried or symptoms get "
+                       "worse, go to the hospital or call emergency services.",
+            "reason": "Pre-triage red flags not confirmed: " + ", ".join(triage.reasons),
+            "session_id": session_id
         }
-        # Publish emergency alert to patient topic
-        self.publish_one_message(alert_message, "to_users")
+        try:
+            self.publish_one_message(update_message, f"{MANAGER_TO_PATIENT_EMERGENCY}{self.pubsub_postfix}")
+        except Exception as e:
+            logger.error("Failed to send emergency update: %s", e, extra={"session": session_id[:8]})
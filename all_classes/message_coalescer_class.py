@@ -0,0 +1,215 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from services.metrics_service import METRICS
+from services.logging_service import get_logger
+from services.priority_work_queue import PRIORITY_CLASSES, priority_rank
+from services.tracing_service import bind_context
+
+logger = get_logger(__name__)
+
+COALESCED_MESSAGES = METRICS.counter("manager_coalesced_messages_total", "Medical messages buffered per session")
+ANALYSES_AVOIDED = METRICS.counter(
+    "manager_analyses_avoided_total", "Medical analyses saved by merging a burst of messages into one"
+)
+COALESCE_FLUSHES = METRICS.counter("manager_coalesce_flushes_total", "Coalesced analyses started, per trigger")
+COALESCE_BATCH_SIZE = METRICS.histogram(
+    "manager_coalesce_batch_size", "Messages merged into one medical analysis", buckets=(1, 2, 3, 4, 6, 8, 12, 20)
+)
+COALESCE_WAIT_SECONDS = METRICS.histogram(
+    "manager_coalesce_wait_seconds", "First buffered message until its analysis started"
+)
+
+
+def merge_messages(messages):
+    """Merge a burst of message dicts field by field; distinct values of a field are joined in arrival order"""
+    if len(messages) == 1:
+        return messages[0]
+    merged = {}
+    for message in messages:
+        for key, value in message.items():
+            current = merged.get(key)
+            if current in (None, ""):
+                merged[key] = value
+            elif isinstance(current, str) and isinstance(value, str):
+                if value and value not in current.split("; "):
+                    merged[key] = f"{current}; {value}"
+            elif value not in (None, ""):
+                merged[key] = value
+    return merged
+
+
+class _PendingBatch:
+    __slots__ = ("session", "messages", "waiters", "triage", "priority", "first_at", "deadline", "running")
+
+    def __init__(self, session):
+        self.session = session
+        self.messages = []
+        self.waiters = []
+        self.triage = None
+        self.priority = PRIORITY_CLASSES[-1]
+        self.first_at = None
+        self.deadline = None
+        self.running = False
+
+
+class MessageCoalescer:
+    """
+    Per-session debounce in front of the medical analysis. A message starts a window of window_seconds,
+    each further message from the same session restarts it (up to max_delay_seconds after the first),
+    and when it closes the buffered messages are merged into one on_flush(session, message, triage, priority, waiters)
+    call that runs on work_queue (a PriorityWorkQueue) at the highest priority of the batch; waiters are the
+    Futures submitted with the merged messages, for on_flush to complete. An emergency
+    message flushes right away. While an analysis runs for a session, new messages keep buffering and are
+    flushed once it finishes, so runs never queue behind each other. With window_seconds=0 each message
+    is queued for analysis as soon as it arrives.
+    """
+
+    def __init__(self, on_flush, work_queue, window_seconds=1.5, max_delay_seconds=5.0, name="coalescer"):
+        self.on_flush = on_flush
+        self.work_queue = work_queue
+        self.window_seconds = window_seconds
+        self.max_delay_seconds = max(max_delay_seconds, window_seconds)
+        self.name = name
+        self._batches = {}  # session id -> _PendingBatch
+        self._timers = []  # heap of (deadline, seq, session id), stale entries are skipped
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"{name}-timer")
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, on_flush, work_queue, name="coalescer"):
+        # No window by default: the manager acks a message only after its analysis, and ordered delivery
+        # holds a user's next message until then, so a window would only add latency. Bursts still merge
+        # for messages published without an ordering key, and behind a running analysis
+        return cls(
+            on_flush,
+            work_queue,
+            window_seconds=float(os.getenv("MANAGER_COALESCE_WINDOW_SECONDS", "0")),
+            max_delay_seconds=float(os.getenv("MANAGER_COALESCE_MAX_DELAY_SECONDS", "5")),
+            name=name,
+        )
+
+    def submit(self, session, message, triage=None, priority="routine", waiters=()):
+        """Buffer a medical message for session; emergencies flush immediately"""
+        COALESCED_MESSAGES.inc(coalescer=self.name)
+        urgent = priority == "emergency" or (triage is not None and triage.is_emergency)
+        if urgent:
+            priority = "emergency"
+        if self._stopped:
+            COALESCE_FLUSHES.inc(coalescer=self.name, trigger="inline")
+            self.on_flush(session, message, triage, priority, list(waiters))
+            return
+        now = time.monotonic()
+        with self._condition:
+            batch = self._batches.get(session.session_id)
+            if batch is None:
+                batch = self._batches[session.session_id] = _PendingBatch(session)
+            if not batch.messages:
+                batch.first_at = now
+            batch.messages.append(message)
+            batch.waiters.extend(waiters)
+            if urgent or batch.triage is None or not batch.triage.is_emergency:
+                batch.triage = triage  # An emergency triage is kept for the whole batch
+            if priority_rank(priority) < priority_rank(batch.priority):
+                batch.priority = priority
+            if urgent:
+                batch.deadline = now
+            else:
+                batch.deadline = min(now + self.window_seconds, batch.first_at + self.max_delay_seconds)
+            if batch.running:
+                return  # Picked up when the running analysis finishes
+            if urgent or batch.deadline <= now:
+                self._start_locked(session.session_id, batch, "emergency" if urgent else "window")
+            else:
+                self._schedule_locked(session.session_id, batch.deadline)
+
+    def _schedule_locked(self, session_id, deadline):
+        heapq.heappush(self._timers, (deadline, next(self._seq), session_id))
+        self._condition.notify()
+
+    def _start_locked(self, session_id, batch, trigger):
+        messages, waiters, triage, priority = batch.messages, batch.waiters, batch.triage, batch.priority
+        COALESCE_FLUSHES.inc(coalescer=self.name, trigger=trigger)
+        COALESCE_BATCH_SIZE.observe(len(messages), coalescer=self.name)
+        COALESCE_WAIT_SECONDS.observe(time.monotonic() - batch.first_at, coalescer=self.name)
+        if len(messages) > 1:
+            ANALYSES_AVOIDED.inc(len(messages) - 1, coalescer=self.name)
+            logger.info("Coalesced messages into one analysis",
+                        extra={"session": session_id[:8], "messages": len(messages), "trigger": trigger})
+        batch.messages, batch.waiters, batch.triage, batch.priority, batch.deadline = (
+            [], [], None, PRIORITY_CLASSES[-1], None
+        )
+        batch.running = True
+        self.work_queue.submit(
+            priority, bind_context(self._flush), session_id, batch, merge_messages(messages), triage, priority, waiters
+        )
+
+    def _flush(self, session_id, batch, message, triage, priority, waiters):
+        try:
+            self.on_flush(batch.session, message, triage, priority, waiters)
+        except Exception as e:
+            logger.exception("Coalesced analysis failed: %s", e, extra={"session": session_id[:8]})
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+        finally:
+            with self._condition:
+                batch.running = False
+                self._condition.notify_all()
+                if not batch.messages:
+                    del self._batches[session_id]
+                elif batch.deadline <= time.monotonic() or self._stopped:
+                    self._start_locked(session_id, batch, "after_run")
+                else:
+                    self._schedule_locked(session_id, batch.deadline)
+
+    def _run(self):
+        with self._condition:
+            while not self._stopped:
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    _, _, session_id = heapq.heappop(self._timers)
+                    batch = self._batches.get(session_id)
+                    if batch is None or batch.running or not batch.messages or batch.deadline > now:
+                        continue  # Stale timer: flushed already, still running, or the window was extended
+                    self._start_locked(session_id, batch, "window")
+                timeout = self._timers[0][0] - now if self._timers else None
+                self._condition.wait(timeout=timeout)
+
+    def flush(self, session_ids, trigger="handoff"):
+        """Start the analysis of whatever is buffered for these sessions now"""
+        with self._condition:
+            for session_id in session_ids:
+                batch = self._batches.get(session_id)
+                if batch is not None and batch.messages and not batch.running:
+                    self._start_locked(session_id, batch, trigger)
+
+    def pending(self):
+        with self._condition:
+            return sum(len(batch.messages) for batch in self._batches.values())
+
+    def stop(self, timeout=None):
+        """Flush every buffered batch now and wait up to timeout for the running analyses; 0 does not wait"""
+        with self._condition:
+            if self._stopped:
+                return
+            self._stopped = True
+            for session_id, batch in list(self._batches.items()):
+                if batch.messages and not batch.running:
+                    self._start_locked(session_id, batch, "shutdown")
+            self._condition.notify()
+        if timeout == 0:
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while any(batch.running for batch in self._batches.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    logger.warning("Coalescer stopped with analyses still running")
+                    break
+                self._condition.wait(timeout=remaining)
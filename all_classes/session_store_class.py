@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from services.metrics_service import METRICS
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+SESSIONS_EVICTED = METRICS.counter("manager_sessions_evicted_total", "Sessions dropped from memory, per reason")
+
+
+class SessionStore:
+    """
+    Bounded in-memory map of session id -> ActiveSession.
+    Sessions idle for longer than idle_ttl_seconds are evicted by a background sweep, and once
+    max_sessions is reached the least recently used one makes room. Evicted sessions get cleanup()
+    called; their state stays in Mongo so they can be rebuilt when the user writes again.
+    A busy session (see ActiveSession.is_busy: messages still in the pipeline, a running analysis or
+    results not stored yet) is never evicted. on_evict(session_id, session, reason) is called after
+    each eviction.
+    """
+
+    def __init__(self, max_sessions=1000, idle_ttl_seconds=1800, sweep_interval_seconds=None, name="sessions",
+                 on_evict=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.name = name
+        self.on_evict = on_evict
+        self.evictions = {"ttl": 0, "lru": 0, "handoff": 0}
+        self._sessions = OrderedDict()  # session id -> (session, last access), least recently used first
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        interval = sweep_interval_seconds or max(1.0, min(60.0, idle_ttl_seconds / 4))
+        self._thread = threading.Thread(
+            target=self._run, args=(interval,), daemon=True, name=f"{name}-sweeper"
+        )
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, name="sessions", on_evict=None):
+        return cls(
+            max_sessions=int(os.getenv("MANAGER_MAX_SESSIONS", "1000")),
+            idle_ttl_seconds=float(os.getenv("MANAGER_SESSION_IDLE_TTL_SECONDS", "1800")),
+            name=name,
+            on_evict=on_evict,
+        )
+
+    def get(self, session_id):
+        """Return the session and mark it as just used, or None"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (entry[0], time.monotonic())
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def put(self, session_id, session):
+        with self._lock:
+            self._sessions[session_id] = (session, time.monotonic())
+            self._sessions.move_to_end(session_id)
+            evicted = self._pop_over_capacity(keep=session_id)
+        self._cleanup(evicted, "lru")
+
+    def hold(self, session_id, session):
+        """
+        Call session.hold() if session is still the one stored under session_id, atomically with respect
+        to eviction; returns False when it was evicted in the meantime and must be looked up again.
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[0] is not session:
+                return False
+            session.hold()
+            return True
+
+    def session_ids(self):
+        with self._lock:
+            return list(self._sessions)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _pop_over_capacity(self, keep=None):
+        """Evict idle sessions, least recently used first; with every other one busy the store stays over capacity"""
+        evicted = []
+        if len(self._sessions) <= self.max_sessions:
+            return evicted
+        for session_id, (session, _) in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if session_id == keep or self._is_busy(session):
+                continue
+            del self._sessions[session_id]
+            evicted.append((session_id, session))
+        return evicted
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        evicted = []
+        with self._lock:
+            for session_id, (session, last_access) in list(self._sessions.items()):
+                if last_access > cutoff:
+                    break  # Ordered by last access, everything after this is newer
+                if self._is_busy(session):
+                    continue
+                del self._sessions[session_id]
+                evicted.append((session_id, session))
+        self._cleanup(evicted, "ttl")
+        return len(evicted)
+
+    def evict_matching(self, predicate, reason):
+        """Evict the idle sessions whose id matches predicate; returns how many are left because they are busy"""
+        evicted = []
+        busy = 0
+        with self._lock:
+            for session_id, (session, _) in list(self._sessions.items()):
+                if not predicate(session_id):
+                    continue
+                if self._is_busy(session):
+                    busy += 1
+                    continue
+                del self._sessions[session_id]
+                evicted.append((session_id, session))
+        self._cleanup(evicted, reason)
+        return busy
+
+    @staticmethod
+    def _is_busy(session):
+        is_busy = getattr(session, "is_busy", None)
+        return bool(is_busy and is_busy())
+
+    def _cleanup(self, evicted, reason):
+        for session_id, session in evicted:
+            self.evictions[reason] += 1
+            SESSIONS_EVICTED.inc(store=self.name, reason=reason)
+            logger.info("Evicted session", extra={"session": session_id[:8], "reason": reason})
+            try:
+                session.cleanup()
+            except Exception as e:
+                logger.warning("Session cleanup failed: %s", e, extra={"session": session_id[:8]})
+            if self.on_evict:
+                self.on_evict(session_id, session, reason)
+
+    def _run(self, interval):
+        while not self._stop_event.wait(timeout=interval):
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.exception("Session sweep failed: %s", e)
+
+    def get_stats(self):
+        return {
+            "size": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "evicted_ttl": self.evictions["ttl"],
+            "evicted_lru": self.evictions["lru"],
+            "evicted_handoff": self.evictions["handoff"],
+        }
+
+    def stop(self):
+        self._stop_event.set()
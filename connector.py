@@ -1,15 +1,36 @@
-import time
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import uuid
-from queue import Queue
-from TestBot.init_threads import init_active_threads, received_messages, message_timings, get_message_async
+from TestBot.init_threads import init_active_threads, received_messages
 from pubsub_connectors import SendDirectMessage
+from services.latency_window import LatencyWindow
+from services.logging_service import get_logger
+from services.response_router import ResponseRouter
+from services.tracing_service import start_span, record_span, bind_context, now_us
+
+logger = get_logger(__name__)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_response_router():
+    """received_messages is process-wide, so every Connector shares one router"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ResponseRouter(received_messages)
+        return _router
 
 
 class Connector:
-    def __init__(self, set_prefix=None):
+    def __init__(self, set_prefix=None, timings_capacity=10000):
         self.thread_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="connector_worker")
         self._pubsub_client = None
+        self._router = None
+        self.latency_stats = LatencyWindow(capacity=timings_capacity)
         self.set_prefix = set_prefix
         self._init_complete = False
         self._initialize()
@@ -19,8 +40,7 @@ class Connector:
             return
         init_active_threads()
         self._pubsub_client = SendDirectMessage(self.set_prefix)
-        while not received_messages.empty():
-            received_messages.get()
+        self._router = get_response_router()
 
         self._init_complete = True
 
@@ -28,68 +48,75 @@ class Connector:
         if not self._init_complete:
             self._initialize()
 
-        result_queue = Queue()
         message_id = str(uuid.uuid4())
+        response_future = self._router.register(message_id, user_id)
+        with start_span("connector.request", message_id=message_id) as request_span:
+            send_span = self._send(client_id, user_id, message, message_id)
 
-        while not received_messages.empty():
-            received_messages.get()
-
-        self.thread_pool.submit(
-            self._send_and_receive,
-            client_id, user_id, message, result_queue, message_id, timeout
-        )
-
-        try:
-            result = result_queue.get(timeout=timeout)
-            return result
-        except Exception as e:
-            print("Timeout waiting for response", e.args)
-            return {
-                "response": None,
-                "latency": None,
-                "message_id": message_id,
-                "latency_breakdown": {"error": f"Timeout waiting for response after {timeout}s"}
-            }
+            try:
+                response_data = response_future.result(timeout=timeout)
+            except FutureTimeoutError:
+                self._router.discard(message_id)
+                request_span.set_attribute("timeout", True)
+                logger.warning("Timeout waiting for response", extra={"message_id": message_id, "timeout": timeout})
+                return self._timeout_result(message_id, timeout)
+
+            return self._build_result(message_id, request_span, send_span, response_data)
 
     async def get_response_async(self, client_id, user_id, message, timeout=30):
         if not self._init_complete:
             self._initialize()
 
         message_id = str(uuid.uuid4())
-        while not received_messages.empty():
-            received_messages.get()
-
-        start_time = time.time()
-        message_timings[message_id] = {
-            "init_time": start_time,
-            "pubsub_send_start": time.time(),
-            "pubsub_send_complete": 0,
-            "response_received": 0,
-            "processing_complete": 0
-        }
+        response_future = self._router.register_async(message_id, user_id)
+        loop = asyncio.get_running_loop()
+        with start_span("connector.request", message_id=message_id) as request_span:
+            send_span = await loop.run_in_executor(
+                self.thread_pool, bind_context(self._send), client_id, user_id, message, message_id
+            )
 
-        if self._pubsub_client is None:
-            self._pubsub_client = SendDirectMessage(self.set_prefix)
+            try:
+                response_data = await asyncio.wait_for(response_future, timeout)
+            except asyncio.TimeoutError:
+                self._router.discard(message_id)
+                request_span.set_attribute("timeout", True)
+                logger.warning("Async timeout waiting for response",
+                               extra={"message_id": message_id, "timeout": timeout})
+                return self._timeout_result(message_id, timeout)
 
-        print(f"Sending message to {user_id}: {message} [ID: {message_id}]")
-        self._pubsub_client.send_direct_message(message, client_id, user_id, message_id)
-        sent_time = time.time()
-        message_timings[message_id]["pubsub_send_complete"] = sent_time
+            return self._build_result(message_id, request_span, send_span, response_data)
 
-        print(
-            f"Message sent. PubSub send latency: "
-            f"{(sent_time - message_timings[message_id]['pubsub_send_start']) * 1000:.2f} ms")
+    def get_latency_percentiles(self, window_seconds=None):
+        """Percentiles of each latency breakdown component over recent requests, see LatencyWindow.summary"""
+        return self.latency_stats.summary(window_seconds)
 
-        response_data = await get_message_async(timeout)
+    def _send(self, client_id, user_id, message, message_id):
+        """Publish one request inside a connector.send span, which the bot continues; returns that span"""
+        # Message text stays out of the logs; its size is enough to follow a request
+        logger.debug("Sending message", extra={"message_id": message_id, "size": len(str(message))})
 
-        if response_data is None:
-            print(f"Async timeout waiting for response after {timeout}s")
-            return {
-                "response": None,
-                "latency": None,
-                "message_id": message_id,
-                "latency_breakdown": {"error": f"Timeout waiting for response after {timeout}s"}
-            }
+        with start_span("connector.send", message_id=message_id) as send_span:
+            if self._pubsub_client is None:
+                self._pubsub_client = SendDirectMessage(self.set_prefix)
+
+            self._pubsub_client.send_direct_message(message, client_id, user_id, message_id)
+
+        logger.debug("Message sent",
+                     extra={"message_id": message_id, "send_ms": round(send_span.duration_us / 1000, 2)})
+        return send_span
+
+    @staticmethod
+    def _timeout_result(message_id, timeout):
+        return {
+            "response": None,
+            "latency": None,
+            "message_id": message_id,
+            "latency_breakdown": {"error": f"Timeout waiting for response after {timeout}s"}
+        }
+
+    def _build_result(self, message_id, request_span, send_span, response_data):
+        received_us = now_us()
+        record_span("connector.wait_response", send_span.end_us, received_us, parent=request_span.context)
 
         if isinstance(response_data, dict):
             response = response_data.get("message", str(response_data))
@@ -98,124 +125,29 @@ class Connector:
             response = response_data
             received_message_id = "unknown"
 
-        end_time = time.time()
-        message_timings[message_id]["response_received"] = end_time
-        total_latency = (end_time - start_time) * 1000
-        processing_end = time.time()
-        message_timings[message_id]["processing_complete"] = processing_end
+        processing_end_us = now_us()
+        total_latency = (processing_end_us - request_span.start_us) / 1000
 
+        # The breakdown is read off the request's spans, which also go to the trace file
         latency_breakdown = {
-            "client_preparation": (message_timings[message_id]["pubsub_send_start"] - start_time) * 1000,
-            "pubsub_outgoing": (message_timings[message_id]["pubsub_send_complete"] -
-                                message_timings[message_id]["pubsub_send_start"]) * 1000,
-            "bot_processing": (message_timings[message_id]["response_received"] -
-                               message_timings[message_id]["pubsub_send_complete"]) * 1000,
-            "response_processing": (processing_end - message_timings[message_id]["response_received"]) * 1000,
+            "client_preparation": (send_span.start_us - request_span.start_us) / 1000,
+            "pubsub_outgoing": send_span.duration_us / 1000,
+            "bot_processing": (received_us - send_span.end_us) / 1000,
+            "response_processing": (processing_end_us - received_us) / 1000,
             "total_latency": total_latency
         }
+        self.latency_stats.record(latency_breakdown)
 
-        print(f"Response received [ID: {received_message_id}]. Total latency: {total_latency:.2f} ms")
+        logger.info("Response received", extra={
+            "message_id": received_message_id, "latency_ms": round(total_latency, 2), "sample_rate": 0.1
+        })
 
         return {
             "response": response,
             "latency": total_latency,
-            "send_time": start_time,
-            "receive_time": end_time,
+            "send_time": request_span.start_us / 1e6,
+            "receive_time": received_us / 1e6,
             "message_id": message_id,
             "received_message_id": received_message_id,
             "latency_breakdown": latency_breakdown
         }
-
-    def _send_and_receive(self, client_id, user_id, message, result_queue, message_id, timeout=30):
-        """
-        Send a message and wait for response (internal implementation)
-
-        This method runs in a separate thread and puts result in the queue
-        """
-        print(f"Sending message to {user_id}: {message} [ID: {message_id}]")
-
-        # Record timing information
-        start_time = time.time()
-        message_timings[message_id] = {
-            "init_time": start_time,
-            "pubsub_send_start": time.time(),
-            "pubsub_send_complete": 0,
-            "response_received": 0,
-            "processing_complete": 0
-        }
-
-        if self._pubsub_client is None:
-            self._pubsub_client = SendDirectMessage(self.set_prefix)
-
-        self._pubsub_client.send_direct_message(message, client_id, user_id, message_id)
-        sent_time = time.time()
-        message_timings[message_id]["pubsub_send_complete"] = sent_time
-
-        print(
-            f"Message sent successfully. PubSub send latency: "
-            f"{(sent_time - message_timings[message_id]['pubsub_send_start']) * 1000:.2f} ms")
-
-        polling_interval = 0.05
-        wait_start = time.time()
-
-        while time.time() - wait_start < timeout:
-            try:
-                if not received_messages.empty():
-                    priority, response_data = received_messages.get_nowait()
-
-                    if isinstance(response_data, dict):
-                        response = response_data.get("message", str(response_data))
-                        received_message_id = response_data.get("message_id", "unknown")
-                    else:
-                        response = response_data
-                        received_message_id = "unknown"
-
-                    end_time = time.time()
-                    message_timings[message_id]["response_received"] = end_time
-                    total_latency = (end_time - start_time) * 1000
-                    processing_end = time.time()
-                    message_timings[message_id]["processing_complete"] = processing_end
-
-                    pubsub_send_start = message_timings[message_id]["pubsub_send_start"]
-                    pubsub_send_complete = message_timings[message_id]["pubsub_send_complete"]
-                    response_received = message_timings[message_id]["response_received"]
-
-                    latency_breakdown = {
-                        "client_preparation": (pubsub_send_start - start_time) * 1000,
-                        "pubsub_outgoing": (pubsub_send_complete - pubsub_send_start) * 1000,
-                        "bot_processing": (response_received - pubsub_send_complete) * 1000,
-                        "response_processing": (processing_end - response_received) * 1000,
-                        "total_latency": total_latency
-                    }
-
-                    print(f"Response received [ID: {received_message_id}]. Total latency: {total_latency:.2f} ms")
-                    print("Latency breakdown:")
-                    for component, time_ms in latency_breakdown.items():
-                        if component != "total_latency":
-                            percentage = (time_ms / total_latency) * 100
-                            print(f"  {component}: {time_ms:.2f} ms ({percentage:.1f}%)")
-
-                    result_queue.put({
-                        "response": response,
-                        "latency": total_latency,
-                        "send_time": start_time,
-                        "receive_time": end_time,
-                        "message_id": message_id,
-                        "received_message_id": received_message_id,
-                        "latency_breakdown": latency_breakdown
-                    })
-                    return
-
-                # Short sleep to prevent CPU spinning
-                time.sleep(polling_interval)
-            except Exception as e:
-                print(f"Error processing response: {e}")
-
-        # Timeout occurred
-        print(f"Timeout waiting for response for message ID: {message_id}")
-        result_queue.put({
-            "response": None,
-            "latency": None,
-            "message_id": message_id,
-            "latency_breakdown": {"error": f"Timeout waiting for response after {timeout}s"}
-        })
@@ -9,11 +9,17 @@ DEFAULT_CLAUDE_MODEL = "claude-3-5-sonnet-latest"
 
 PATIENT_TO_MANAGER = "patient_to_manager"
 MANAGER_TO_PATINET = "manager_to_patient"
+MANAGER_TO_PATIENT_EMERGENCY = "manager_to_patient_emergency"
 MANAGER_TO_STAFF = "manager_to_staff"
 STAFF_TO_MANAGER = "staff_to_manager"
+MANAGER_CONTROL = "manager_control"  # Internal: only operators publish here, never patients or staff
 
 PATIENT = "patient"
 MANAGER = "manager"
+OPERATOR = "operator"
 MAIN_ADVISORY_PUBSUB_PREFIX = "main_advisory"
 ADVISORY_TOPIC_NAME = "advisory_topic"
 ADVISORY_SUBSCRIPTION_NAME = "advisory_subscription"
+
+PUBSUB_BACKEND_GCP = "gcp"
+PUBSUB_BACKEND_MEMORY = "memory"
@@ -1,8 +1,10 @@
+import hashlib
 import os
 from datetime import datetime
+from functools import lru_cache
 import pytz
 from dotenv import load_dotenv
-from entities import DEV, PROD
+from entities import DEV, PROD, PUBSUB_BACKEND_GCP, PUBSUB_BACKEND_MEMORY
 
 load_dotenv()
 
@@ -53,3 +55,30 @@ def get_time_in_epoc():
 def get_pubsub_postfix():
     is_local = os.getenv("ENVIRONMENT") == "local" or os.getenv("ENVIRONMENT") == "dev"
     return DEV if is_local else PROD
+
+
+def get_pubsub_backend():
+    backend = os.getenv("PUBSUB_BACKEND", PUBSUB_BACKEND_GCP).lower()
+    if backend not in (PUBSUB_BACKEND_GCP, PUBSUB_BACKEND_MEMORY):
+        raise ValueError(f"Unknown PUBSUB_BACKEND {backend}")
+    return backend
+
+
+@lru_cache(maxsize=65536)
+def hash_user_id(user_id):
+    return hashlib.sha256(str(user_id).encode()).hexdigest()
+
+
+def get_pubsub_codec_name():
+    return os.getenv("PUBSUB_CODEC", "orjson").lower()
+
+
+def get_pubsub_consumer_codecs():
+    """Codecs every subscriber is known to have installed, e.g. "json,msgpack"; JSON is always decodable"""
+    names = os.getenv("PUBSUB_CONSUMER_CODECS", "json").split(",")
+    return tuple(name.strip().lower() for name in names if name.strip())
+
+
+def get_pubsub_compression_threshold():
+    """Payloads larger than this many bytes are zlib-compressed; 0 disables compression"""
+    return int(os.getenv("PUBSUB_COMPRESSION_THRESHOLD", "0"))
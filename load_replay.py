@@ -0,0 +1,295 @@
+"""
+Capture patient_to_manager traffic and replay it, or synthetic traffic, against a running manager.
+
+    python load_replay.py capture traffic.jsonl --duration 600
+    python load_replay.py replay traffic.jsonl --rate 20 --users 200
+    python load_replay.py replay --synthetic 2000 --rate 50 --users 500
+
+Replay is open loop: every request is published at its scheduled time whether or not earlier ones were
+answered, and latency is measured from the scheduled time, so a slow manager shows up as latency instead
+of silently lowering the offered load (coordinated omission). A request counts as answered when the
+manager's reply for it arrives on manager_to_patient: ManagerAgent sends one per message, echoing its
+message_id, after the analysis has been persisted (or fails, or finds the message is not medical).
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+
+from entities import PATIENT, PATIENT_TO_MANAGER, SECRET_SERVICE_NAME
+from helper_methods import get_pubsub_postfix, hash_user_id
+from services.logging_service import configure_logging, get_logger
+from services.pubsub_functions import PubsubFunctions
+from services.pubsub_service import PubSubService
+
+logger = get_logger(__name__)
+
+# What ManagerAgent sends on manager_to_patient once a message's job is done, one per message
+REPLY_TYPES = ("analysis_complete", "message_received", "analysis_failed")
+
+SYNTHETIC_COMPLAINTS = [
+    {"chief_complaint": "fever", "symptoms": "fever 39.2 since yesterday, coughing"},
+    {"chief_complaint": "ear pain", "symptoms": "pain in the left ear, crying at night"},
+    {"chief_complaint": "rash", "symptoms": "red rash on the arms, no fever"},
+    {"chief_complaint": "vomiting", "symptoms": "vomiting three times today, drinking a little"},
+    {"chief_complaint": "breathing", "symptoms": "fast breathing and wheezing after a cold"},
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if values else None,
+    }
+
+
+class TrafficRecorder:
+    """
+    Writes every patient_to_manager message to a JSON-lines file through its own subscription,
+    so capturing does not take messages away from the manager. User ids are stored hashed.
+    """
+
+    def __init__(self, output_path, pubsub_backend=None):
+        self.output_path = output_path
+        self.topic = f"{PATIENT_TO_MANAGER}{get_pubsub_postfix()}"
+        self.pubsub_service = PubSubService(SECRET_SERVICE_NAME, backend=pubsub_backend)
+        self.captured = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _record(self, message):
+        if isinstance(message, dict) and message.get("user_id"):
+            message = dict(message, user_id=hash_user_id(message["user_id"]))
+        line = json.dumps({"ts": time.time(), "message": message}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.captured += 1
+        return True
+
+    def run(self, duration):
+        with open(self.output_path, "a", encoding="utf-8", buffering=1) as self._file:
+            self.pubsub_service.subscribe_to_topic(self.topic, f"{self.topic}_capture", self._record)
+            logger.info("Capturing %s to %s for %ss", self.topic, self.output_path, duration)
+            try:
+                time.sleep(duration)
+            except KeyboardInterrupt:
+                pass
+            self.pubsub_service.close()
+        logger.info("Captured %s messages", self.captured)
+        return self.captured
+
+
+def load_events(path):
+    """Read a capture file into [{"t": seconds from the first message, "message": ...}]"""
+    records = []
+    with open(path, encoding="utf-8") as capture_file:
+        for line in capture_file:
+            if line.strip():
+                records.append(json.loads(line))
+    records.sort(key=lambda record: record["ts"])
+    first_ts = records[0]["ts"] if records else 0
+    return [{"t": record["ts"] - first_ts, "message": record["message"]} for record in records]
+
+
+def synthetic_events(count, seed=0):
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        complaint = rng.choice(SYNTHETIC_COMPLAINTS)
+        events.append({
+            "t": None,
+            "message": dict(complaint, message=f"{complaint['chief_complaint']}: {complaint['symptoms']}",
+                            user_id=f"synthetic-{i}"),
+        })
+    return events
+
+
+class LoadGeneratorAgent(PubsubFunctions):
+    """
+    Publishes as a patient and matches the manager's per-message replies to outstanding requests by the
+    message_id they echo. It reads the patient topics through its own "_loadgen" subscriptions, so it
+    neither takes replies away from real patients nor loses its own to them.
+    """
+
+    def __init__(self, pubsub_backend=None):
+        self._outstanding = {}  # message_id -> request record
+        self._outstanding_lock = threading.Lock()
+        self.unmatched_responses = 0
+        super().__init__(PATIENT, "load_generator", pubsub_backend, subscription_suffix="_loadgen")
+
+    def track(self, message_id, record):
+        with self._outstanding_lock:
+            self._outstanding[message_id] = record
+
+    def handle_incoming_message(self, message):
+        received_at = time.monotonic()
+        if not isinstance(message, dict) or message.get("type") not in REPLY_TYPES:
+            return True  # Emergency alerts and updates come on top of the reply every message gets
+        with self._outstanding_lock:
+            record = self._outstanding.pop(message.get("message_id"), None)
+        if record is None:
+            self.unmatched_responses += 1
+            return True
+        record["responded_at"] = received_at
+        if message["type"] == "analysis_failed":
+            record["analysis_failed"] = True
+        return True
+
+    def publish_one_message(self, message, topic, ordering_key=None):
+        if ordering_key is None and isinstance(message, dict) and message.get("user_id"):
+            ordering_key = hash_user_id(message["user_id"])
+        return self.pubsub_service.publish_message(topic, message, ordering_key=ordering_key)
+
+
+class OpenLoopReplay:
+    """
+    Publishes events on a fixed schedule: the recorded inter-arrival times divided by speed,
+    or rate messages per second (constant or Poisson arrivals) when rate is given.
+    users spreads the events round-robin over that many synthetic users.
+    """
+
+    def __init__(self, agent, events, rate=None, speed=1.0, users=None, arrival="constant", timeout=30.0,
+                 seed=0):
+        self.agent = agent
+        self.events = events
+        self.rate = rate
+        self.speed = speed
+        self.users = users
+        self.arrival = arrival
+        self.timeout = timeout
+        self.run_id = uuid.uuid4().hex[:8]
+        self.topic = f"{PATIENT_TO_MANAGER}{agent.pubsub_postfix}"
+        self._rng = random.Random(seed)
+        self.records = []
+
+    def _schedule(self):
+        offsets = []
+        offset = 0.0
+        for event in self.events:
+            if self.rate:
+                offset += self._rng.expovariate(self.rate) if self.arrival == "poisson" else 1.0 / self.rate
+                offsets.append(offset)
+            else:
+                offsets.append((event["t"] or 0.0) / self.speed)
+        return offsets
+
+    def _message_for(self, index, event):
+        message = dict(event["message"]) if isinstance(event["message"], dict) else {"message": event["message"]}
+        if self.users:
+            message["user_id"] = f"load-{self.run_id}-{index % self.users}"
+        message["message_id"] = f"load-{self.run_id}-m{index}"  # Echoed in the manager's reply
+        return message
+
+    def run(self):
+        offsets = self._schedule()
+        start = time.monotonic()
+        for index, (event, offset) in enumerate(zip(self.events, offsets)):
+            scheduled_at = start + offset
+            delay = scheduled_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            message = self._message_for(index, event)
+            record = {"scheduled_at": scheduled_at, "sent_at": time.monotonic(), "acked_at": None,
+                      "responded_at": None, "failed": False}
+            self.records.append(record)
+            self.agent.track(message["message_id"], record)
+            try:
+                future = self.agent.publish_one_message(message, self.topic)
+                future.add_done_callback(lambda f, r=record: self._on_ack(f, r))
+            except Exception as e:
+                logger.warning("Publish failed: %s", e)
+                record["failed"] = True
+        sending_finished = time.monotonic()
+
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline and any(
+                r["responded_at"] is None and not r["failed"] for r in self.records):
+            time.sleep(0.1)
+        return self.report(start, sending_finished)
+
+    @staticmethod
+    def _on_ack(future, record):
+        if future.exception() is None:
+            record["acked_at"] = time.monotonic()
+        else:
+            record["failed"] = True
+
+    def report(self, start, sending_finished):
+        responded = [r for r in self.records if r["responded_at"] is not None]
+        response_latency = [r["responded_at"] - r["scheduled_at"] for r in responded
+                            if r["responded_at"] - r["scheduled_at"] <= self.timeout]
+        last_response = max((r["responded_at"] for r in responded), default=sending_finished)
+        elapsed = max(last_response, sending_finished) - start
+        return {
+            "sent": len(self.records),
+            "offered_rate": len(self.records) / (sending_finished - start) if sending_finished > start else None,
+            "publish_failures": sum(1 for r in self.records if r["failed"]),
+            "publish_ack_seconds": summarize(
+                [r["acked_at"] - r["scheduled_at"] for r in self.records if r["acked_at"] is not None]),
+            "max_send_lag_seconds": max((r["sent_at"] - r["scheduled_at"] for r in self.records), default=0.0),
+            "responses": len(response_latency),
+            "analysis_failures": sum(1 for r in responded if r.get("analysis_failed")),
+            "timeouts": sum(1 for r in self.records if not r["failed"]) - len(response_latency),
+            "response_seconds": summarize(response_latency),
+            "throughput_per_second": len(response_latency) / elapsed if elapsed > 0 else None,
+            "unmatched_responses": self.agent.unmatched_responses,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default=None, help="Pub/Sub backend, defaults to PUBSUB_BACKEND")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    capture = commands.add_parser("capture", help="Record patient_to_manager traffic")
+    capture.add_argument("output")
+    capture.add_argument("--duration", type=float, default=600.0)
+
+    replay = commands.add_parser("replay", help="Replay a capture or synthetic traffic")
+    replay.add_argument("capture_file", nargs="?")
+    replay.add_argument("--synthetic", type=int, default=0, help="Generate this many messages instead")
+    replay.add_argument("--rate", type=float, default=None, help="Messages per second; default keeps recorded timing")
+    replay.add_argument("--speed", type=float, default=1.0, help="Time compression for recorded timing")
+    replay.add_argument("--arrival", choices=("constant", "poisson"), default="constant")
+    replay.add_argument("--users", type=int, default=None, help="Spread messages over this many users")
+    replay.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for each response")
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.command == "capture":
+        TrafficRecorder(args.output, pubsub_backend=args.backend).run(args.duration)
+        return
+
+    if args.synthetic:
+        events = synthetic_events(args.synthetic)
+        if not args.rate:
+            parser.error("--synthetic needs --rate")
+    elif args.capture_file:
+        events = load_events(args.capture_file)
+    else:
+        parser.error("give a capture file or --synthetic N")
+
+    agent = LoadGeneratorAgent(pubsub_backend=args.backend)
+    replay_run = OpenLoopReplay(agent, events, rate=args.rate, speed=args.speed, users=args.users,
+                                arrival=args.arrival, timeout=args.timeout)
+    try:
+        report = replay_run.run()
+    finally:
+        agent.pubsub_service.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
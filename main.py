@@ -3,8 +3,13 @@ import signal
 import atexit
 
 from nursing_advisory_center import AdvisoryCenter
+from services.logging_service import configure_logging
+from services.tracing_service import configure_tracing
 
-sys.stdout.reconfigure(line_buffering=True)
+# Runtime logs go through a background writer; no line-buffered stdout on the hot path
+configure_logging()
+# Spans go to TRACE_FILE when it is set
+configure_tracing(process_name="nursing-advisory")
 
 
 class NursingAdvisoryRunner:
@@ -2,10 +2,13 @@ from .emergency_detection_agent import EmergencyDetectionAgent
 from .staff_analysis_agent import StaffAnalysisAgent
 from .medical_details_agent import MedicalDetailsAgent
 from .medical_analyzer_coordinator import MedicalAnalyzerCoordinator
+from .red_flag_matcher import RedFlagMatcher, RED_FLAG_MATCHER
 
 __all__ = [
     "EmergencyDetectionAgent",
     "StaffAnalysisAgent", 
     "MedicalDetailsAgent",
-    "MedicalAnalyzerCoordinator"
+    "MedicalAnalyzerCoordinator",
+    "RedFlagMatcher",
+    "RED_FLAG_MATCHER"
 ]
\ No newline at end of file
@@ -20,8 +20,9 @@ class EmergencyDetectionAgent(LLMBaseAgent):
         self.agent_character = "Medical emergency assessment specialist"
         self.output_classes = EmergencyAnalysis
         self.update_parser(EmergencyAnalysis)
+        self.response_field = None  # The coordinator reads the whole analysis
         
-        self.system_prompt = """
+        self.system_prompt_template = """
 You are {agent_name}, a {agent_character}.
 
 Your role is to analyze medical cases and determine if they require emergency treatment outside the
@@ -53,7 +54,7 @@ For non-emergency cases, indicate they can proceed with nursing advisory.
 {output_format}
 """
         
-        self.user_prompt = """
+        self.user_prompt_template = """
 Analyze the following medical case for emergency status:
 
 Patient Information: {patient_info}
@@ -66,7 +67,7 @@ Determine if this requires immediate emergency care or can be handled through nu
 """
 
     def analyze_emergency_status(self, patient_info, symptoms, duration="", severity="", additional_context=""):
-        self.user_prompt = self.user_prompt.format(
+        self.user_prompt = self.user_prompt_template.format(
             patient_info=patient_info,
             symptoms=symptoms,
             duration=duration,
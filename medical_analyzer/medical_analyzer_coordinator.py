@@ -3,10 +3,23 @@ import os
 from medical_analyzer.emergency_detection_agent import EmergencyDetectionAgent
 from medical_analyzer.staff_analysis_agent import StaffAnalysisAgent
 from medical_analyzer.medical_details_agent import MedicalDetailsAgent
+from services.metrics_service import METRICS
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+AGENT_RUNS = METRICS.counter("medical_agent_runs_total", "Medical analysis agent calls, run or skipped, per agent")
+
+# Case fields each agent reads. The staff agent is also skipped for emergencies, so it runs again when a case
+# stops being one even if its own fields did not change.
+AGENT_INPUTS = {
+    "emergency": ("patient_info", "symptoms", "duration", "severity", "chief_complaint", "additional_info"),
+    "staff": ("patient_info", "symptoms", "medical_history", "medications"),
+    "details": ("patient_info", "chief_complaint", "symptoms", "medical_history", "medications", "allergies",
+                "vital_signs", "physical_exam", "additional_info"),
+}
+
+
 class MedicalAnalyzerCoordinator:
     def __init__(self):
         self.emergency_agent = EmergencyDetectionAgent()
@@ -20,40 +33,50 @@ class MedicalAnalyzerCoordinator:
         Comprehensive medical case analysis that returns emergency status, 
         staff requirements, and medical details assessment.
         """
+        case = dict(
+            patient_info=patient_info, chief_complaint=chief_complaint, symptoms=symptoms,
+            medical_history=medical_history, medications=medications, allergies=allergies,
+            vital_signs=vital_signs, physical_exam=physical_exam, additional_info=additional_info,
+            severity=severity, duration=duration
+        )
+        return self.reanalyze_medical_case(case, previous_results=None, changed_fields=None)
+
+    def reanalyze_medical_case(self, case, previous_results, changed_fields):
+        """
+        Re-run only the agents that read one of changed_fields and keep the other results from
+        previous_results. With no previous results (or changed_fields=None) every agent runs.
+        """
+        full_run = previous_results is None or changed_fields is None
+        previous_results = previous_results or {}
+        changed_fields = set(changed_fields or ())
+
+        def needs_run(agent):
+            return full_run or not changed_fields.isdisjoint(AGENT_INPUTS[agent])
 
         # 1. Emergency Detection Analysis
-        emergency_analysis = self.emergency_agent.analyze_emergency_status(
-            patient_info=patient_info,
-            symptoms=symptoms,
-            duration=duration,
-            severity=severity,
-            additional_context=f"Chief complaint: {chief_complaint}. Additional info: {additional_info}"
-        )
+        emergency_analysis = previous_results.get("emergency_analysis")
+        if needs_run("emergency"):
+            emergency_analysis = self._run_emergency(case)
+        else:
+            AGENT_RUNS.inc(agent="emergency", outcome="skipped")
+        is_emergency = bool(emergency_analysis and emergency_analysis.is_emergency)
 
         # 2. Staff Analysis (only if not emergency)
         staff_analysis = None
-        if not (emergency_analysis and emergency_analysis.is_emergency):
-            staff_analysis = self.staff_agent.analyze_staff_requirements(
-                patient_info=patient_info,
-                symptoms=symptoms,
-                medical_history=medical_history,
-                medications=medications,
-                complexity="medium",  # Can be parameterized
-                urgency="routine" if not emergency_analysis else "urgent"
-            )
+        if is_emergency:
+            AGENT_RUNS.inc(agent="staff", outcome="skipped")
+        elif needs_run("staff") or not previous_results.get("staff_analysis"):
+            staff_analysis = self._run_staff(case, emergency_analysis)
+        else:
+            staff_analysis = previous_results["staff_analysis"]
+            AGENT_RUNS.inc(agent="staff", outcome="skipped")
 
         # 3. Medical Details Analysis
-        details_analysis = self.details_agent.analyze_medical_details(
-            patient_info=patient_info,
-            chief_complaint=chief_complaint,
-            symptoms=symptoms,
-            medical_history=medical_history,
-            medications=medications,
-            allergies=allergies,
-            vital_signs=vital_signs,
-            physical_exam=physical_exam,
-            additional_info=additional_info
-        )
+        if needs_run("details"):
+            details_analysis = self._run_details(case)
+        else:
+            details_analysis = previous_results.get("details_analysis")
+            AGENT_RUNS.inc(agent="details", outcome="skipped")
 
         return {
             "emergency_analysis": emergency_analysis,
@@ -64,6 +87,41 @@ class MedicalAnalyzerCoordinator:
             )
         }
 
+    def _run_emergency(self, case):
+        AGENT_RUNS.inc(agent="emergency", outcome="run")
+        return self.emergency_agent.analyze_emergency_status(
+            patient_info=case["patient_info"],
+            symptoms=case["symptoms"],
+            duration=case["duration"],
+            severity=case["severity"],
+            additional_context=f"Chief complaint: {case['chief_complaint']}. Additional info: {case['additional_info']}"
+        )
+
+    def _run_staff(self, case, emergency_analysis):
+        AGENT_RUNS.inc(agent="staff", outcome="run")
+        return self.staff_agent.analyze_staff_requirements(
+            patient_info=case["patient_info"],
+            symptoms=case["symptoms"],
+            medical_history=case["medical_history"],
+            medications=case["medications"],
+            complexity="medium",  # Can be parameterized
+            urgency="routine" if not emergency_analysis else "urgent"
+        )
+
+    def _run_details(self, case):
+        AGENT_RUNS.inc(agent="details", outcome="run")
+        return self.details_agent.analyze_medical_details(
+            patient_info=case["patient_info"],
+            chief_complaint=case["chief_complaint"],
+            symptoms=case["symptoms"],
+            medical_history=case["medical_history"],
+            medications=case["medications"],
+            allergies=case["allergies"],
+            vital_signs=case["vital_signs"],
+            physical_exam=case["physical_exam"],
+            additional_info=case["additional_info"]
+        )
+
     @staticmethod
     def _generate_session_guidance(emergency_analysis, staff_analysis, details_analysis):
         """
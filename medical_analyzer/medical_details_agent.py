@@ -36,8 +36,9 @@ class MedicalDetailsAgent(LLMBaseAgent):
         self.agent_character = "Medical information assessment specialist"
         self.output_classes = MedicalDetailsAnalysis
         self.update_parser(MedicalDetailsAnalysis)
+        self.response_field = None  # The coordinator reads the whole analysis
 
-        self.system_prompt = """
+        self.system_prompt_template = """
 You are {agent_name}, a {agent_character}.
 
 Your role is to analyze what medical information has been provided and identify what additional details are needed
@@ -97,7 +98,7 @@ Rate information completeness on 1-10 scale:
 {output_format}
 """
 
-        self.user_prompt = """
+        self.user_prompt_template = """
 Analyze the provided medical information and identify gaps:
 
 Patient Information: {patient_info}
@@ -115,7 +116,7 @@ Assess what information is complete, what is missing, and what questions should
 
     def analyze_medical_details(self, patient_info, chief_complaint, symptoms="", medical_history="",
                                 medications="", allergies="", vital_signs="", physical_exam="", additional_info=""):
-        self.user_prompt = self.user_prompt.format(
+        self.user_prompt = self.user_prompt_template.format(
             patient_info=patient_info,
             chief_complaint=chief_complaint,
             symptoms=symptoms,
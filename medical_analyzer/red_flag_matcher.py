@@ -0,0 +1,354 @@
+import json
+import os
+import re
+import time
+from collections import deque
+
+# Red flags from the critical indicators of the emergency detection prompt, in English and Hebrew.
+# category -> phrases; any non-negated match of a CRITICAL category is an emergency on its own.
+CRITICAL_PHRASES = {
+    "chest_pain": [
+        "chest pain", "chest pressure", "pain in the chest", "pain in his chest", "pain in her chest",
+        "כאב בחזה", "כאבים בחזה", "לחץ בחזה",
+    ],
+    "breathing_difficulty": [
+        "difficulty breathing", "trouble breathing", "struggling to breathe", "can't breathe", "cannot breathe",
+        "can not breathe", "not breathing", "stopped breathing", "blue lips", "turning blue", "gasping for air",
+        "קוצר נשימה", "קשיי נשימה", "קושי בנשימה", "קושי לנשום", "מתקשה לנשום", "לא נושם",
+        "לא נושמת", "הפסיק לנשום", "הפסיקה לנשום", "שפתיים כחולות", "מכחיל", "מכחילה",
+    ],
+    "loss_of_consciousness": [
+        "lost consciousness", "loss of consciousness", "passed out", "fainted", "unconscious", "unresponsive",
+        "won't wake up", "not waking up",
+        "איבד הכרה", "איבדה הכרה", "איבוד הכרה", "חוסר הכרה", "מחוסר הכרה", "מחוסרת הכרה", "התעלף", "התעלפה",
+        "לא מגיב", "לא מגיבה", "לא מתעורר", "לא מתעוררת",
+    ],
+    "severe_bleeding": [
+        "severe bleeding", "heavy bleeding", "bleeding heavily", "bleeding a lot", "won't stop bleeding",
+        "bleeding that won't stop", "bleeding won't stop",
+        "דימום חזק", "דימום כבד", "דימום חמור", "מדמם הרבה", "מדממת הרבה", "דימום שלא נעצר", "לא מפסיק לדמם",
+    ],
+    "trauma": [
+        "head injury", "car accident", "fall from a height", "fell from a height", "fell from the roof",
+        "fell from a window", "fell from the window", "fell from the balcony", "fell down the stairs",
+        "פגיעת ראש", "נחבט בראש", "נחבטה בראש", "תאונת דרכים", "נפל מגובה", "נפלה מגובה",
+    ],
+    "burns": [
+        "severe burn", "bad burn", "burned badly", "chemical burn",
+        "כוויה קשה", "כוויה חמורה", "כוויות קשות", "כוויה כימית",
+    ],
+    "stroke": [
+        "having a stroke", "had a stroke", "is it a stroke", "signs of a stroke", "stroke symptoms",
+        "face drooping", "facial droop", "slurred speech", "weakness on one side",
+        "שבץ", "צניחת פנים", "פה עקום", "דיבור לא ברור", "חולשה בצד אחד",
+    ],
+    "heart_attack": [
+        "heart attack", "cardiac arrest",
+        "התקף לב", "דום לב",
+    ],
+    "anaphylaxis": [
+        "anaphylaxis", "anaphylactic", "severe allergic reaction", "throat swelling", "swollen throat",
+        "throat is closing", "swelling of the lips", "swollen tongue", "tongue swelling",
+        "אנפילקסיס", "תגובה אלרגית קשה", "תגובה אלרגית חמורה", "נפיחות בגרון", "הגרון נסגר", "התנפחות השפתיים",
+        "נפיחות בשפתיים", "נפיחות בלשון",
+    ],
+    "seizure": [
+        "seizure", "seizures", "convulsion", "convulsions", "convulsing",
+        "פרכוס", "פרכוסים", "מפרכס", "מפרכסת",
+    ],
+    "poisoning": [
+        "poisoning", "poisoned", "overdose", "swallowed pills", "swallowed medication", "swallowed bleach",
+        "swallowed a battery", "ingested poison", "ingested bleach", "ingested pills", "ingested medication",
+        "ingested a battery", "ingested chemicals",
+        "הרעלה", "מנת יתר", "בלע תרופות", "בלעה תרופות", "בלע כדורים", "בלעה כדורים", "בלע סוללה", "בלעה סוללה",
+        "בלע אקונומיקה", "בלעה אקונומיקה", "בליעת חומר",
+    ],
+    "severe_dehydration": [
+        "severe dehydration", "severely dehydrated", "no urine for", "hasn't peed",
+        "התייבשות קשה", "התייבשות חמורה", "לא עשה פיפי", "לא עשתה פיפי",
+    ],
+}
+
+# Red flag words that are also everyday English ("a stroke of luck", "ingested some water", "hit his head
+# yesterday, fine now"): they count for their CRITICAL category only next to another non-negated red flag
+# level finding (CONTEXT_CATEGORIES), never next to an ordinary symptom such as a cough
+CONTEXT_PHRASES = {
+    "trauma": ["hit his head", "hit her head", "fell from"],
+    "stroke": ["stroke"],
+    "poisoning": ["ingested"],
+}
+
+# Findings that are an emergency only in combination, per the prompt
+COMBINATION_PHRASES = {
+    "high_fever": ["high fever", "fever of 40", "fever 40", "חום גבוה", "חום 40", "חום של 40"],
+    "altered_mental_status": [
+        "confused", "confusion", "disoriented", "delirious", "hard to wake", "very drowsy", "very sleepy", "lethargic",
+        "hallucinating",
+        "מבולבל", "מבולבלת", "בלבול", "ישנוני מאוד", "ישנונית מאוד", "קשה להעיר", "הזיות", "רדום",
+    ],
+    "severe_abdominal_pain": [
+        "severe abdominal pain", "severe stomach pain", "severe belly pain", "terrible stomach pain",
+        "כאב בטן חזק", "כאבי בטן חזקים", "כאב בטן עז", "כאבי בטן עזים",
+    ],
+    "vomiting": ["vomiting", "throwing up", "vomited", "הקאות", "מקיא", "מקיאה", "הקיא", "הקיאה"],
+    "dehydration": ["dehydrated", "dehydration", "התייבשות", "מיובש", "מיובשת"],
+    "vulnerable": [
+        "newborn", "infant", "baby", "month old", "months old",
+        "תינוק", "תינוקת", "יילוד", "יילודה", "בן חודש", "בת חודש", "בן חודשיים", "בת חודשיים",
+    ],
+}
+CONTEXT_CATEGORIES = (set(CRITICAL_PHRASES) | set(COMBINATION_PHRASES)) - {"vulnerable"}
+COMBINATIONS = [
+    ({"high_fever", "altered_mental_status"}, "High fever with altered mental status"),
+    ({"severe_abdominal_pain", "vomiting"}, "Severe abdominal pain with vomiting"),
+    ({"dehydration", "vulnerable"}, "Dehydration in a vulnerable patient"),
+]
+
+# Not red flags, but enough to treat a message as a medical case
+SYMPTOM_PHRASES = {
+    "symptom": [
+        "symptom", "symptoms", "pain", "fever", "illness", "cough", "rash", "diarrhea", "headache", "sore throat",
+        "ear pain", "earache", "medical history", "chief complaint",
+        "כאב", "כאבים", "חום", "שיעול", "פריחה", "שלשול", "כאב ראש", "כאב גרון", "כאב אוזן", "תסמינים", "מחלה",
+    ],
+}
+
+NEGATION_CUES = {
+    "no", "not", "without", "denies", "denied", "never", "don't", "doesn't", "didn't", "isn't", "wasn't", "hasn't",
+    "negative", "ruled",
+    "לא", "אין", "ללא", "בלי", "אינו", "אינה", "שולל", "שוללת", "אף",
+}
+CLAUSE_BREAKS = {"|", "but", "however", "although", "אבל", "אך", "אולם"}
+NEGATION_WINDOW_TOKENS = 3
+HEBREW_PREFIX_LETTERS = "והבלמשכ"
+
+ALERT_MESSAGE = "RUN TO THE HOSPITAL IMMEDIATELY"
+
+# Message fields that are not patient text, and fields whose presence alone makes a message a medical case
+NON_TEXT_FIELDS = ("user_id", "message_id", "priority")
+CASE_FIELDS = ("chief_complaint", "symptoms", "medical_history")
+
+_NIQQUD = re.compile(r"[\u0591-\u05C7]")
+_CLAUSE_PUNCTUATION = re.compile(r"[.,;!?\n]+")
+_OTHER_PUNCTUATION = re.compile(r"[^\w\s'|]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text):
+    """Lowercase, strip niqqud, turn clause punctuation (commas too) into '|' breaks and collapse spaces"""
+    text = _NIQQUD.sub("", str(text).lower()).replace("’", "'")
+    text = _CLAUSE_PUNCTUATION.sub(" | ", text)
+    text = _OTHER_PUNCTUATION.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: one pass over the text finds every occurrence of every pattern"""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def finditer(self, text):
+        """Yield (start, end, pattern index) for every occurrence, overlapping ones included"""
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self.patterns
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield position + 1 - len(patterns[index]), position + 1, index
+
+
+class PreTriageResult:
+    def __init__(self, matches, combination_reasons):
+        self.matches = matches  # [(phrase, category, negated)]
+        active = [(phrase, category) for phrase, category, negated in matches if not negated]
+        self.categories = sorted({category for _, category in active})
+        critical = sorted({category for _, category in active if category in CRITICAL_PHRASES})
+        self.reasons = [category.replace("_", " ") for category in critical] + combination_reasons
+        self.is_emergency = bool(self.reasons)
+        self.is_medical = bool(active) or any(negated for _, _, negated in matches)
+
+    @property
+    def priority(self):
+        """
+        Scheduling class: emergency on red flags, urgent on a finding that is part of a red flag combination,
+        else routine. A vulnerable patient (baby, infant) is not a finding on its own.
+        """
+        if self.is_emergency:
+            return "emergency"
+        if any(category in COMBINATION_PHRASES and category != "vulnerable" for category in self.categories):
+            return "urgent"
+        return "routine"
+
+    def to_emergency_status(self):
+        """Same shape as ActiveSession.get_emergency_status()"""
+        if not self.is_emergency:
+            return {"is_emergency": False}
+        return {
+            "is_emergency": True,
+            "alert_message": ALERT_MESSAGE,
+            "emergency_level": "critical",
+            "reason": "Pre-triage red flags: " + ", ".join(self.reasons),
+        }
+
+    def __repr__(self):
+        return f"PreTriageResult(is_emergency={self.is_emergency}, reasons={self.reasons})"
+
+
+class RedFlagMatcher:
+    """
+    Local pre-triage: finds emergency red flags in English or Hebrew text in one Aho-Corasick pass,
+    skipping findings that are negated ("no chest pain", "אין קוצר נשימה") within the same clause.
+    Meant to get an alert out before the LLM emergency analysis, which still runs to confirm it.
+    """
+
+    def __init__(self):
+        phrase_table = {}
+        for table in (CRITICAL_PHRASES, COMBINATION_PHRASES, SYMPTOM_PHRASES, CONTEXT_PHRASES):
+            for category, phrases in table.items():
+                for phrase in phrases:
+                    phrase_table.setdefault(normalize(phrase), (category, table is CONTEXT_PHRASES))
+        self._phrases = list(phrase_table)
+        self._categories = [phrase_table[phrase][0] for phrase in self._phrases]
+        self._needs_context = [phrase_table[phrase][1] for phrase in self._phrases]
+        self._automaton = AhoCorasick(self._phrases)
+
+    @staticmethod
+    def _is_word_start(text, start):
+        """Match starts a word, allowing attached Hebrew prefixes (ו, ה, ב, ל, מ, ש, כ)"""
+        position = start
+        while position > 0 and start - position < 2 and text[position - 1] in HEBREW_PREFIX_LETTERS:
+            position -= 1
+        return position == 0 or not text[position - 1].isalnum()
+
+    @staticmethod
+    def _is_negated(text, start):
+        tokens = text[max(0, start - 80):start].split()
+        for token in reversed(tokens[-NEGATION_WINDOW_TOKENS:]):
+            if token in CLAUSE_BREAKS:
+                return False
+            if token in NEGATION_CUES:
+                return True
+        return False
+
+    def match(self, text):
+        normalized = normalize(text)
+        matches = []
+        contextual = []
+        for start, end, index in self._automaton.finditer(normalized):
+            if end < len(normalized) and normalized[end].isalnum():
+                continue
+            if not self._is_word_start(normalized, start):
+                continue
+            found = (self._phrases[index], self._categories[index], self._is_negated(normalized, start))
+            (contextual if self._needs_context[index] else matches).append(found)
+        if any(not negated and category in CONTEXT_CATEGORIES for _, category, negated in matches):
+            matches.extend(contextual)
+
+        active = {category for _, category, negated in matches if not negated}
+        combination_reasons = [reason for required, reason in COMBINATIONS if required <= active]
+        return PreTriageResult(matches, combination_reasons)
+
+    def match_message(self, message):
+        """
+        Pre-triage of a message dict. Only the field values are matched: names such as "symptoms" are symptom
+        phrases themselves. A non-empty case field still makes the message medical.
+        """
+        result = self.match(message_text(message))
+        if any(message.get(field) for field in CASE_FIELDS):
+            result.is_medical = True
+        return result
+
+
+def message_text(message):
+    """The patient text of a message dict, one clause per field"""
+    return " | ".join(
+        str(value) for key, value in message.items() if key not in NON_TEXT_FIELDS and value not in (None, "")
+    )
+
+
+RED_FLAG_MATCHER = RedFlagMatcher()
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "red_flag_corpus.jsonl")
+
+
+def _match_example(matcher, example):
+    """Corpus examples are free text ("text") or a message dict as the manager receives it ("message")"""
+    if "message" in example:
+        return matcher.match_message(example["message"])
+    return matcher.match(example["text"])
+
+
+def _example_text(example):
+    return message_text(example["message"]) if "message" in example else example["text"]
+
+
+def evaluate_corpus(matcher=RED_FLAG_MATCHER, path=CORPUS_PATH):
+    """Recall and precision of is_emergency against the labelled corpus; prints every miss"""
+    true_positive = false_positive = false_negative = total = 0
+    with open(path, encoding="utf-8") as corpus:
+        for line in corpus:
+            if not line.strip():
+                continue
+            example = json.loads(line)
+            total += 1
+            result = _match_example(matcher, example)
+            if result.is_emergency and example["emergency"]:
+                true_positive += 1
+            elif result.is_emergency:
+                false_positive += 1
+                print(f"false positive: {_example_text(example)} -> {result.reasons}")
+            elif example["emergency"]:
+                false_negative += 1
+                print(f"missed: {_example_text(example)}")
+    recall = true_positive / (true_positive + false_negative) if true_positive + false_negative else 1.0
+    precision = true_positive / (true_positive + false_positive) if true_positive + false_positive else 1.0
+    return {"examples": total, "recall": recall, "precision": precision,
+            "false_negatives": false_negative, "false_positives": false_positive}
+
+
+def benchmark(matcher=RED_FLAG_MATCHER, path=CORPUS_PATH, repeat=200):
+    with open(path, encoding="utf-8") as corpus:
+        texts = [_example_text(json.loads(line)) for line in corpus if line.strip()]
+    total_bytes = sum(len(text.encode("utf-8")) for text in texts) * repeat
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            matcher.match(text)
+    elapsed = time.perf_counter() - start_time
+    messages = len(texts) * repeat
+    print(f"{messages} messages in {elapsed:.3f}s: {messages / elapsed:,.0f} msg/s, "
+          f"{total_bytes / elapsed / 1e6:.2f} MB/s, {elapsed / messages * 1e6:.1f} us/msg")
+
+
+if __name__ == "__main__":
+    print(evaluate_corpus())
+    benchmark()
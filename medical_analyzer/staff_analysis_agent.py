@@ -28,8 +28,9 @@ class StaffAnalysisAgent(LLMBaseAgent):
         self.agent_character = "Medical staff coordination specialist"
         self.output_classes = StaffAnalysis
         self.update_parser(StaffAnalysis)
+        self.response_field = None  # The coordinator reads the whole analysis
         
-        self.system_prompt = """
+        self.system_prompt_template = """
 You are {agent_name}, a {agent_character}.
 
 Your role is to analyze medical cases and determine which type of medical staff and specialties are needed to provide
@@ -72,7 +73,7 @@ Consider patient age, symptoms, complexity of case, and required expertise level
 {output_format}
 """
         
-        self.user_prompt = """
+        self.user_prompt_template = """
 Analyze the following case to determine required medical staff and specialties:
 
 Patient Information: {patient_info}
@@ -94,7 +95,7 @@ Determine which specialties and staff roles are needed for this case.
             complexity="medium",
             urgency="routine"
     ):
-        self.user_prompt = self.user_prompt.format(
+        self.user_prompt = self.user_prompt_template.format(
             patient_info=patient_info,
             symptoms=symptoms,
             medical_history=medical_history,
@@ -0,0 +1,120 @@
+import asyncio
+import time
+from google.cloud import pubsub_v1
+from services.logging_service import get_logger
+from services.tracing_service import start_span, extract, bind_context
+from services.pubsub_service import (
+    PubSubService, MAX_LEASE_SECONDS, SUBSCRIBER_MAX_BYTES, HANDLER_DURATION, HANDLER_ERRORS,
+)
+
+logger = get_logger(__name__)
+
+
+class AsyncPubSubService:
+    """
+    asyncio front end for PubSubService: awaitable publishes and async message handlers that all run on one
+    event loop, with a concurrency limit per subscription instead of a thread per subscription or handler.
+    Clients, existence caches, codec, dedup and lease extension are shared with the wrapped PubSubService.
+    """
+
+    def __init__(self, project_id, backend=None, max_concurrency=100):
+        self.service = PubSubService(project_id, backend=backend)
+        self.max_concurrency = max_concurrency
+        self._streaming_futures = {}
+        self._tasks = set()
+
+    async def publish(self, topic_name: str, data, ordering_key: str = None):
+        """Publish and resolve to the Pub/Sub message id"""
+        loop = asyncio.get_running_loop()
+        if not self.service.is_topic_cached(topic_name):
+            await loop.run_in_executor(None, self.service.check_or_create_topic, topic_name)
+        future = self.service.publish_message(topic_name, data, ordering_key=ordering_key)
+        return await asyncio.wrap_future(future, loop=loop)
+
+    async def subscribe(self, topic_name: str, subscription_name: str, message_handler, max_concurrency=None):
+        """
+        Deliver messages to message_handler on the running loop. message_handler may be an async def
+        (preferred) or a plain function, which is then run in the default executor.
+        """
+        loop = asyncio.get_running_loop()
+        subscription_path = await loop.run_in_executor(
+            None, self.service.check_or_create_subscription, topic_name, subscription_name
+        )
+        limit = max_concurrency or self.max_concurrency
+        semaphore = asyncio.Semaphore(limit)
+        is_async_handler = asyncio.iscoroutinefunction(message_handler)
+
+        async def handle(decoded_message, message, retry_count, lease_key):
+            async with semaphore:
+                start_time = time.perf_counter()
+                trace_context, _ = extract(getattr(message, 'attributes', None))
+                try:
+                    with start_span("pubsub.handle", parent=trace_context, subscription=subscription_name):
+                        if is_async_handler:
+                            result = await message_handler(decoded_message)
+                        else:
+                            result = await loop.run_in_executor(
+                                None, bind_context(message_handler), decoded_message
+                            )
+
+                    if not result:
+                        logger.debug("Message handler returned False, dropping message after %s retries", retry_count)
+                    message.ack()
+                except Exception as e:
+                    logger.exception("Error processing message: %s", e,
+                                     extra={"message_id": message.message_id, "size": len(message.data)})
+                    HANDLER_ERRORS.inc(subscription=subscription_name)
+                    message.ack()
+                finally:
+                    HANDLER_DURATION.observe(time.perf_counter() - start_time, subscription=subscription_name)
+                    self.service.lease_extender.release(lease_key)
+
+        def schedule(message, decoded_message, retry_count, lease_key):
+            task = loop.create_task(handle(decoded_message, message, retry_count, lease_key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        def callback(message):
+            # Runs on the client's callback thread; only hands the message over to the loop
+            try:
+                accepted = self.service.accept_message(message, subscription_name)
+                if accepted is not None:
+                    loop.call_soon_threadsafe(schedule, message, *accepted)
+            except Exception as e:
+                logger.exception("Critical error in message callback, dropping message: %s", e)
+                self.service.lease_extender.release(f"{subscription_name}:{message.message_id}")
+                message.ack()
+
+        # The client never leases more messages than the handlers may run at once
+        flow_control = pubsub_v1.types.FlowControl(
+            max_messages=limit,
+            max_bytes=SUBSCRIBER_MAX_BYTES,
+            max_lease_duration=MAX_LEASE_SECONDS,
+        )
+        streaming_pull_future = self.service.subscriber.subscribe(
+            subscription_path,
+            callback=callback,
+            flow_control=flow_control,
+        )
+        key = f"{topic_name}:{subscription_name}"
+        self._streaming_futures[key] = streaming_pull_future
+
+        def on_stream_done(future):
+            if not future.cancelled() and future.exception() is not None:
+                logger.error("PubSub stream %s stopped: %s", key, future.exception())
+
+        streaming_pull_future.add_done_callback(on_stream_done)
+        return streaming_pull_future
+
+    def in_flight(self):
+        return len(self._tasks)
+
+    async def close(self, timeout=5.0):
+        for key, future in list(self._streaming_futures.items()):
+            logger.info("Cancelling subscription %s", key)
+            future.cancel()
+        self._streaming_futures.clear()
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+        # Draining joins threads and waits for publishes; keep that off the event loop
+        await asyncio.to_thread(self.service.close)
@@ -0,0 +1,133 @@
+import os
+import time
+import uuid
+from google.cloud import pubsub_v1
+from entities import PUBSUB_BACKEND_MEMORY
+from services.metrics_service import METRICS
+from services.logging_service import get_logger
+from services.tracing_service import start_span, inject
+from services.pubsub_memory_backend import InMemoryPublisherClient
+
+logger = get_logger(__name__)
+
+ALERT_DELIVERY_SECONDS = METRICS.histogram(
+    "emergency_alert_delivery_seconds", "Emergency detection until the alert publish was confirmed",
+    buckets=(0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0),
+)
+ALERTS = METRICS.counter("emergency_alerts_total", "Emergency alerts, per outcome (delivered, fallback, failed)")
+ALERT_ATTEMPTS = METRICS.counter("emergency_alert_publish_attempts_total", "Emergency alert publish attempts")
+SLA_BREACHES = METRICS.counter("emergency_alert_sla_breaches_total", "Alerts confirmed later than the SLA, or never")
+
+
+class EmergencyAlertPublisher:
+    """
+    Separate publish path for emergency alerts. It has its own publisher client, so alerts never wait in
+    the shared publisher's batches or flow-control queue; batching is off (one message, no delay) and the
+    channel is opened at startup. send() blocks until the server confirms, retrying within
+    retry_budget_seconds, and records the latency from detection against sla_seconds. When the budget
+    runs out the alert goes out on the regular patient topic through fallback(alert).
+    """
+
+    def __init__(self, pubsub_service, topic_name, fallback=None, sla_seconds=0.3, retry_budget_seconds=2.0,
+                 attempt_timeout_seconds=0.5):
+        self.pubsub_service = pubsub_service
+        self.topic_name = topic_name
+        self.fallback = fallback
+        self.sla_seconds = sla_seconds
+        self.retry_budget_seconds = retry_budget_seconds
+        self.attempt_timeout_seconds = attempt_timeout_seconds
+        self.topic_path = pubsub_service.check_or_create_topic(topic_name)
+        self.publisher = self._create_publisher_client(pubsub_service.backend)
+        self._warm_up()
+
+    @classmethod
+    def from_env(cls, pubsub_service, topic_name, fallback=None):
+        return cls(
+            pubsub_service,
+            topic_name,
+            fallback=fallback,
+            sla_seconds=float(os.getenv("EMERGENCY_ALERT_SLA_SECONDS", "0.3")),
+            retry_budget_seconds=float(os.getenv("EMERGENCY_ALERT_RETRY_BUDGET_SECONDS", "2")),
+            attempt_timeout_seconds=float(os.getenv("EMERGENCY_ALERT_ATTEMPT_TIMEOUT_SECONDS", "0.5")),
+        )
+
+    @staticmethod
+    def _create_publisher_client(backend):
+        # No ordering: a failed publish would pause the key, and each alert stands on its own
+        publisher_options = pubsub_v1.types.PublisherOptions(enable_message_ordering=False)
+        batch_settings = pubsub_v1.types.BatchSettings(max_messages=1, max_latency=0)
+        if backend == PUBSUB_BACKEND_MEMORY:
+            return InMemoryPublisherClient(publisher_options=publisher_options, batch_settings=batch_settings)
+        return pubsub_v1.PublisherClient(batch_settings=batch_settings, publisher_options=publisher_options)
+
+    def _warm_up(self):
+        """Open the channel (DNS, TLS, auth) now rather than on the first alert"""
+        start_time = time.perf_counter()
+        try:
+            self.publisher.get_topic(request={"topic": self.topic_path})
+            logger.info("Emergency publisher ready in %.1f ms", (time.perf_counter() - start_time) * 1000,
+                        extra={"topic": self.topic_name})
+        except Exception as e:
+            logger.warning("Emergency publisher warm-up failed: %s", e, extra={"topic": self.topic_name})
+
+    def send(self, alert, detected_at=None):
+        """
+        Publish alert and wait for the server to confirm it. detected_at is the time.perf_counter() at which
+        the emergency was detected. Returns the message id, or None when only the fallback (or nothing) went out.
+        """
+        detected_at = detected_at if detected_at is not None else time.perf_counter()
+        # Receivers can drop duplicates when a retry follows an attempt that did land
+        alert = dict(alert, alert_id=alert.get("alert_id") or uuid.uuid4().hex)
+        data_bytes, attributes = self.pubsub_service.codec.encode(alert)
+        deadline = time.perf_counter() + self.retry_budget_seconds
+        attempt = 0
+        last_error = None
+        with start_span("emergency.send_alert", topic=self.topic_name) as span:
+            inject(attributes, span)
+            while True:
+                attempt += 1
+                ALERT_ATTEMPTS.inc(topic=self.topic_name)
+                timeout = max(0.01, min(self.attempt_timeout_seconds, deadline - time.perf_counter()))
+                try:
+                    message_id = self.publisher.publish(topic=self.topic_path, data=data_bytes, **attributes).result(
+                        timeout=timeout
+                    )
+                    self._record(detected_at, "delivered", attempt)
+                    return message_id
+                except Exception as e:
+                    last_error = e
+                    logger.warning("Emergency alert attempt %s failed: %s", attempt, e,
+                                   extra={"topic": self.topic_name, "alert_id": alert["alert_id"]})
+                backoff = min(0.05 * 2 ** (attempt - 1), 0.4)
+                if time.perf_counter() + backoff >= deadline:
+                    break
+                time.sleep(backoff)
+            span.set_attribute("error", repr(last_error))
+
+        logger.error("Emergency alert not confirmed after %s attempts: %s", attempt, last_error,
+                     extra={"topic": self.topic_name, "alert_id": alert["alert_id"]})
+        if self.fallback is not None:
+            try:
+                self.fallback(alert)
+                self._record(detected_at, "fallback", attempt)
+                return None
+            except Exception as e:
+                logger.error("Emergency alert fallback failed: %s", e, extra={"alert_id": alert["alert_id"]})
+        self._record(detected_at, "failed", attempt)
+        return None
+
+    def _record(self, detected_at, outcome, attempts):
+        latency = time.perf_counter() - detected_at
+        ALERTS.inc(outcome=outcome)
+        if outcome == "delivered":
+            ALERT_DELIVERY_SECONDS.observe(latency)
+        if outcome != "delivered" or latency > self.sla_seconds:
+            SLA_BREACHES.inc()
+            logger.warning("Emergency alert missed the %.0f ms SLA", self.sla_seconds * 1000,
+                           extra={"outcome": outcome, "latency_ms": round(latency * 1000, 1), "attempts": attempts})
+
+    def stop(self):
+        try:
+            self.publisher.stop()
+        except Exception as e:
+            logger.warning("Error stopping emergency publisher: %s", e)
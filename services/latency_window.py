@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import deque
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+class LatencyWindow:
+    """
+    Fixed-size ring buffer of recent latency breakdowns ({component: milliseconds}).
+    Old entries fall off once capacity is reached, so memory stays bounded however long a run is,
+    and percentiles can be asked for over the whole buffer or only its last window_seconds.
+    """
+
+    def __init__(self, capacity=10000, percentiles=(50, 95, 99)):
+        self.capacity = capacity
+        self.percentiles = percentiles
+        self.total_recorded = 0
+        self._entries = deque(maxlen=capacity)  # (monotonic time, breakdown)
+        self._lock = threading.Lock()
+
+    def record(self, breakdown):
+        with self._lock:
+            self._entries.append((time.monotonic(), dict(breakdown)))
+            self.total_recorded += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def summary(self, window_seconds=None):
+        """{component: {"count", "mean", "p50", "p95", "p99", "max"}} over the buffer or the last window_seconds"""
+        with self._lock:
+            entries = list(self._entries)
+        if window_seconds is not None:
+            cutoff = time.monotonic() - window_seconds
+            entries = [entry for entry in entries if entry[0] >= cutoff]
+
+        by_component = {}
+        for _, breakdown in entries:
+            for component, value in breakdown.items():
+                if isinstance(value, (int, float)):
+                    by_component.setdefault(component, []).append(value)
+
+        result = {}
+        for component, values in by_component.items():
+            values.sort()
+            stats = {"count": len(values), "mean": sum(values) / len(values)}
+            for p in self.percentiles:
+                stats[f"p{p}"] = _percentile(values, p / 100)
+            stats["max"] = values[-1]
+            result[component] = stats
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+import httpx
+from openai import OpenAI
+from google import genai
+from anthropic import Anthropic
+from entities import PROJECT_NAME, SECRET_SERVICE_NAME
+from services.secret_manager_service import SecretManagerService
+from services.metrics_service import METRICS
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+LLM_CLIENTS_CREATED = METRICS.counter("llm_clients_created_total", "LLM SDK clients built, per provider")
+
+# Secret key and local fallback variable of each provider's API key
+API_KEYS = {
+    "anthropic": ("claude_key", "LOCAL_CLAUDE_KEY"),
+    "openai": ("openai_key", "LOCAL_OPENAI_KEY"),
+    "gemini": ("gemini_key", "LOCAL_GEMINI_KEY"),
+}
+
+
+class LLMClientRegistry:
+    """
+    One SDK client per provider for the whole process, created on first use. The Anthropic and OpenAI
+    clients share keep-alive HTTP pools sized with LLM_HTTP_MAX_CONNECTIONS, enough for every analysis
+    worker to have a request in flight, so agents and sessions can be created freely without building
+    clients, reading secrets or opening connections.
+    """
+
+    def __init__(self, max_connections=32, keepalive_seconds=120.0, secret_retry_seconds=1.0,
+                 secret_retry_max_seconds=60.0):
+        self.max_connections = max_connections
+        self.keepalive_seconds = keepalive_seconds
+        self.secret_retry_seconds = secret_retry_seconds
+        self.secret_retry_max_seconds = secret_retry_max_seconds
+        self._clients = {}
+        self._secrets = None
+        self._secret_failures = 0
+        self._secret_retry_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32")),
+            keepalive_seconds=float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "120")),
+            secret_retry_seconds=float(os.getenv("LLM_SECRET_RETRY_SECONDS", "1")),
+            secret_retry_max_seconds=float(os.getenv("LLM_SECRET_RETRY_MAX_SECONDS", "60")),
+        )
+
+    def anthropic(self):
+        return self._get("anthropic")
+
+    def openai(self):
+        return self._get("openai")
+
+    def gemini(self):
+        return self._get("gemini")
+
+    def _get(self, provider):
+        client = self._clients.get(provider)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(provider)
+            if client is None:
+                client = self._clients[provider] = self._create(provider)
+                LLM_CLIENTS_CREATED.inc(provider=provider)
+                logger.info("Created shared %s client", provider, extra={"max_connections": self.max_connections})
+            return client
+
+    def _create(self, provider):
+        api_key = self._api_key(provider)
+        if not api_key:
+            # Not cached, so the next call tries the secret again once its backoff is over
+            raise RuntimeError(f"No {provider} API key: not in Secret Manager and {API_KEYS[provider][1]} is unset")
+        if provider == "gemini":
+            # The genai client keeps its own pooled HTTP client; sharing the one instance shares that pool
+            return genai.client.Client(api_key=api_key)
+        http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=self.keepalive_seconds,
+            )
+        )
+        if provider == "anthropic":
+            return Anthropic(api_key=api_key, http_client=http_client)
+        return OpenAI(api_key=api_key, http_client=http_client)
+
+    def _api_key(self, provider):
+        secret_key, local_variable = API_KEYS[provider]
+        return self._load_secrets().get(secret_key) or os.getenv(local_variable)
+
+    def _load_secrets(self):
+        """
+        API keys from Secret Manager, read once. A failed read is not cached: until the next attempt, which
+        backs off exponentially up to secret_retry_max_seconds, only the local variables are used.
+        """
+        if self._secrets is not None:
+            return self._secrets
+        now = time.monotonic()
+        if now < self._secret_retry_at:
+            return {}
+        try:
+            self._secrets = json.loads(SecretManagerService(SECRET_SERVICE_NAME).access_secret(PROJECT_NAME))
+        except Exception as e:
+            delay = min(self.secret_retry_seconds * 2 ** self._secret_failures, self.secret_retry_max_seconds)
+            self._secret_failures += 1
+            self._secret_retry_at = now + delay
+            logger.warning("Error accessing API keys from secret manager, retrying in %.0fs: %s", delay, e)
+            return {}
+        self._secret_failures = 0
+        return self._secrets
+
+    def get_stats(self):
+        return {
+            "clients": sorted(self._clients),
+            "created": {provider: LLM_CLIENTS_CREATED.get(provider=provider) for provider in API_KEYS},
+        }
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for provider, client in clients.items():
+            close = getattr(client, "close", None)
+            if close is None:
+                continue
+            try:
+                close()
+            except Exception as e:
+                logger.warning("Error closing %s client: %s", provider, e)
+
+
+LLM_CLIENTS = LLMClientRegistry.from_env()
+
+
+if __name__ == "__main__":
+    # Check that building sessions' analyzers creates no SDK clients (so no pools or connections) and reads
+    # no secrets; run against the module the agents import, not this __main__ copy
+    from services.llm_client_registry import LLM_CLIENTS as registry
+    from medical_analyzer import MedicalAnalyzerCoordinator
+
+    before = registry.get_stats()
+    coordinators = [MedicalAnalyzerCoordinator() for _ in range(20)]
+    after = registry.get_stats()
+    print(f"{len(coordinators)} session analyzers ({len(coordinators) * 3} agents): "
+          f"clients before {before['created']}, after {after['created']}")
+    assert after == before, "creating session analyzers built LLM clients"
+    agents = [agent for c in coordinators for agent in (c.emergency_agent, c.staff_agent, c.details_agent)]
+    for name in API_KEYS:
+        shared = getattr(agents[0], f"{name}_client")
+        assert all(getattr(agent, f"{name}_client") is shared for agent in agents), f"{name} client not shared"
+    print("all agents share one client per provider:", registry.get_stats())
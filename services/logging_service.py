@@ -0,0 +1,107 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+_STANDARD_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_configure_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """'time level logger message key=value ...' where the pairs come from the record's extra fields"""
+
+    def __init__(self):
+        super().__init__(fmt="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = [
+            f"{key}={value}" for key, value in record.__dict__.items()
+            if key not in _STANDARD_RECORD_FIELDS and key not in ("sample_rate", "rate_limit")
+        ]
+        return f"{line} {' '.join(fields)}" if fields else line
+
+
+class CallSiteRateLimitFilter(logging.Filter):
+    """
+    Limits INFO and DEBUG records to max_per_second per call site (file and line), and applies
+    per-call sampling when a record carries extra={"sample_rate": p}. Warnings and errors always pass.
+    The number of dropped records is reported on the next record that gets through from the same site.
+    """
+
+    def __init__(self, max_per_second=20):
+        super().__init__()
+        self.max_per_second = max_per_second
+        self._sites = {}  # (pathname, lineno) -> [window start, count in window, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return False
+
+        limit = getattr(record, "rate_limit", self.max_per_second)
+        if not limit:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.setdefault((record.pathname, record.lineno), [now, 0, 0])
+            if now - site[0] >= 1.0:
+                site[0], site[1] = now, 0
+            if site[1] >= limit:
+                site[2] += 1
+                return False
+            site[1] += 1
+            if site[2]:
+                record.suppressed = site[2]
+                site[2] = 0
+        return True
+
+
+def configure_logging(level=None, stream=None):
+    """
+    Route every logger through a queue drained by one background writer thread, so hot paths never
+    block on console I/O. Called by entry points (main.py, scripts), never on import, so a library user
+    keeps its own logging setup. Safe to call more than once; only the first call installs the handlers.
+    """
+    global _listener, _queue_handler
+    with _configure_lock:
+        if _listener is not None:
+            return
+        log_queue = queue.Queue(-1)
+        output_handler = logging.StreamHandler(stream or sys.stdout)
+        output_handler.setFormatter(StructuredFormatter())
+        _listener = QueueListener(log_queue, output_handler, respect_handler_level=False)
+
+        _queue_handler = QueueHandler(log_queue)
+        _queue_handler.addFilter(CallSiteRateLimitFilter(int(os.getenv("LOG_MAX_PER_SITE_PER_SECOND", "20"))))
+        root = logging.getLogger()
+        root.addHandler(_queue_handler)
+        root.setLevel(level or os.getenv("LOG_LEVEL", "INFO").upper())
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener, _queue_handler
+    with _configure_lock:
+        if _listener is not None:
+            logging.getLogger().removeHandler(_queue_handler)
+            _listener.stop()
+            _listener = None
+            _queue_handler = None
+
+
+def get_logger(name):
+    return logging.getLogger(name)
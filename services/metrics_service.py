@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_key):
+    if not label_key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in label_key) + "}"
+
+
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    type_name = "histogram"
+
+    def __init__(self, name, description, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    result.append((f"{self.name}_bucket", key + (("le", repr(bound)),), cumulative))
+                result.append((f"{self.name}_bucket", key + (("le", "+Inf"),), series[-1]))
+                result.append((f"{self.name}_sum", key, series[-2]))
+                result.append((f"{self.name}_count", key, series[-1]))
+        return result
+
+
+class MetricsRegistry:
+    """Process-wide registry of counters, gauges and latency histograms, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name, description, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, description, **kwargs)
+                return metric
+            if type(metric) is not metric_class:
+                raise ValueError(f"Metric {name} already registered as {metric.type_name}")
+            if description and not metric.description:
+                metric.description = description
+            return metric
+
+    def counter(self, name, description=""):
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name, description=""):
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(self, name, description="", buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, description, buckets=buckets)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for sample_name, label_key, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(label_key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are frequent; keep them out of the console
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """Serve METRICS at http://host:port/metrics from a daemon thread; METRICS_PORT=0 disables it"""
+    global _metrics_server
+    port = int(os.getenv("METRICS_PORT", "9100")) if port is None else port
+    if not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is not None:
+            return _metrics_server
+        try:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+        except OSError as e:
+            logger.warning("Could not start metrics server on %s:%s: %s", host, port, e)
+            return None
+        threading.Thread(target=_metrics_server.serve_forever, daemon=True, name="metrics-server").start()
+        logger.info("Metrics available at http://%s:%s/metrics", host, port)
+        return _metrics_server
+
+
+def stop_metrics_server():
+    global _metrics_server
+    with _metrics_server_lock:
+        if _metrics_server is not None:
+            _metrics_server.shutdown()
+            _metrics_server.server_close()
+            _metrics_server = None
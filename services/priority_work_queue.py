@@ -0,0 +1,152 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from services.metrics_service import METRICS
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+PRIORITY_CLASSES = ("emergency", "urgent", "routine")  # Highest first
+_PRIORITY_RANK = {name: rank for rank, name in enumerate(PRIORITY_CLASSES)}
+
+QUEUE_WAIT_SECONDS = METRICS.histogram(
+    "work_queue_wait_seconds", "Time a task waited for a worker, per queue and priority class"
+)
+QUEUE_DEPTH = METRICS.gauge("work_queue_depth", "Tasks waiting for a worker, per queue and priority class")
+QUEUE_TASKS = METRICS.counter("work_queue_tasks_total", "Tasks started, per queue and priority class")
+TASK_SECONDS = METRICS.histogram("work_queue_task_seconds", "Task run time, per queue and priority class")
+BUSY_WORKERS = METRICS.gauge("work_queue_busy_workers", "Workers running a task, per queue")
+BLOCKED_SUBMITS = METRICS.counter("work_queue_blocked_submits_total", "Submits that waited for room in a full queue")
+
+
+def priority_rank(priority):
+    """Rank of a priority class name; unknown names are treated as routine"""
+    return _PRIORITY_RANK.get(priority, len(PRIORITY_CLASSES) - 1)
+
+
+class PriorityWorkQueue:
+    """
+    Fixed pool of workers that always take the highest priority task waiting, oldest first within a class.
+    reserved_workers of the workers only take emergency tasks, so a burst of routine work, each running
+    several LLM calls, can never occupy every worker (and every provider connection) while an emergency
+    waits; routine and urgent work share the rest. With max_pending set, submit blocks while that many
+    tasks are waiting, which pushes back on whoever feeds the queue. Tasks submitted with the same key
+    (a session id) run one at a time in submit order, whatever their priority; tasks of other keys are
+    not held up by them.
+    """
+
+    def __init__(self, workers=8, reserved_workers=2, name="work", max_pending=0):
+        if not 0 <= reserved_workers < workers:
+            raise ValueError("reserved_workers must leave at least one general worker")
+        self.name = name
+        self.workers = workers
+        self.reserved_workers = reserved_workers
+        self.max_pending = max_pending
+        self._heap = []  # (rank, seq, enqueued at, priority, func, args, key)
+        self._keys = {}  # key -> tasks waiting for the key's queued or running task, oldest first
+        self._pending = 0  # Tasks in the heap or waiting behind their key
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._running = True
+        self._active = 0
+        self._threads = []
+        for index in range(workers):
+            max_rank = 0 if index < reserved_workers else len(PRIORITY_CLASSES) - 1
+            thread = threading.Thread(target=self._worker, args=(max_rank,), daemon=True, name=f"{name}-worker-{index}")
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def accepting(self):
+        return self._running
+
+    def submit(self, priority, func, *args, key=None):
+        """Queue func(*args) under a class from PRIORITY_CLASSES, behind the earlier tasks of key if given"""
+        if priority not in _PRIORITY_RANK:
+            priority = PRIORITY_CLASSES[-1]
+        with self._condition:
+            if self.max_pending and self._pending >= self.max_pending:
+                BLOCKED_SUBMITS.inc(queue=self.name)
+                while self._running and self._pending >= self.max_pending:
+                    self._condition.wait()
+            if not self._running:
+                raise RuntimeError(f"{self.name} is shut down")
+            entry = (priority_rank(priority), next(self._seq), time.monotonic(), priority, func, args, key)
+            self._pending += 1
+            QUEUE_DEPTH.inc(queue=self.name, priority=priority)
+            if key is not None and key in self._keys:
+                self._keys[key].append(entry)  # Queued when the key's current task finishes
+                return
+            if key is not None:
+                self._keys[key] = deque()
+            heapq.heappush(self._heap, entry)
+            # Wake everyone: a reserved worker may not be allowed to take this task
+            self._condition.notify_all()
+
+    def _release_key_locked(self, key):
+        waiting = self._keys.get(key)
+        if waiting:
+            heapq.heappush(self._heap, waiting.popleft())
+        else:
+            self._keys.pop(key, None)
+
+    def _worker(self, max_rank):
+        while True:
+            with self._condition:
+                while not (self._heap and self._heap[0][0] <= max_rank):
+                    if not self._running and not any(self._keys.values()):
+                        return  # Shut down with nothing left this worker may take
+                    self._condition.wait()
+                _, _, enqueued_at, priority, func, args, key = heapq.heappop(self._heap)
+                self._pending -= 1
+                self._active += 1
+                if self.max_pending:
+                    self._condition.notify_all()  # Room for a blocked submit
+            BUSY_WORKERS.inc(queue=self.name)
+            QUEUE_DEPTH.dec(queue=self.name, priority=priority)
+            QUEUE_WAIT_SECONDS.observe(time.monotonic() - enqueued_at, queue=self.name, priority=priority)
+            QUEUE_TASKS.inc(queue=self.name, priority=priority)
+            start_time = time.perf_counter()
+            try:
+                func(*args)
+            except Exception as e:
+                logger.exception("%s task error: %s", self.name, e, extra={"priority": priority})
+            finally:
+                TASK_SECONDS.observe(time.perf_counter() - start_time, queue=self.name, priority=priority)
+                BUSY_WORKERS.dec(queue=self.name)
+                with self._condition:
+                    self._active -= 1
+                    if key is not None:
+                        self._release_key_locked(key)
+                    self._condition.notify_all()
+
+    def get_stats(self):
+        with self._condition:
+            waiting = {priority: 0 for priority in PRIORITY_CLASSES}
+            for entry in itertools.chain(self._heap, *self._keys.values()):
+                waiting[entry[3]] += 1
+            return {
+                "workers": self.workers,
+                "reserved_workers": self.reserved_workers,
+                "active": self._active,
+                "occupancy": round(self._active / self.workers, 3),
+                "waiting": waiting,
+            }
+
+    def shutdown(self, timeout=None, discard_pending=False):
+        """
+        Stop taking new work, let the workers finish what is queued, and wait up to timeout for them.
+        With discard_pending the queued tasks are dropped instead; only the running ones finish.
+        """
+        with self._condition:
+            self._running = False
+            if discard_pending:
+                for entry in itertools.chain(self._heap, *self._keys.values()):
+                    QUEUE_DEPTH.dec(queue=self.name, priority=entry[3])
+                self._heap, self._keys, self._pending = [], {}, 0
+            self._condition.notify_all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
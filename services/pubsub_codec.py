@@ -0,0 +1,178 @@
+import json
+import time
+import zlib
+from services.logging_service import get_logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = get_logger(__name__)
+
+CONTENT_TYPE_ATTRIBUTE = "content-type"
+CONTENT_ENCODING_ATTRIBUTE = "content-encoding"
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+TEXT_CONTENT_TYPE = "text/plain; charset=utf-8"
+BYTES_CONTENT_TYPE = "application/octet-stream"
+ZLIB_ENCODING = "zlib"
+
+
+class UnsupportedContentType(Exception):
+    pass
+
+
+class JsonCodec:
+    name = "json"
+    content_type = JSON_CONTENT_TYPE
+
+    @staticmethod
+    def encode(data):
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    @staticmethod
+    def decode(payload):
+        return json.loads(payload)
+
+
+class OrjsonCodec:
+    """Same wire format as JsonCodec, several times faster in both directions"""
+    name = "orjson"
+    content_type = JSON_CONTENT_TYPE
+
+    @staticmethod
+    def encode(data):
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    @staticmethod
+    def decode(payload):
+        return orjson.loads(payload)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    content_type = MSGPACK_CONTENT_TYPE
+
+    @staticmethod
+    def encode(data):
+        return msgpack.packb(data, use_bin_type=True)
+
+    @staticmethod
+    def decode(payload):
+        return msgpack.unpackb(payload, raw=False)
+
+
+def available_codecs():
+    codecs = {JsonCodec.name: JsonCodec}
+    if orjson is not None:
+        codecs[OrjsonCodec.name] = OrjsonCodec
+    if msgpack is not None:
+        codecs[MsgpackCodec.name] = MsgpackCodec
+    return codecs
+
+
+class MessageCodec:
+    """
+    Encodes outgoing payloads with the preferred codec and records it in the content-type attribute,
+    decodes incoming payloads according to the attributes the publisher set.
+    Every consumer can decode JSON; a codec with another wire format (msgpack) is only used when it is
+    listed in consumer_codecs, the codecs every subscriber of the deployment is known to have installed.
+    Otherwise the payload goes out as JSON.
+    """
+
+    def __init__(self, codec_name="orjson", compression_threshold=0, consumer_codecs=(JsonCodec.name,)):
+        codecs = available_codecs()
+        if codec_name not in codecs:
+            logger.warning("Codec %s is not installed, falling back to %s", codec_name, JsonCodec.name)
+            codec_name = JsonCodec.name
+        if codecs[codec_name].content_type != JSON_CONTENT_TYPE and codec_name not in consumer_codecs:
+            fallback = OrjsonCodec.name if OrjsonCodec.name in codecs else JsonCodec.name
+            logger.warning("Not every consumer supports %s, publishing with %s", codec_name, fallback)
+            codec_name = fallback
+        self.codec = codecs[codec_name]
+        self.compression_threshold = compression_threshold
+        # Prefer the fastest installed JSON implementation for decoding, whoever encoded it
+        self._decoders = {
+            JSON_CONTENT_TYPE: (OrjsonCodec if orjson is not None else JsonCodec).decode,
+        }
+        if msgpack is not None:
+            self._decoders[MSGPACK_CONTENT_TYPE] = MsgpackCodec.decode
+
+    def encode(self, data):
+        """Return (payload bytes, message attributes)"""
+        if isinstance(data, bytes):
+            payload, content_type = data, BYTES_CONTENT_TYPE
+        elif isinstance(data, str):
+            payload, content_type = data.encode("utf-8"), TEXT_CONTENT_TYPE
+        else:
+            try:
+                payload, content_type = self.codec.encode(data), self.codec.content_type
+            except (TypeError, ValueError):
+                payload, content_type = str(data).encode("utf-8"), TEXT_CONTENT_TYPE
+
+        attributes = {CONTENT_TYPE_ATTRIBUTE: content_type}
+        if self.compression_threshold and len(payload) > self.compression_threshold:
+            payload = zlib.compress(payload, 1)
+            attributes[CONTENT_ENCODING_ATTRIBUTE] = ZLIB_ENCODING
+        return payload, attributes
+
+    def decode(self, payload, attributes=None):
+        attributes = attributes or {}
+        encoding = attributes.get(CONTENT_ENCODING_ATTRIBUTE)
+        if encoding == ZLIB_ENCODING:
+            payload = zlib.decompress(payload)
+        elif encoding:
+            raise UnsupportedContentType(f"Unsupported content-encoding {encoding}")
+
+        content_type = attributes.get(CONTENT_TYPE_ATTRIBUTE)
+        if content_type is None:
+            return self._decode_legacy(payload)
+        if content_type == TEXT_CONTENT_TYPE:
+            return payload.decode("utf-8", errors="replace")
+        if content_type == BYTES_CONTENT_TYPE:
+            return payload
+        decoder = self._decoders.get(content_type)
+        if decoder is None:
+            raise UnsupportedContentType(f"Unsupported content-type {content_type}")
+        return decoder(payload)
+
+    def _decode_legacy(self, payload):
+        """Messages from publishers that predate the content-type attribute: JSON if possible, else text"""
+        try:
+            return self._decoders[JSON_CONTENT_TYPE](payload)
+        except ValueError:
+            return payload.decode("utf-8", errors="replace")
+
+
+def benchmark_decode(iterations=2000, compression_threshold=1024):
+    """Print decode throughput of every installed codec, with and without compression"""
+    sample = {
+        "user_id": "id01234",
+        "message": "הילד שלי עם כאב בטן וחום של 38.2 מעלות כבר שעתיים",
+        "chat_history": [
+            {"role": "patient" if i % 2 else "manager", "text": f"הודעה מספר {i} " * 8, "timestamp": 1718000000 + i}
+            for i in range(40)
+        ],
+        "medical_analysis": {"alert_level": "normal", "questions_to_ask": ["מה החום?"] * 5},
+    }
+    for name, codec_class in available_codecs().items():
+        for threshold in (0, compression_threshold):
+            payload, attributes = MessageCodec(name, compression_threshold=threshold).encode(sample)
+            compressed = CONTENT_ENCODING_ATTRIBUTE in attributes
+            start = time.perf_counter()
+            for _ in range(iterations):
+                codec_class.decode(zlib.decompress(payload) if compressed else payload)
+            elapsed = time.perf_counter() - start
+            label = f"{name}{'+zlib' if compressed else ''}"
+            print(f"{label:<14} {len(payload):>7} bytes  {iterations / elapsed:>10.0f} msg/s  "
+                  f"{len(payload) * iterations / elapsed / 1e6:>8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    benchmark_decode()
@@ -0,0 +1,51 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class MessageDedupCache:
+    """Bounded TTL/LRU set of recently seen Pub/Sub message ids, used to drop redeliveries"""
+
+    def __init__(self, max_size=10000, ttl_seconds=600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.duplicates_suppressed = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # message key -> first seen (monotonic)
+        self._lock = threading.Lock()
+
+    def check_and_mark(self, message_key):
+        """Return True if message_key was already seen within the TTL, otherwise remember it"""
+        now = time.monotonic()
+        with self._lock:
+            seen_at = self._entries.get(message_key)
+            if seen_at is not None and now - seen_at < self.ttl_seconds:
+                self._entries.move_to_end(message_key)
+                self.duplicates_suppressed += 1
+                return True
+
+            self._entries[message_key] = now
+            self._entries.move_to_end(message_key)
+            self._evict(now)
+            return False
+
+    def forget(self, message_key):
+        """Allow a message to be processed again, e.g. after it was nacked for another replica"""
+        with self._lock:
+            self._entries.pop(message_key, None)
+
+    def _evict(self, now):
+        while self._entries:
+            oldest_key, oldest_seen = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_size and now - oldest_seen < self.ttl_seconds:
+                break
+            del self._entries[oldest_key]
+            self.evictions += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "duplicates_suppressed": self.duplicates_suppressed,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+import zlib
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Partition:
+    def __init__(self, index, max_queue_size):
+        self.index = index
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.processed = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.blocked_submits = 0
+        self.thread = None
+
+
+class KeyPartitionedDispatcher:
+    """
+    Runs message handlers on a fixed pool of partition workers.
+    Work with the same key always lands on the same partition, so one session's messages run in order
+    while different sessions run concurrently. A full partition blocks the caller, which keeps the
+    Pub/Sub message outstanding and lets subscriber flow control stop pulling.
+    """
+
+    def __init__(self, num_partitions, max_queue_size=10, name="dispatcher"):
+        self.name = name
+        self._partitions = [_Partition(i, max_queue_size) for i in range(num_partitions)]
+        self._running = True
+        self._discard_pending = False
+        self._lock = threading.Lock()
+        for partition in self._partitions:
+            partition.thread = threading.Thread(
+                target=self._worker, args=(partition,), daemon=True, name=f"{name}-partition-{partition.index}"
+            )
+            partition.thread.start()
+
+    def partition_for(self, key):
+        if not key:
+            return self._partitions[0]
+        return self._partitions[zlib.crc32(str(key).encode()) % len(self._partitions)]
+
+    def submit(self, key, func, *args):
+        """Queue func(*args) on the partition owning key; blocks while that partition is full"""
+        if not self._running:
+            raise RuntimeError(f"{self.name} is shut down")
+        partition = self.partition_for(key)
+        item = (time.monotonic(), func, args)
+        try:
+            partition.queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                partition.blocked_submits += 1
+            partition.queue.put(item)
+        return partition.index
+
+    def _worker(self, partition):
+        while True:
+            try:
+                item = partition.queue.get(timeout=0.5)
+            except queue.Empty:
+                if not self._running:
+                    break
+                continue
+            enqueued_at, func, args = item
+            if self._discard_pending:
+                partition.queue.task_done()
+                continue
+            wait_ms = (time.monotonic() - enqueued_at) * 1000
+            with self._lock:
+                partition.processed += 1
+                partition.total_wait_ms += wait_ms
+                partition.max_wait_ms = max(partition.max_wait_ms, wait_ms)
+            try:
+                func(*args)
+            except Exception as e:
+                logger.exception("%s partition %s handler error: %s", self.name, partition.index, e)
+            finally:
+                partition.queue.task_done()
+
+    def get_stats(self):
+        """Queue depth and wait time per partition"""
+        with self._lock:
+            return [
+                {
+                    "partition": partition.index,
+                    "queue_depth": partition.queue.qsize(),
+                    "processed": partition.processed,
+                    "avg_wait_ms": partition.total_wait_ms / partition.processed if partition.processed else 0.0,
+                    "max_wait_ms": partition.max_wait_ms,
+                    "blocked_submits": partition.blocked_submits,
+                }
+                for partition in self._partitions
+            ]
+
+    def drain(self, timeout=None):
+        """Wait until every queued and running item has finished; returns False if the timeout hit first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for partition in self._partitions:
+            tasks = partition.queue
+            with tasks.all_tasks_done:
+                while tasks.unfinished_tasks:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    tasks.all_tasks_done.wait(timeout=remaining)
+        return True
+
+    def shutdown(self, wait=False, timeout=None, discard_pending=False):
+        """
+        Stop accepting work. Workers finish what is already queued and exit, or with discard_pending
+        drop queued items without running them (their messages are expected to be nacked by the caller).
+        """
+        if not self._running:
+            return
+        self._discard_pending = discard_pending
+        self._running = False
+        if wait:
+            for partition in self._partitions:
+                partition.thread.join(timeout=timeout)
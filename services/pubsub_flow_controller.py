@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from collections import deque
+from services.logging_service import get_logger
+from services.metrics_service import METRICS
+
+logger = get_logger(__name__)
+
+FLOW_CONTROL_LIMIT = METRICS.gauge(
+    "pubsub_flow_control_limit", "Current adaptive limit of in-flight messages per subscription"
+)
+# Incremented by LLMBaseAgent; looked up by name so the bus layer does not import the agents
+LLM_RATE_LIMITED = METRICS.counter("llm_rate_limited_total")
+
+
+class AdaptiveFlowController:
+    """
+    Adjusts how many messages of one subscription may be in flight, between min_limit and max_limit.
+    Every interval it looks at handler p95 latency, handler error rate, LLM 429s and whether callbacks are
+    queueing up behind the limit: it backs off multiplicatively on throttling, errors or slow handlers and
+    grows additively while a backlog builds with healthy handlers. Each change is kept in `decisions`.
+    A slot is held, and the handler's duration measured, until its message is acked: for handlers that
+    hand the work on (the manager pipeline) that includes the LLM analysis and its outcome.
+    """
+
+    def __init__(self, name, min_limit=2, max_limit=25, initial_limit=None, target_p95_seconds=30.0,
+                 max_error_rate=0.2, interval_seconds=10.0, window_size=200):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = initial_limit or max_limit
+        self.target_p95_seconds = target_p95_seconds
+        self.max_error_rate = max_error_rate
+        self.interval_seconds = interval_seconds
+        self.decisions = deque(maxlen=100)
+        self._in_flight = 0
+        self._waiting = 0
+        self._samples = deque(maxlen=window_size)  # (duration seconds, failed)
+        self._last_throttled = LLM_RATE_LIMITED.total()
+        self._last_waiting = 0
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        FLOW_CONTROL_LIMIT.set(self.limit, subscription=name)
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"flow-control-{name}")
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, name):
+        return cls(
+            name,
+            min_limit=int(os.getenv("PUBSUB_MIN_OUTSTANDING", "2")),
+            max_limit=int(os.getenv("PUBSUB_MAX_OUTSTANDING", "25")),
+            target_p95_seconds=float(os.getenv("PUBSUB_TARGET_HANDLER_P95_SECONDS", "30")),
+            interval_seconds=float(os.getenv("PUBSUB_FLOW_CONTROL_INTERVAL_SECONDS", "10")),
+        )
+
+    def acquire(self, timeout=None):
+        """Block until a slot is free under the current limit; returns False on timeout or stop"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._waiting += 1
+            try:
+                while self._in_flight >= self.limit and not self._stopped.is_set():
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(timeout=remaining)
+                if self._stopped.is_set():
+                    return False
+                self._in_flight += 1
+                return True
+            finally:
+                self._waiting -= 1
+
+    def release(self, duration, failed=False):
+        with self._condition:
+            self._in_flight -= 1
+            self._samples.append((duration, failed))
+            self._condition.notify()
+
+    def _run(self):
+        while not self._stopped.wait(timeout=self.interval_seconds):
+            self.adjust()
+
+    def adjust(self):
+        with self._condition:
+            samples = list(self._samples)
+            self._samples.clear()
+            waiting = self._waiting
+            saturated = self._in_flight >= self.limit
+
+        throttled_total = LLM_RATE_LIMITED.total()
+        throttled = throttled_total - self._last_throttled
+        self._last_throttled = throttled_total
+        backlog_growth = waiting - self._last_waiting
+        self._last_waiting = waiting
+
+        durations = sorted(duration for duration, _ in samples)
+        p95 = durations[int(0.95 * (len(durations) - 1))] if durations else None
+        error_rate = sum(1 for _, failed in samples if failed) / len(samples) if samples else 0.0
+
+        old_limit = self.limit
+        if throttled:
+            new_limit, reason = int(old_limit * 0.7), f"{throttled} LLM 429 responses"
+        elif error_rate > self.max_error_rate:
+            new_limit, reason = int(old_limit * 0.7), f"handler error rate {error_rate:.0%}"
+        elif p95 is not None and p95 > self.target_p95_seconds:
+            new_limit, reason = int(old_limit * 0.85), f"handler p95 {p95:.1f}s above target"
+        elif saturated and (waiting > 0 and backlog_growth >= 0):
+            new_limit, reason = old_limit + 1, f"{waiting} messages waiting for a slot"
+        else:
+            return None
+
+        new_limit = max(self.min_limit, min(self.max_limit, new_limit))
+        if new_limit == old_limit:
+            return None
+
+        with self._condition:
+            self.limit = new_limit
+            self._condition.notify_all()
+        decision = {
+            "time": time.time(),
+            "old_limit": old_limit,
+            "new_limit": new_limit,
+            "reason": reason,
+            "p95_seconds": p95,
+            "error_rate": error_rate,
+            "llm_throttled": throttled,
+            "waiting": waiting,
+        }
+        self.decisions.append(decision)
+        FLOW_CONTROL_LIMIT.set(new_limit, subscription=self.name)
+        logger.info("Flow control limit %s -> %s: %s", old_limit, new_limit, reason, extra={"subscription": self.name})
+        return decision
+
+    def get_stats(self):
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "decisions": list(self.decisions),
+            }
+
+    def stop(self):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify_all()
@@ -2,29 +2,36 @@ from abc import ABC, abstractmethod
 
 from entities import SECRET_SERVICE_NAME
 from services.pubsub_service import PubSubService
+from services.pubsub_provisioning import PubSubProvisioner
 from services.secret_manager_service import SecretManagerService
 from dotenv import load_dotenv
-from helper_methods import get_pubsub_postfix
+from helper_methods import get_pubsub_postfix, get_pubsub_backend
 from services.pubsub_permissions import TypeToPubsub
+from services.logging_service import get_logger
 load_dotenv()
 
+logger = get_logger(__name__)
+
 
 class PubsubFunctions(ABC):
-    def __init__(self, agent_permissions: str, agent_name: str = ""):
+    def __init__(self, agent_permissions: str, agent_name: str = "", pubsub_backend: str = None,
+                 subscription_suffix: str = ""):
         self.sending_to = []
         self.listen_to = []
         self.pubsub_postfix = get_pubsub_postfix()
-        self.pubsub_service = PubSubService(SECRET_SERVICE_NAME)
+        self.pubsub_backend = pubsub_backend or get_pubsub_backend()
+        self.pubsub_service = PubSubService(SECRET_SERVICE_NAME, backend=self.pubsub_backend)
         self.secret_manager = SecretManagerService(SECRET_SERVICE_NAME)
+        PubSubProvisioner(self.pubsub_service).provision(self.pubsub_postfix)
 
         type_to_sub = TypeToPubsub(agent_permissions)
         for listen_topic in type_to_sub.listen_to:
             current_topic = f"{listen_topic}{self.pubsub_postfix}"
-            print(f"{agent_name} listening to {current_topic}")
+            logger.info("%s listening to %s", agent_name, current_topic)
             self.pubsub_service.subscribe_to_topic(
                 topic_name=f"{current_topic}",
-                subscription_name=f"{current_topic}_subscription",
-                message_handler=self.handle_incoming_message
+                subscription_name=f"{current_topic}_subscription{subscription_suffix}",
+                message_handler=self.message_handler_for(listen_topic)
             )
             self.listen_to.append(f"{current_topic}")
 
@@ -36,8 +43,12 @@ class PubsubFunctions(ABC):
     def handle_incoming_message(self, message):
         pass
 
+    def message_handler_for(self, topic):
+        """Handler for one of the listened topics (name without the postfix); all go to handle_incoming_message"""
+        return self.handle_incoming_message
+
     @abstractmethod
-    def publish_one_message(self, message, topic):
+    def publish_one_message(self, message, topic, ordering_key=None):
         pass
 
     def check_if_listen_to(self, pub_sub_topic):
@@ -0,0 +1,100 @@
+import threading
+import time
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+
+class _TrackedLease:
+    __slots__ = ("message", "started_at", "next_extension")
+
+    def __init__(self, message, started_at, next_extension):
+        self.message = message
+        self.started_at = started_at
+        self.next_extension = next_extension
+
+
+class LeaseExtender:
+    """
+    Tracks the messages whose handler is still queued or running, so a drain can nack them, and with
+    extend_leases keeps extending their ack deadline so long medical analyses are not redelivered halfway
+    through. The google-cloud-pubsub streaming pull already does that up to FlowControl.max_lease_duration,
+    so extension is only turned on for backends that do not manage leases themselves.
+    """
+
+    def __init__(self, ack_deadline_seconds=10, max_lease_seconds=600, name="lease-extender", extend_leases=True):
+        self.ack_deadline_seconds = ack_deadline_seconds
+        self.max_lease_seconds = max_lease_seconds
+        # Extend well before the deadline so a slow tick does not let the lease lapse
+        self.extension_interval = max(1.0, ack_deadline_seconds / 2)
+        self.extensions_sent = 0
+        self.leases_expired = 0
+        self._leases = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._stop_event = threading.Event()
+        self.extend_leases = extend_leases
+        self._thread = None
+        if extend_leases:
+            self._thread = threading.Thread(target=self._run, daemon=True, name=name)
+            self._thread.start()
+
+    def track(self, lease_key, message):
+        now = time.monotonic()
+        with self._lock:
+            self._leases[lease_key] = _TrackedLease(message, now, now + self.extension_interval)
+
+    def release(self, lease_key):
+        with self._lock:
+            self._leases.pop(lease_key, None)
+            if not self._leases:
+                self._idle.notify_all()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._leases)
+
+    def wait_idle(self, timeout=None):
+        """Wait until no message is in flight; returns False if timeout passed first"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._leases, timeout=timeout)
+
+    def _run(self):
+        while not self._stop_event.wait(timeout=1.0):
+            now = time.monotonic()
+            with self._lock:
+                due = [(key, lease) for key, lease in self._leases.items() if lease.next_extension <= now]
+            for key, lease in due:
+                if now - lease.started_at >= self.max_lease_seconds:
+                    logger.warning("Lease reached %ss, no longer extending", self.max_lease_seconds,
+                                   extra={"message_id": lease.message.message_id})
+                    self.release(key)
+                    self.leases_expired += 1
+                    continue
+                try:
+                    lease.message.modify_ack_deadline(self.ack_deadline_seconds)
+                    self.extensions_sent += 1
+                except Exception as e:
+                    logger.warning("Failed to extend lease: %s", e, extra={"message_id": lease.message.message_id})
+                lease.next_extension = now + self.extension_interval
+
+    def release_all(self):
+        """Stop tracking every lease and return (lease key, message) for each, e.g. to nack them"""
+        with self._lock:
+            leases = [(key, lease.message) for key, lease in self._leases.items()]
+            self._leases.clear()
+            self._idle.notify_all()
+        return leases
+
+    def get_stats(self):
+        return {
+            "extend_leases": self.extend_leases,
+            "in_flight": self.in_flight(),
+            "extensions_sent": self.extensions_sent,
+            "leases_expired": self.leases_expired,
+        }
+
+    def stop(self):
+        self._stop_event.set()
+        with self._lock:
+            self._leases.clear()
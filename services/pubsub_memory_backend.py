@@ -0,0 +1,444 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from google.api_core.exceptions import NotFound, AlreadyExists
+from google.cloud.pubsub_v1.publisher.exceptions import PublishToPausedOrderingKeyException
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+
+class _DelayedCalls:
+    """Single background thread that runs callables at a given monotonic time"""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="inmemory-pubsub-timer")
+        self._thread.start()
+
+    def call_later(self, delay, func, *args):
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), func, args))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                due, _, func, args = self._heap[0]
+                wait_time = due - time.monotonic()
+                if wait_time > 0:
+                    self._condition.wait(timeout=wait_time)
+                    continue
+                heapq.heappop(self._heap)
+            try:
+                func(*args)
+            except Exception as e:
+                logger.exception("In-memory pubsub timer callback failed: %s", e)
+
+
+class _Envelope:
+    __slots__ = ("message_id", "data", "attributes", "ordering_key", "publish_time", "visible_at",
+                 "delivery_attempt")
+
+    def __init__(self, message_id, data, attributes, ordering_key, publish_time, visible_at):
+        self.message_id = message_id
+        self.data = data
+        self.attributes = attributes
+        self.ordering_key = ordering_key
+        self.publish_time = publish_time
+        self.visible_at = visible_at
+        self.delivery_attempt = 0
+
+
+class InMemoryMessage:
+    """Mirrors the parts of pubsub_v1.subscriber.message.Message used by PubSubService"""
+
+    def __init__(self, subscription, envelope, ack_id):
+        self._subscription = subscription
+        self._ack_id = ack_id
+        self.message_id = envelope.message_id
+        self.data = envelope.data
+        self.attributes = dict(envelope.attributes)
+        self.ordering_key = envelope.ordering_key
+        self.publish_time = envelope.publish_time
+        self.delivery_attempt = envelope.delivery_attempt
+        self.size = len(envelope.data)
+
+    @property
+    def ack_id(self):
+        return self._ack_id
+
+    def ack(self):
+        self._subscription.ack(self._ack_id)
+
+    def ack_with_response(self):
+        future = Future()
+        future.set_result(self._subscription.ack(self._ack_id))
+        return future
+
+    def nack(self):
+        self._subscription.nack(self._ack_id)
+
+    def nack_with_response(self):
+        future = Future()
+        future.set_result(self._subscription.nack(self._ack_id))
+        return future
+
+    def modify_ack_deadline(self, seconds):
+        self._subscription.modify_ack_deadline(self._ack_id, seconds)
+
+    def __repr__(self):
+        return f"InMemoryMessage(message_id={self.message_id}, ordering_key={self.ordering_key!r})"
+
+
+class _Lease:
+    __slots__ = ("envelope", "deadline", "stream")
+
+    def __init__(self, envelope, deadline, stream):
+        self.envelope = envelope
+        self.deadline = deadline
+        self.stream = stream
+
+
+class _Subscription:
+    def __init__(self, path, topic_path, ack_deadline_seconds=10, enable_message_ordering=False):
+        self.path = path
+        self.topic_path = topic_path
+        self.ack_deadline_seconds = ack_deadline_seconds
+        self.enable_message_ordering = enable_message_ordering
+        self.condition = threading.Condition()
+        self.pending = deque()
+        self.leases = {}  # ack_id -> _Lease
+        self.busy_keys = set()
+        self._ack_ids = itertools.count(1)
+
+    def enqueue(self, envelope, front=False):
+        with self.condition:
+            if front:
+                self.pending.appendleft(envelope)
+            else:
+                self.pending.append(envelope)
+            self.condition.notify_all()
+
+    def _release(self, ack_id):
+        lease = self.leases.pop(ack_id, None)
+        if lease is None:
+            return None
+        if lease.envelope.ordering_key:
+            self.busy_keys.discard(lease.envelope.ordering_key)
+        lease.stream.on_release(lease.envelope)
+        self.condition.notify_all()
+        return lease
+
+    def ack(self, ack_id):
+        with self.condition:
+            return self._release(ack_id) is not None
+
+    def nack(self, ack_id):
+        with self.condition:
+            lease = self._release(ack_id)
+            if lease is None:
+                return False
+            self.pending.appendleft(lease.envelope)
+            return True
+
+    def modify_ack_deadline(self, ack_id, seconds):
+        if seconds <= 0:
+            self.nack(ack_id)
+            return
+        with self.condition:
+            lease = self.leases.get(ack_id)
+            if lease is not None:
+                lease.deadline = time.monotonic() + seconds
+
+    def expire_leases(self, now):
+        """Redeliver messages whose lease ran out; must be called with the condition held"""
+        expired = [ack_id for ack_id, lease in self.leases.items() if lease.deadline <= now]
+        for ack_id in expired:
+            lease = self._release(ack_id)
+            self.pending.appendleft(lease.envelope)
+        return len(expired)
+
+    def take(self, stream, now):
+        """
+        Pop the next deliverable message for the stream, honoring ordering keys and delivery latency.
+        Returns (message, next_wakeup) and must be called with the condition held.
+        """
+        next_wakeup = None
+        for lease in self.leases.values():
+            next_wakeup = lease.deadline if next_wakeup is None else min(next_wakeup, lease.deadline)
+
+        if not stream.has_capacity():
+            return None, next_wakeup
+
+        blocked_keys = set()
+        for index, envelope in enumerate(self.pending):
+            key = envelope.ordering_key if self.enable_message_ordering else ""
+            if key and (key in self.busy_keys or key in blocked_keys):
+                continue
+            if envelope.visible_at > now:
+                next_wakeup = envelope.visible_at if next_wakeup is None else min(next_wakeup, envelope.visible_at)
+                if key:
+                    blocked_keys.add(key)
+                continue
+
+            del self.pending[index]
+            envelope.delivery_attempt += 1
+            ack_id = f"{envelope.message_id}-{next(self._ack_ids)}"
+            lease_seconds = max(self.ack_deadline_seconds, stream.max_lease_duration)
+            self.leases[ack_id] = _Lease(envelope, now + lease_seconds, stream)
+            if key:
+                self.busy_keys.add(key)
+            stream.on_lease(envelope)
+            return InMemoryMessage(self, envelope, ack_id), next_wakeup
+
+        return None, next_wakeup
+
+
+class InMemoryBroker:
+    """Process-wide topic/subscription registry shared by the in-memory publisher and subscriber clients"""
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, publish_latency=0.0, delivery_latency=0.0, latency_jitter=0.0, publish_failure_rate=0.0):
+        self.publish_latency = publish_latency
+        self.delivery_latency = delivery_latency
+        self.latency_jitter = latency_jitter
+        self.publish_failure_rate = publish_failure_rate
+        self.topics = {}  # topic path -> set of subscription paths
+        self.subscriptions = {}  # subscription path -> _Subscription
+        self.timer = _DelayedCalls()
+        self._message_ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def default(cls):
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls.from_env()
+            return cls._default
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            publish_latency=float(os.getenv("PUBSUB_MEMORY_PUBLISH_LATENCY_MS", "0")) / 1000,
+            delivery_latency=float(os.getenv("PUBSUB_MEMORY_DELIVERY_LATENCY_MS", "0")) / 1000,
+            latency_jitter=float(os.getenv("PUBSUB_MEMORY_JITTER_MS", "0")) / 1000,
+            publish_failure_rate=float(os.getenv("PUBSUB_MEMORY_FAILURE_RATE", "0")),
+        )
+
+    def _with_jitter(self, latency):
+        if self.latency_jitter <= 0:
+            return latency
+        return max(0.0, latency + random.uniform(-self.latency_jitter, self.latency_jitter))
+
+    def get_topic(self, topic_path):
+        with self._lock:
+            if topic_path not in self.topics:
+                raise NotFound(f"Topic not found: {topic_path}")
+            return topic_path
+
+    def create_topic(self, topic_path):
+        with self._lock:
+            if topic_path in self.topics:
+                raise AlreadyExists(f"Topic already exists: {topic_path}")
+            self.topics[topic_path] = set()
+            return topic_path
+
+    def get_subscription(self, subscription_path):
+        with self._lock:
+            if subscription_path not in self.subscriptions:
+                raise NotFound(f"Subscription not found: {subscription_path}")
+            return self.subscriptions[subscription_path]
+
+    def create_subscription(self, subscription_path, topic_path, ack_deadline_seconds=10,
+                            enable_message_ordering=False):
+        with self._lock:
+            if subscription_path in self.subscriptions:
+                raise AlreadyExists(f"Subscription already exists: {subscription_path}")
+            if topic_path not in self.topics:
+                raise NotFound(f"Topic not found: {topic_path}")
+            subscription = _Subscription(
+                subscription_path, topic_path, ack_deadline_seconds, enable_message_ordering
+            )
+            self.subscriptions[subscription_path] = subscription
+            self.topics[topic_path].add(subscription_path)
+            return subscription
+
+    def publish(self, topic_path, data, attributes, ordering_key):
+        with self._lock:
+            if topic_path not in self.topics:
+                raise NotFound(f"Topic not found: {topic_path}")
+            if self.publish_failure_rate and random.random() < self.publish_failure_rate:
+                raise RuntimeError(f"Injected publish failure on {topic_path}")
+            message_id = str(next(self._message_ids))
+            subscriptions = [self.subscriptions[path] for path in self.topics[topic_path]]
+
+        publish_time = time.time()
+        visible_at = time.monotonic() + self._with_jitter(self.publish_latency + self.delivery_latency)
+        for subscription in subscriptions:
+            subscription.enqueue(
+                _Envelope(message_id, data, attributes, ordering_key, publish_time, visible_at)
+            )
+        return message_id
+
+
+class InMemoryPublisherClient:
+    """Drop-in replacement for pubsub_v1.PublisherClient backed by an InMemoryBroker"""
+
+    def __init__(self, broker=None, publisher_options=None, batch_settings=None):
+        self.broker = broker or InMemoryBroker.default()
+        self.publisher_options = publisher_options
+        self.batch_settings = batch_settings  # Accepted for API parity; every publish goes out immediately
+        self._paused_keys = set()
+        self._lock = threading.Lock()
+
+    def get_topic(self, request):
+        return self.broker.get_topic(request["topic"])
+
+    def create_topic(self, request):
+        return self.broker.create_topic(request["name"])
+
+    def publish(self, topic, data, ordering_key="", **attrs):
+        if not isinstance(data, bytes):
+            raise TypeError("Data being published to Pub/Sub must be sent as a bytestring.")
+
+        future = Future()
+        with self._lock:
+            if ordering_key and (topic, ordering_key) in self._paused_keys:
+                future.set_exception(PublishToPausedOrderingKeyException(ordering_key))
+                return future
+            try:
+                message_id = self.broker.publish(topic, data, attrs, ordering_key)
+            except Exception as e:
+                if ordering_key:
+                    self._paused_keys.add((topic, ordering_key))
+                future.set_exception(e)
+                return future
+
+        latency = self.broker._with_jitter(self.broker.publish_latency)
+        if latency > 0:
+            self.broker.timer.call_later(latency, future.set_result, message_id)
+        else:
+            future.set_result(message_id)
+        return future
+
+    def resume_publish(self, topic, ordering_key):
+        with self._lock:
+            self._paused_keys.discard((topic, ordering_key))
+
+    def stop(self):
+        pass
+
+
+class InMemoryStreamingPullFuture(Future):
+    """Streaming pull for one subscriber; delivers messages to the callback on a worker pool"""
+
+    def __init__(self, subscription, callback, flow_control=None, max_workers=10,
+                 await_callbacks_on_shutdown=False):
+        super().__init__()
+        self._subscription = subscription
+        self._callback = callback
+        self._await_callbacks_on_shutdown = await_callbacks_on_shutdown
+        self.max_messages = getattr(flow_control, "max_messages", 1000) or 1000
+        self.max_bytes = getattr(flow_control, "max_bytes", 100 * 1024 * 1024) or 100 * 1024 * 1024
+        self.max_lease_duration = getattr(flow_control, "max_lease_duration", 0) or 0
+        self.outstanding_messages = 0
+        self.outstanding_bytes = 0
+        self._stopped = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inmemory-pubsub-callback")
+        self._thread = threading.Thread(
+            target=self._dispatch_loop, daemon=True, name=f"inmemory-pubsub-{subscription.path}"
+        )
+        self._thread.start()
+
+    def has_capacity(self):
+        return self.outstanding_messages < self.max_messages and self.outstanding_bytes < self.max_bytes
+
+    def on_lease(self, envelope):
+        self.outstanding_messages += 1
+        self.outstanding_bytes += len(envelope.data)
+
+    def on_release(self, envelope):
+        self.outstanding_messages -= 1
+        self.outstanding_bytes -= len(envelope.data)
+
+    def _dispatch_loop(self):
+        subscription = self._subscription
+        while not self._stopped.is_set():
+            with subscription.condition:
+                now = time.monotonic()
+                subscription.expire_leases(now)
+                message, next_wakeup = subscription.take(self, now)
+                if message is None:
+                    timeout = 0.5 if next_wakeup is None else max(0.0, min(0.5, next_wakeup - now))
+                    subscription.condition.wait(timeout=timeout)
+                    continue
+            try:
+                self._executor.submit(self._run_callback, message)
+            except RuntimeError:
+                message.nack()
+                break
+
+    def _run_callback(self, message):
+        if self._stopped.is_set():
+            message.nack()
+            return
+        try:
+            self._callback(message)
+        except Exception as e:
+            logger.exception("In-memory subscriber callback raised, nacking message %s: %s", message.message_id, e)
+            message.nack()
+
+    def cancel(self):
+        if self._stopped.is_set():
+            return False
+        self._stopped.set()
+        with self._subscription.condition:
+            self._subscription.condition.notify_all()
+        self._executor.shutdown(wait=self._await_callbacks_on_shutdown)
+        if not self.done():
+            self.set_result(None)
+        return True
+
+    def cancelled(self):
+        return self._stopped.is_set()
+
+
+class InMemorySubscriberClient:
+    """Drop-in replacement for pubsub_v1.SubscriberClient backed by an InMemoryBroker"""
+
+    def __init__(self, broker=None):
+        self.broker = broker or InMemoryBroker.default()
+
+    def get_subscription(self, request):
+        return self.broker.get_subscription(request["subscription"])
+
+    def create_subscription(self, request):
+        return self.broker.create_subscription(
+            request["name"],
+            request["topic"],
+            ack_deadline_seconds=request.get("ack_deadline_seconds", 10),
+            enable_message_ordering=request.get("enable_message_ordering", False),
+        )
+
+    def subscribe(self, subscription, callback, flow_control=None, scheduler=None,
+                  await_callbacks_on_shutdown=False):
+        return InMemoryStreamingPullFuture(
+            self.broker.get_subscription(subscription),
+            callback,
+            flow_control=flow_control,
+            await_callbacks_on_shutdown=await_callbacks_on_shutdown,
+        )
+
+    def close(self):
+        pass
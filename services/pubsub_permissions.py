@@ -1,10 +1,13 @@
 from entities import (
-    PATIENT_TO_MANAGER, MANAGER, STAFF_TO_MANAGER, MANAGER_TO_PATINET, MANAGER_TO_STAFF, PATIENT
+    PATIENT_TO_MANAGER, MANAGER, STAFF_TO_MANAGER, MANAGER_TO_PATINET, MANAGER_TO_STAFF, PATIENT,
+    MANAGER_TO_PATIENT_EMERGENCY, MANAGER_CONTROL, OPERATOR
 )
 
 TYPE_TO_PERMISSIONS = {
-    MANAGER: [[PATIENT_TO_MANAGER, STAFF_TO_MANAGER], [MANAGER_TO_PATINET, MANAGER_TO_STAFF]],
-    PATIENT: [[MANAGER_TO_PATINET], [PATIENT_TO_MANAGER]]
+    MANAGER: [[PATIENT_TO_MANAGER, STAFF_TO_MANAGER, MANAGER_CONTROL],
+              [MANAGER_TO_PATINET, MANAGER_TO_STAFF, MANAGER_TO_PATIENT_EMERGENCY]],
+    PATIENT: [[MANAGER_TO_PATINET, MANAGER_TO_PATIENT_EMERGENCY], [PATIENT_TO_MANAGER]],
+    OPERATOR: [[], [MANAGER_CONTROL]]
 }
 
 
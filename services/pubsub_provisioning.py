@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from entities import PUBSUB_BACKEND_MEMORY
+from services.pubsub_permissions import TYPE_TO_PERMISSIONS
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+
+def get_required_resources(pubsub_postfix):
+    """All topics and (topic, subscription) pairs the agents in TYPE_TO_PERMISSIONS use"""
+    topics = set()
+    subscriptions = set()
+    for listen_to, sending_to in TYPE_TO_PERMISSIONS.values():
+        for topic in listen_to:
+            current_topic = f"{topic}{pubsub_postfix}"
+            topics.add(current_topic)
+            subscriptions.add((current_topic, f"{current_topic}_subscription"))
+        for topic in sending_to:
+            topics.add(f"{topic}{pubsub_postfix}")
+    return sorted(topics), sorted(subscriptions)
+
+
+class PubSubProvisioner:
+    """
+    Checks and creates every topic and subscription at startup in parallel, and remembers the verified set
+    in a local cache file so warm restarts within the TTL skip the admin RPCs.
+    """
+
+    def __init__(self, pubsub_service, cache_file=None, ttl_seconds=None, max_workers=8):
+        self.pubsub_service = pubsub_service
+        self.cache_file = cache_file or os.getenv("PUBSUB_PROVISION_CACHE_FILE") or os.path.join(
+            tempfile.gettempdir(), f"pubsub_provisioned_{pubsub_service.project_id}.json"
+        )
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(
+            os.getenv("PUBSUB_PROVISION_CACHE_TTL", "3600")
+        )
+        self.max_workers = max_workers
+        # The in-memory broker starts empty in every process, so its resources must always be created
+        self.use_cache_file = pubsub_service.backend != PUBSUB_BACKEND_MEMORY
+
+    def provision(self, pubsub_postfix):
+        start_time = time.time()
+        topics, subscriptions = get_required_resources(pubsub_postfix)
+        subscription_names = [subscription for _, subscription in subscriptions]
+
+        if self.use_cache_file and self._is_cached(topics, subscription_names):
+            self.pubsub_service.mark_provisioned(topics, subscription_names)
+            logger.info("PubSub resources loaded from %s in %.1f ms",
+                        self.cache_file, (time.time() - start_time) * 1000)
+            return True
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pubsub_provision") as pool:
+            list(pool.map(self.pubsub_service.check_or_create_topic, topics))
+            list(pool.map(lambda pair: self.pubsub_service.check_or_create_subscription(*pair), subscriptions))
+
+        if self.use_cache_file:
+            self._save(topics, subscription_names)
+        logger.info("Provisioned %s topics and %s subscriptions in %.1f ms",
+                    len(topics), len(subscriptions), (time.time() - start_time) * 1000)
+        return True
+
+    def _cache_scope(self):
+        return f"{self.pubsub_service.backend}:{self.pubsub_service.project_id}"
+
+    def _load(self):
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _is_cached(self, topics, subscription_names):
+        entry = self._load().get(self._cache_scope())
+        if not entry or time.time() - entry.get("verified_at", 0) > self.ttl_seconds:
+            return False
+        return set(topics) <= set(entry.get("topics", [])) and \
+            set(subscription_names) <= set(entry.get("subscriptions", []))
+
+    def _save(self, topics, subscription_names):
+        cache = self._load()
+        cache[self._cache_scope()] = {
+            "verified_at": time.time(),
+            "topics": topics,
+            "subscriptions": subscription_names,
+        }
+        temp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(temp_file, self.cache_file)
+        except OSError as e:
+            logger.warning("Could not write PubSub provisioning cache %s: %s", self.cache_file, e)
+
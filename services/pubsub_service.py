@@ -1,10 +1,43 @@
-import json
 import time
 import threading
 from google.cloud import pubsub_v1
-from google.api_core.exceptions import NotFound
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from google.api_core.exceptions import NotFound, AlreadyExists
+from concurrent.futures import Future, TimeoutError
 import os
+from entities import PUBSUB_BACKEND_MEMORY
+from helper_methods import (
+    get_pubsub_backend, hash_user_id, get_pubsub_codec_name, get_pubsub_compression_threshold,
+    get_pubsub_consumer_codecs
+)
+from services.pubsub_codec import MessageCodec
+from services.pubsub_dedup import MessageDedupCache
+from services.pubsub_dispatcher import KeyPartitionedDispatcher
+from services.pubsub_flow_controller import AdaptiveFlowController
+from services.pubsub_leases import LeaseExtender
+from services.metrics_service import METRICS
+from services.logging_service import get_logger
+from services.tracing_service import start_span, record_span, inject, extract
+from services.pubsub_memory_backend import InMemoryPublisherClient, InMemorySubscriberClient
+
+logger = get_logger(__name__)
+
+ACK_DEADLINE_SECONDS = 10
+MAX_LEASE_SECONDS = 600  # Upper bound for one handler, including time queued on its partition
+SUBSCRIBER_MAX_BYTES = int(os.getenv("PUBSUB_SUBSCRIBER_MAX_BYTES", str(5 * 1024 * 1024)))
+PUBLISHER_MESSAGE_LIMIT = int(os.getenv("PUBSUB_PUBLISHER_MESSAGE_LIMIT", "1000"))
+PUBLISHER_BYTE_LIMIT = int(os.getenv("PUBSUB_PUBLISHER_BYTE_LIMIT", str(10 * 1024 * 1024)))
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("PUBSUB_DRAIN_TIMEOUT_SECONDS", "20"))
+
+PUBLISH_LATENCY = METRICS.histogram("pubsub_publish_latency_seconds", "Publish call to server ack, per topic")
+PUBLISH_ERRORS = METRICS.counter("pubsub_publish_errors_total", "Failed publishes per topic")
+HANDLER_DURATION = METRICS.histogram("pubsub_handler_duration_seconds", "Message handler run time per subscription")
+HANDLER_ERRORS = METRICS.counter("pubsub_handler_errors_total", "Message handlers that raised, per subscription")
+DUPLICATES_SUPPRESSED = METRICS.counter(
+    "pubsub_duplicates_suppressed_total", "Redeliveries dropped by the message-id cache, per subscription"
+)
+DRAIN_DURATION = METRICS.histogram("pubsub_drain_seconds", "Time PubSubService.close spent draining")
+DEAD_LETTERED = METRICS.counter("pubsub_dead_lettered_total", "Undecodable messages moved to a dead-letter topic")
+DEAD_LETTER_SUFFIX = "_dead_letter"
 
 
 class PubSubService:
@@ -13,67 +46,95 @@ class PubSubService:
     _topic_cache = {}  # Cache for existing topics
     _subscription_cache = {}  # Cache for existing subscriptions
 
-    def __init__(self, project_id):
+    def __init__(self, project_id, backend=None):
         self.project_id = project_id
+        self.backend = backend or get_pubsub_backend()
+        client_key = f"{self.backend}:{project_id}"
 
         # Use cached clients when possible
-        if project_id not in PubSubService._publisher_clients:
-            PubSubService._publisher_clients[project_id] = pubsub_v1.PublisherClient(
-                # Configure publisher for better performance
-                publisher_options=pubsub_v1.types.PublisherOptions(
-                    enable_message_ordering=True,
-                    flow_control=pubsub_v1.types.PublishFlowControl(
-                        message_limit=1000,
-                        byte_limit=10 * 1024 * 1024,  # 10MB
-                        limit_exceeded_behavior=pubsub_v1.types.LimitExceededBehavior.BLOCK,
-                    )
-                )
-            )
+        if client_key not in PubSubService._publisher_clients:
+            PubSubService._publisher_clients[client_key] = self._create_publisher_client()
 
-        if project_id not in PubSubService._subscriber_clients:
-            PubSubService._subscriber_clients[project_id] = pubsub_v1.SubscriberClient()
+        if client_key not in PubSubService._subscriber_clients:
+            PubSubService._subscriber_clients[client_key] = self._create_subscriber_client()
 
-        self.publisher = PubSubService._publisher_clients[project_id]
-        self.subscriber = PubSubService._subscriber_clients[project_id]
+        self.publisher = PubSubService._publisher_clients[client_key]
+        self.subscriber = PubSubService._subscriber_clients[client_key]
 
         # Pre-format paths to avoid string operations during runtime
         self.subscription_path = f"projects/{self.project_id}/subscriptions/{{}}"
         self.topic_path = f"projects/{self.project_id}/topics/{{}}"
 
         # Instance variables
-        self.thread_pool = ThreadPoolExecutor(
-            max_workers=min(32, (os.cpu_count() or 1) * 2),
-            thread_name_prefix=f"pubsub_worker_{project_id}"
-        )
+        self._dispatcher = None  # Created on first subscription, publish-only services never start workers
         self._subscriber_threads = []
+        self._flow_controllers = {}
         self._active_streaming_futures = {}
         self._lock = threading.RLock()  # Reentrant lock for thread safety
+        self._draining = False
+        self._abandoned = False  # Set once the drain deadline passed and unfinished messages were nacked
+        self._drain_report = None
+        self._close_lock = threading.Lock()
+        self._pending_publishes = 0
+        self._publish_condition = threading.Condition()
+        # The GCP streaming pull extends leases itself up to max_lease_duration; only track its messages
+        self.lease_extender = LeaseExtender(
+            ack_deadline_seconds=ACK_DEADLINE_SECONDS,
+            max_lease_seconds=MAX_LEASE_SECONDS,
+            name=f"pubsub_lease_{project_id}",
+            extend_leases=self.backend == PUBSUB_BACKEND_MEMORY,
+        )
+        self.dedup_cache = MessageDedupCache(max_size=10000, ttl_seconds=600)
+        self.codec = MessageCodec(
+            get_pubsub_codec_name(), get_pubsub_compression_threshold(), get_pubsub_consumer_codecs()
+        )
+
+    def _create_publisher_client(self):
+        # Configure publisher for better performance
+        publisher_options = pubsub_v1.types.PublisherOptions(
+            enable_message_ordering=True,
+            flow_control=pubsub_v1.types.PublishFlowControl(
+                message_limit=PUBLISHER_MESSAGE_LIMIT,
+                byte_limit=PUBLISHER_BYTE_LIMIT,
+                limit_exceeded_behavior=pubsub_v1.types.LimitExceededBehavior.BLOCK,
+            )
+        )
+        if self.backend == PUBSUB_BACKEND_MEMORY:
+            return InMemoryPublisherClient(publisher_options=publisher_options)
+        return pubsub_v1.PublisherClient(publisher_options=publisher_options)
+
+    def _create_subscriber_client(self):
+        if self.backend == PUBSUB_BACKEND_MEMORY:
+            return InMemorySubscriberClient()
+        return pubsub_v1.SubscriberClient()
+
+    def is_topic_cached(self, topic_name: str):
+        return f"{self.backend}:{self.project_id}:{topic_name}" in PubSubService._topic_cache
 
     def check_or_create_topic(self, topic_name: str):
         """Check if topic exists and create if not (with caching)"""
         # Check cache first
-        cache_key = f"{self.project_id}:{topic_name}"
+        cache_key = f"{self.backend}:{self.project_id}:{topic_name}"
         if cache_key in PubSubService._topic_cache:
             return PubSubService._topic_cache[cache_key]
 
+        # Admin RPCs run outside the lock so provisioning can check many topics concurrently
         topic_path = self.topic_path.format(topic_name)
         try:
-            with self._lock:
-                if cache_key in PubSubService._topic_cache:
-                    return PubSubService._topic_cache[cache_key]
-
-                self.publisher.get_topic(request={"topic": topic_path})
-                PubSubService._topic_cache[cache_key] = topic_path
-                return topic_path
+            self.publisher.get_topic(request={"topic": topic_path})
         except NotFound:
-            with self._lock:
+            try:
                 self.publisher.create_topic(request={"name": topic_path})
-                print(f"Created topic: {topic_name}")
-                PubSubService._topic_cache[cache_key] = topic_path
-                return topic_path
+                logger.info("Created topic", extra={"topic": topic_name})
+            except AlreadyExists:
+                pass
+
+        with self._lock:
+            PubSubService._topic_cache[cache_key] = topic_path
+        return topic_path
 
     def check_or_create_subscription(self, topic_name: str, subscription_name: str):
-        cache_key = f"{self.project_id}:{subscription_name}"
+        cache_key = f"{self.backend}:{self.project_id}:{subscription_name}"
         if cache_key in PubSubService._subscription_cache:
             return PubSubService._subscription_cache[cache_key]
 
@@ -81,98 +142,177 @@ class PubSubService:
         topic_path = self.check_or_create_topic(topic_name)  # Ensure topic exists
 
         try:
-            with self._lock:
-                if cache_key in PubSubService._subscription_cache:
-                    return PubSubService._subscription_cache[cache_key]
-
-                self.subscriber.get_subscription(
-                    request={"subscription": subscription_path}
-                )
-                PubSubService._subscription_cache[cache_key] = subscription_path
-                return subscription_path
+            self.subscriber.get_subscription(
+                request={"subscription": subscription_path}
+            )
         except NotFound:
-            with self._lock:
+            try:
                 # Create with optimized settings
                 self.subscriber.create_subscription(
                     request={
                         "name": subscription_path,
                         "topic": topic_path,
                         "enable_exactly_once_delivery": True,
-                        "ack_deadline_seconds": 10,  # Reduced from 10
+                        "ack_deadline_seconds": ACK_DEADLINE_SECONDS,
                         "message_retention_duration": {"seconds": 600},  # 10 minutes
                         "expiration_policy": {"ttl": {"seconds": 86400}},  # 1 day
                         "enable_message_ordering": True,
                     }
                 )
-                print(f"Created subscription: {subscription_name} for topic: {topic_name}")
-                PubSubService._subscription_cache[cache_key] = subscription_path
-                return subscription_path
+                logger.info("Created subscription", extra={"subscription": subscription_name, "topic": topic_name})
+            except AlreadyExists:
+                pass
+
+        with self._lock:
+            PubSubService._subscription_cache[cache_key] = subscription_path
+        return subscription_path
+
+    def mark_provisioned(self, topic_names, subscription_names):
+        """Seed the existence caches with resources verified elsewhere (e.g. a fresh provisioning cache file)"""
+        with self._lock:
+            for topic_name in topic_names:
+                cache_key = f"{self.backend}:{self.project_id}:{topic_name}"
+                PubSubService._topic_cache[cache_key] = self.topic_path.format(topic_name)
+            for subscription_name in subscription_names:
+                cache_key = f"{self.backend}:{self.project_id}:{subscription_name}"
+                PubSubService._subscription_cache[cache_key] = self.subscription_path.format(subscription_name)
+
+    def accept_message(self, message, subscription_name, max_retries=2):
+        """
+        Checks every delivery goes through before its handler runs: retry limit, decoding, duplicate
+        suppression and lease tracking. Returns (decoded_message, retry_count, lease_key), or None when the
+        message was dropped (and acked), dead-lettered or nacked.
+        """
+        retry_count = 0
+        if hasattr(message, 'attributes') and 'retry_count' in message.attributes:
+            retry_count = int(message.attributes['retry_count'])
+
+        if retry_count >= max_retries:
+            logger.warning("Message failed after %s retries, dropping message", retry_count)
+            message.ack()
+            return None
+
+        lease_key = f"{subscription_name}:{message.message_id}"
+        try:
+            decoded_message = self.codec.decode(message.data, getattr(message, 'attributes', None))
+        except Exception as e:
+            if self._dead_letter(message, subscription_name, e):
+                message.ack()
+            else:
+                # Keep it for a redelivery rather than lose it
+                message.nack()
+            return None
+
+        # Drop redeliveries of messages this process already handled or is handling. Marked only once
+        # decoded, so a message that failed to decode is never mistaken for one being handled
+        if self.dedup_cache.check_and_mark(lease_key):
+            logger.info("Duplicate delivery dropped", extra={"message_id": message.message_id})
+            DUPLICATES_SUPPRESSED.inc(subscription=subscription_name)
+            message.ack()
+            return None
+        self.lease_extender.track(lease_key, message)
+
+        # Time from publish until this process picked the message up
+        trace_context, sent_at = extract(getattr(message, 'attributes', None))
+        if sent_at:
+            record_span("pubsub.deliver", sent_at, parent=trace_context, subscription=subscription_name)
+
+        return decoded_message, retry_count, lease_key
+
+    def _dead_letter(self, message, subscription_name, error):
+        """
+        Park a message this process cannot decode on <subscription>_dead_letter, payload and attributes
+        untouched, so it can be replayed by a consumer that can. Returns False if that publish failed.
+        """
+        topic_name = f"{subscription_name}{DEAD_LETTER_SUFFIX}"
+        attributes = dict(getattr(message, 'attributes', None) or {})
+        attributes.update(dead_letter_reason=str(error)[:500], dead_letter_subscription=subscription_name)
+        logger.warning("Failed to decode message, moving it to %s: %s", topic_name, error,
+                       extra={"message_id": message.message_id, "size": len(message.data)})
+        try:
+            topic_path = self.check_or_create_topic(topic_name)
+            self.publisher.publish(topic=topic_path, data=message.data, **attributes).result(timeout=10)
+        except Exception as e:
+            logger.error("Failed to dead-letter message, nacking it: %s", e, extra={"message_id": message.message_id})
+            return False
+        DEAD_LETTERED.inc(subscription=subscription_name)
+        return True
 
     def subscribe_to_topic(
             self, topic_name: str, subscription_name: str, message_handler
     ):
         subscription_path = self.check_or_create_subscription(topic_name, subscription_name)
-
-        def callback(message, max_retries=2):
-            try:
-                retry_count = 0
-                if hasattr(message, 'attributes') and 'retry_count' in message.attributes:
-                    retry_count = int(message.attributes['retry_count'])
-
-                if retry_count >= max_retries:
-                    print(f"Message failed after {retry_count} retries, dropping message")
-                    message.ack()
-                    return
-
+        flow_controller = AdaptiveFlowController.from_env(subscription_name)
+        self._flow_controllers[subscription_name] = flow_controller
+
+        def handle(decoded_message, message, retry_count, lease_key):
+            """
+            Run the handler. A handler that hands the work on may return a Future instead of a result:
+            the message then stays leased, holding its flow control slot, until the Future is done, and
+            is acked after that, or nacked by close() if the drain deadline passes first.
+            """
+            if self._abandoned:
+                return  # Already nacked by close(); another replica will process it
+            start_time = time.perf_counter()
+
+            def finish(result=True, error=None):
+                failed = error is not None
                 try:
-                    decoded_message = None
-
-                    # PubSub always delivers message.data as bytes
-                    # We need to decode and parse it properly
-                    if isinstance(message.data, bytes):
-                        try:
-                            # Decode bytes to string
-                            message_str = message.data.decode('utf-8', errors='replace')
-
-                            # Try to parse as JSON (which should work for dict messages)
-                            try:
-                                decoded_message = json.loads(message_str)
-                            except json.JSONDecodeError:
-                                # If not JSON, use as plain string
-                                decoded_message = message_str
-
-                        except UnicodeDecodeError as e:
-                            print(f"Unicode decode error: {e}")
-                            message.ack()
-                            return
-                    else:
-                        # This shouldn't happen with PubSub, but handle just in case
-                        print(f"Unexpected message.data type: {type(message.data)}")
-                        decoded_message = message.data
-
-                    if decoded_message is None:
-                        print(f"Failed to decode message, dropping")
+                    if failed:
+                        logger.error("Error processing message: %s", error, exc_info=error,
+                                     extra={"message_id": message.message_id, "size": len(message.data)})
+                        HANDLER_ERRORS.inc(subscription=subscription_name)
+                    elif not result:
+                        # Also how a manager shard skips every message of users it does not own
+                        logger.debug("Message handler returned False, dropping message after %s retries",
+                                     retry_count)
+                    if not self._abandoned:
                         message.ack()
-                        return
+                finally:
+                    duration = time.perf_counter() - start_time
+                    HANDLER_DURATION.observe(duration, subscription=subscription_name)
+                    flow_controller.release(duration, failed)
+                    self.lease_extender.release(lease_key)
 
-                    # Process the message
+            trace_context, _ = extract(getattr(message, 'attributes', None))
+            try:
+                with start_span("pubsub.handle", parent=trace_context, subscription=subscription_name):
                     result = message_handler(decoded_message)
+            except Exception as e:
+                finish(error=e)
+                return
+            if isinstance(result, Future):
+                result.add_done_callback(
+                    lambda done: finish(error=done.exception()) if not done.cancelled()
+                    else finish(error=RuntimeError("message handling cancelled"))
+                )
+            else:
+                finish(result)
 
-                    if result:
-                        message.ack()
-                    else:
-                        print(f"Message handler returned False, dropping message after {retry_count} retries")
-                        message.ack()
+        def callback(message):
+            try:
+                accepted = self.accept_message(message, subscription_name)
+                if accepted is None:
+                    return
+                decoded_message, retry_count, lease_key = accepted
 
-                except Exception as e:
-                    print(f"Error processing message: {e}")
-                    print(f"Message data type: {type(message.data)}")
-                    print(f"Message data: {message.data}")
-                    message.ack()
+                # Wait for a slot under the adaptive limit; the message stays leased meanwhile
+                if self._draining or not flow_controller.acquire():
+                    self.lease_extender.release(lease_key)
+                    self.dedup_cache.forget(lease_key)
+                    message.nack()
+                    return
+
+                # Hand off to the session's partition; blocks while it is full so flow control pushes back
+                self.dispatcher.submit(
+                    self._partition_key(message, decoded_message),
+                    handle, decoded_message, message, retry_count, lease_key
+                )
 
             except Exception as outer_e:
                 # Catch-all for any errors in the callback itself
-                print(f"Critical error in message callback, dropping message: {outer_e}")
+                logger.exception("Critical error in message callback, dropping message: %s", outer_e)
+                self.lease_extender.release(f"{subscription_name}:{message.message_id}")
                 try:
                     message.ack()
                 except:
@@ -180,16 +320,18 @@ class PubSubService:
 
         # Configure flow control for better performance
         flow_control = pubsub_v1.types.FlowControl(
-            max_messages=25,  # Process in smaller batches
-            max_bytes=5 * 1024 * 1024,  # 5MB limit
-            max_lease_duration=10,  # 10 seconds
+            max_messages=flow_controller.max_limit,  # Upper bound; the adaptive controller admits fewer
+            max_bytes=SUBSCRIBER_MAX_BYTES,
+            max_lease_duration=MAX_LEASE_SECONDS,  # The client keeps extending leases up to this bound
         )
 
         # Create streaming pull future with optimized settings
+        # Cancelling waits for running callbacks, so their acks and nacks go out before the stream closes
         streaming_pull_future = self.subscriber.subscribe(
             subscription_path,
             callback=callback,
             flow_control=flow_control,
+            await_callbacks_on_shutdown=True,
         )
 
         # Store reference to the future
@@ -211,35 +353,36 @@ class PubSubService:
                     if i_key not in self._active_streaming_futures:
                         break
 
-                    print(f"PubSub stream {i_key} timed out, continuing...")
+                    logger.debug("PubSub stream %s timed out, continuing", i_key)
                 except Exception as e:
 
-                    if i_key not in self._active_streaming_futures:
+                    if i_key not in self._active_streaming_futures or self._draining:
                         break
 
                     retry_count += 1
-                    print(f"PubSub stream {i_key} error ({retry_count}/{max_retries}): {e}")
+                    logger.warning("PubSub stream %s error (%s/%s): %s", i_key, retry_count, max_retries, e)
 
                     if retry_count >= max_retries:
-                        print(f"Too many errors for {i_key}, stopping subscription")
+                        logger.error("Too many errors for %s, stopping subscription", i_key)
                         break
                     time.sleep(retry_delay)
                     retry_delay = min(retry_delay * 2, 60)  # Cap at 60 seconds
 
                     try:
-                        print(f"Resubscribing to {i_key}...")
+                        logger.info("Resubscribing to %s", i_key)
                         self._active_streaming_futures[key] = self.subscriber.subscribe(
                             subscription_path,
                             callback=callback,
-                            flow_control=flow_control
+                            flow_control=flow_control,
+                            await_callbacks_on_shutdown=True,
                         )
                     except Exception as sub_error:
-                        print(f"Failed to resubscribe to {i_key}: {sub_error}")
+                        logger.error("Failed to resubscribe to %s: %s", i_key, sub_error)
             with self._lock:
                 if key in self._active_streaming_futures:
                     del self._active_streaming_futures[key]
 
-            print(f"Subscription {key} stream handler exited")
+            logger.info("Subscription %s stream handler exited", key)
 
         subscriber_thread = threading.Thread(
             target=stream_messages,
@@ -251,63 +394,190 @@ class PubSubService:
 
         return subscriber_thread
 
-    def publish_message(self, topic_name: str, data):
+    @property
+    def dispatcher(self):
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = KeyPartitionedDispatcher(
+                    num_partitions=min(32, (os.cpu_count() or 1) * 2),
+                    max_queue_size=10,
+                    name=f"pubsub_worker_{self.project_id}"
+                )
+            return self._dispatcher
+
+    @staticmethod
+    def _partition_key(message, decoded_message):
+        """Session key used to keep one user's messages on one dispatcher partition"""
+        ordering_key = getattr(message, 'ordering_key', "")
+        if ordering_key:
+            return ordering_key
+        if isinstance(decoded_message, dict) and decoded_message.get('user_id'):
+            return hash_user_id(decoded_message['user_id'])
+        return ""
+
+    def get_dispatcher_stats(self):
+        return self._dispatcher.get_stats() if self._dispatcher else []
+
+    def get_flow_control_stats(self):
+        return {name: controller.get_stats() for name, controller in self._flow_controllers.items()}
+
+    def get_delivery_stats(self):
+        return {
+            "leases": self.lease_extender.get_stats(),
+            "dedup": self.dedup_cache.get_stats(),
+        }
+
+    def publish_message(self, topic_name: str, data, ordering_key: str = None):
         """
         Publish a message to a topic.
         Data can be a dict, string, or bytes.
-        When dict is passed, it will be JSON-serialized.
+        When dict is passed, it is serialized with the configured codec (JSON by default).
+        Messages sharing an ordering key are delivered in order; when no key is given
+        it is derived from the hashed user_id of a dict payload.
         """
         topic_path = self.check_or_create_topic(topic_name)
 
-        # Convert data to bytes - PubSub always requires bytes
-        if isinstance(data, dict):
-            data_bytes = json.dumps(data, ensure_ascii=False).encode("utf-8")
-        elif isinstance(data, str):
-            data_bytes = data.encode("utf-8")
-        elif isinstance(data, bytes):
-            data_bytes = data
-        else:
-            # Try to convert to JSON
-            try:
-                data_bytes = json.dumps(data, ensure_ascii=False).encode("utf-8")
-            except (TypeError, ValueError):
-                data_bytes = str(data).encode("utf-8")
+        if ordering_key is None:
+            ordering_key = hash_user_id(data["user_id"]) if isinstance(data, dict) and data.get("user_id") else ""
 
+        # Encode with the configured codec; the content-type attribute tells subscribers how to decode
+        data_bytes, attributes = self.codec.encode(data)
+
+        with self._publish_condition:
+            self._pending_publishes += 1
         try:
-            future = self.publisher.publish(topic=topic_path, data=data_bytes)
+            publish_start = time.perf_counter()
+            with start_span("pubsub.publish", topic=topic_name) as span:
+                # Subscribers continue the trace from this span
+                inject(attributes, span)
+                future = self.publisher.publish(
+                    topic=topic_path, data=data_bytes, ordering_key=ordering_key, **attributes
+                )
 
             def on_publish(publish_future):
+                self._publish_done()
                 try:
                     message_id = publish_future.result(timeout=2)
-                    if isinstance(data, dict) and 'user_id' in data:
-                        print(f"Published message from user {data['user_id']} to {topic_name}, got ID: {message_id}")
-                    else:
-                        print(f"Published message to {topic_name}, got ID: {message_id}")
+                    PUBLISH_LATENCY.observe(time.perf_counter() - publish_start, topic=topic_name)
+                    logger.debug("Published message", extra={"topic": topic_name, "message_id": message_id})
                 except Exception as ex:
-                    print(f"Error publishing to {topic_name}: {ex}")
+                    logger.error("Error publishing to %s: %s", topic_name, ex)
+                    PUBLISH_ERRORS.inc(topic=topic_name)
+                    self._resume_ordering_key(topic_path, ordering_key)
 
             future.add_done_callback(on_publish)
             return future
 
         except Exception as e:
-            print(f"Error publishing message to {topic_name}: {e}")
+            self._publish_done()
+            logger.error("Error publishing message to %s: %s", topic_name, e)
+            PUBLISH_ERRORS.inc(topic=topic_name)
+            self._resume_ordering_key(topic_path, ordering_key)
             raise
 
-    def close(self):
-        for key, future in list(self._active_streaming_futures.items()):
+    def _publish_done(self):
+        with self._publish_condition:
+            self._pending_publishes -= 1
+            self._publish_condition.notify_all()
+
+    def flush_publishes(self, timeout=None):
+        """Wait for publishes started by this service to be acknowledged; returns how many are still pending"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._publish_condition:
+            while self._pending_publishes > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._publish_condition.wait(timeout=remaining)
+            return self._pending_publishes
+
+    def _resume_ordering_key(self, topic_path, ordering_key):
+        """A failed publish pauses its ordering key; resume it so later messages for that user go out"""
+        if not ordering_key or self.publisher is None:
+            return
+        try:
+            self.publisher.resume_publish(topic_path, ordering_key)
+        except Exception as e:
+            logger.error("Failed to resume ordering key %s on %s: %s", ordering_key[:8], topic_path, e)
+
+    def _stop_streams(self, deadline):
+        """Cancel every streaming pull and wait, until deadline, for its shutdown"""
+        with self._lock:
+            streams = list(self._active_streaming_futures.items())
+            self._active_streaming_futures.clear()
+        for key, future in streams:
             try:
-                print(f"Cancelling subscription {key}")
+                logger.info("Cancelling subscription %s", key)
                 future.cancel()
-                del self._active_streaming_futures[key]
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
             except Exception as e:
-                print(f"Error cancelling subscription {key}: {e}")
-
-        for thread in self._subscriber_threads:
-            if thread.is_alive():
-                thread.join(timeout=1)
-
-        if hasattr(self, 'thread_pool') and self.thread_pool:
-            self.thread_pool.shutdown(wait=False)
+                if not future.cancelled():
+                    logger.error("Error cancelling subscription %s: %s", key, e)
 
-        self.publisher = None
-        self.subscriber = None
+    def close(self, drain_timeout=None):
+        """
+        Drain and shut down: stop admitting messages, give queued and running handlers (and the work behind
+        the Futures some of them returned) until drain_timeout (PUBSUB_DRAIN_TIMEOUT_SECONDS by default) to
+        finish, nack whatever is left so another replica picks it up right away, then stop pulling and wait
+        for pending publishes with the remaining time.
+        The streaming pulls stay open during the drain: cancelling one stops the client's leaser and the
+        dispatcher that sends acks, so handlers finishing then would be redelivered.
+        Returns a report with the drain time; calling it again returns the same report.
+        """
+        with self._close_lock:
+            if self._drain_report is not None:
+                return self._drain_report
+            drain_timeout = DRAIN_TIMEOUT_SECONDS if drain_timeout is None else drain_timeout
+            start_time = time.monotonic()
+            deadline = start_time + drain_timeout
+            in_flight_at_start = self.lease_extender.in_flight()
+
+            # Stop admitting work; new deliveries and callbacks still waiting for a slot nack their message
+            self._draining = True
+            for controller in self._flow_controllers.values():
+                controller.stop()
+
+            handlers_finished = True
+            if self._dispatcher:
+                handlers_finished = self._dispatcher.drain(timeout=max(0.0, deadline - time.monotonic()))
+                self._dispatcher.shutdown(wait=False, discard_pending=True)
+            # Handlers that returned a Future keep their message leased until the work behind it completes
+            handlers_finished = self.lease_extender.wait_idle(timeout=max(0.0, deadline - time.monotonic())) \
+                and handlers_finished
+
+            # Anything still leased did not finish in time
+            self._abandoned = True
+            nacked = 0
+            for lease_key, message in self.lease_extender.release_all():
+                self.dedup_cache.forget(lease_key)
+                try:
+                    message.nack()
+                    nacked += 1
+                except Exception as e:
+                    logger.warning("Failed to nack %s during drain: %s", lease_key, e)
+
+            # Only now stop pulling; the client sends the acks and nacks it still holds as the stream shuts down
+            self._stop_streams(deadline)
+
+            publishes_pending = self.flush_publishes(timeout=max(0.0, deadline - time.monotonic()))
+
+            for thread in self._subscriber_threads:
+                if thread.is_alive():
+                    thread.join(timeout=max(0.0, deadline - time.monotonic()))
+            self.lease_extender.stop()
+
+            self.publisher = None
+            self.subscriber = None
+
+            drain_seconds = time.monotonic() - start_time
+            DRAIN_DURATION.observe(drain_seconds)
+            self._drain_report = {
+                "drain_seconds": drain_seconds,
+                "in_flight_at_start": in_flight_at_start,
+                "handlers_finished": handlers_finished,
+                "nacked": nacked,
+                "publishes_pending": publishes_pending,
+            }
+            log = logger.info if handlers_finished and not publishes_pending else logger.warning
+            log("PubSub drained in %.2fs", drain_seconds, extra=self._drain_report)
+            return self._drain_report
@@ -0,0 +1,108 @@
+import asyncio
+import collections
+import threading
+from concurrent.futures import Future
+from queue import Empty
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+
+class ResponseRouter:
+    """
+    Single consumer of received_messages that hands each response to the request waiting for its
+    message_id, so any number of requests can be in flight without polling or taking each other's replies.
+    A reply that does not echo a known message_id goes to the oldest request still waiting for its user_id.
+    """
+
+    def __init__(self, source_queue):
+        self._source_queue = source_queue
+        self._waiters = {}  # message_id -> (user_id, concurrent Future or (loop, asyncio Future))
+        self._by_user = {}  # user_id -> message_ids still waiting, oldest first
+        self._lock = threading.Lock()
+        self.unmatched = 0
+        self.routed_by_user = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="connector_response_router")
+        self._thread.start()
+
+    def register(self, message_id, user_id=None):
+        """Register before sending, so a fast reply cannot arrive ahead of its waiter"""
+        future = Future()
+        self._add(message_id, user_id, future)
+        return future
+
+    def register_async(self, message_id, user_id=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._add(message_id, user_id, (loop, future))
+        return future
+
+    def _add(self, message_id, user_id, waiter):
+        with self._lock:
+            self._waiters[message_id] = (user_id, waiter)
+            if user_id is not None:
+                self._by_user.setdefault(str(user_id), collections.deque()).append(message_id)
+
+    def discard(self, message_id):
+        with self._lock:
+            self._pop_locked(message_id)
+
+    def _pop_locked(self, message_id):
+        user_id, waiter = self._waiters.pop(message_id, (None, None))
+        if user_id is not None:
+            message_ids = self._by_user.get(str(user_id))
+            if message_ids is not None:
+                try:
+                    message_ids.remove(message_id)
+                except ValueError:
+                    pass
+                if not message_ids:
+                    del self._by_user[str(user_id)]
+        return waiter
+
+    def pending(self):
+        with self._lock:
+            return len(self._waiters)
+
+    def _run(self):
+        while self._running:
+            try:
+                item = self._source_queue.get(timeout=1.0)
+            except Empty:
+                continue
+            try:
+                self._route(item)
+            except Exception as e:
+                logger.exception("Error routing response: %s", e)
+
+    def _route(self, item):
+        # received_messages holds (priority, response) pairs
+        response_data = item[1] if isinstance(item, tuple) and len(item) == 2 else item
+        message_id = response_data.get("message_id") if isinstance(response_data, dict) else None
+        user_id = response_data.get("user_id") if isinstance(response_data, dict) else None
+        with self._lock:
+            waiter = self._pop_locked(message_id) if message_id in self._waiters else None
+            if waiter is None and user_id is not None and self._by_user.get(str(user_id)):
+                # The reply did not echo a message_id we know: answer the user's oldest open request
+                waiter = self._pop_locked(self._by_user[str(user_id)][0])
+                self.routed_by_user += 1
+        if waiter is None:
+            self.unmatched += 1
+            logger.warning("Dropping response with no waiting request",
+                           extra={"message_id": message_id, "has_user_id": user_id is not None})
+            return
+
+        if isinstance(waiter, tuple):
+            loop, future = waiter
+            loop.call_soon_threadsafe(_resolve_if_pending, future, response_data)
+        elif not waiter.done():
+            waiter.set_result(response_data)
+
+    def stop(self):
+        self._running = False
+
+
+def _resolve_if_pending(future, result):
+    if not future.done():
+        future.set_result(result)
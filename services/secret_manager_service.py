@@ -1,4 +1,7 @@
 from google.cloud import secretmanager_v1
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
 
 
 class SecretManagerService:
@@ -29,5 +32,5 @@ class SecretManagerService:
             return response.payload.data.decode('UTF-8')
         
         except Exception as e:
-            print(f"Error accessing secret: {e}")
+            logger.error("Error accessing secret %s: %s", secret_name, e)
             raise
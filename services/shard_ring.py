@@ -0,0 +1,93 @@
+import bisect
+import hashlib
+import os
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+SHARD_REBALANCE_MESSAGE = "shard_rebalance"  # {"type": "shard_rebalance", "shard_count": N} on MANAGER_CONTROL
+
+
+def _point(value):
+    return int(hashlib.sha256(value.encode()).hexdigest()[:16], 16)
+
+
+class ConsistentHashRing:
+    """
+    Consistent-hash ring over hashed user ids. Each shard owns vnodes points on a 64-bit ring and a key
+    belongs to the first point at or after it, so going from N to N+1 shards moves about 1/(N+1) of the
+    users and only onto the new shard.
+    """
+
+    def __init__(self, shards, vnodes=128):
+        self.shards = list(shards)
+        self.vnodes = vnodes
+        points = sorted((_point(f"shard-{shard}#{vnode}"), shard) for shard in self.shards for vnode in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    @classmethod
+    def of_size(cls, shard_count, vnodes=128):
+        return cls(range(shard_count), vnodes)
+
+    def shard_for(self, hashed_user_id):
+        """Owner of a hashed user id (the sha256 hex digest from hash_user_id)"""
+        if len(self.shards) == 1:
+            return self.shards[0]
+        index = bisect.bisect_left(self._points, int(hashed_user_id[:16], 16))
+        return self._owners[index % len(self._points)]
+
+
+class ShardAssignment:
+    """
+    This process's place on the ring. With shard_count=1 it owns everything and the manager runs unsharded.
+    Each shard reads its own copy of the input topics (subscription suffix "_shard{index}") and handles
+    only the users it owns, so sessions stay on one process without coordinating with the publishers.
+    That copy is an N-fold fan-out: every shard receives and decodes every message and drops the ones it
+    does not own, which is cheap next to an analysis but grows with the shard count. Beyond a handful of
+    shards, have the publisher set a shard attribute and give each subscription a filter on it instead.
+    """
+
+    def __init__(self, index=0, shard_count=1, vnodes=128):
+        _check_shard_count(shard_count)
+        if not 0 <= index < shard_count:
+            raise ValueError(f"Shard index {index} outside 0..{shard_count - 1}")
+        self.index = index
+        self.vnodes = vnodes
+        self.ring = ConsistentHashRing.of_size(shard_count, vnodes)
+        # Fixed at startup: the subscriptions already exist, a later rebalance only changes what is owned
+        self.subscription_suffix = f"_shard{index}" if shard_count > 1 else ""
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            index=int(os.getenv("MANAGER_SHARD_INDEX", "0")),
+            shard_count=int(os.getenv("MANAGER_SHARD_COUNT", "1")),
+            vnodes=int(os.getenv("MANAGER_SHARD_VNODES", "128")),
+        )
+
+    @property
+    def shard_count(self):
+        return len(self.ring.shards)
+
+    @property
+    def is_member(self):
+        return self.index < self.shard_count
+
+    def owns(self, hashed_user_id):
+        """A shard that was rebalanced out of the ring owns nothing"""
+        return self.is_member and self.ring.shard_for(hashed_user_id) == self.index
+
+    def rebalance(self, shard_count):
+        """Switch to a ring of shard_count shards; returns False if this shard is no longer part of it"""
+        _check_shard_count(shard_count)
+        if shard_count != self.shard_count:
+            logger.info("Rebalancing shard ring",
+                        extra={"shard": self.index, "from": self.shard_count, "to": shard_count})
+            self.ring = ConsistentHashRing.of_size(shard_count, self.vnodes)
+        return self.is_member
+
+
+def _check_shard_count(shard_count):
+    if isinstance(shard_count, bool) or not isinstance(shard_count, int) or shard_count < 1:
+        raise ValueError(f"Shard count must be an integer >= 1, got {shard_count!r}")
@@ -0,0 +1,94 @@
+import os
+import time
+from collections import namedtuple
+from services.metrics_service import METRICS
+from services.logging_service import get_logger
+from services.priority_work_queue import PriorityWorkQueue
+from services.tracing_service import bind_context, start_span
+
+logger = get_logger(__name__)
+
+STAGE_SECONDS = METRICS.histogram("pipeline_stage_seconds", "Time spent in a pipeline stage function, per stage")
+
+# func(job) returns the job for the next stage, or None when the job ends here or is handed on another way
+PipelineStage = namedtuple("PipelineStage", ["name", "func", "workers", "reserved_workers", "max_pending"])
+
+
+def stage_from_env(name, func, workers=2, max_pending=100, reserved_workers=0):
+    """Stage whose size can be overridden with MANAGER_PIPELINE_<NAME>_WORKERS and _QUEUE_SIZE"""
+    prefix = f"MANAGER_PIPELINE_{name.upper()}"
+    return PipelineStage(
+        name,
+        func,
+        int(os.getenv(f"{prefix}_WORKERS", str(workers))),
+        reserved_workers,
+        int(os.getenv(f"{prefix}_QUEUE_SIZE", str(max_pending))),
+    )
+
+
+class StagedPipeline:
+    """
+    Chain of stages, each with its own PriorityWorkQueue: its own workers and a bounded queue in front,
+    so a slow stage fills its queue and blocks the stage before it instead of every stage sharing one
+    thread. A job keeps its priority class through every stage. With key(job) set, jobs of one key (a
+    session) run one at a time and in order at every stage. A stage that raises ends the job with
+    on_error(job, error). Queue wait, run time and busy workers are reported per stage under the queue
+    name "<pipeline>.<stage>".
+    """
+
+    def __init__(self, name, stages, key=None, on_error=None):
+        self.name = name
+        self.stages = list(stages)
+        self.key = key
+        self.on_error = on_error
+        self._index = {stage.name: index for index, stage in enumerate(self.stages)}
+        self.queues = {
+            stage.name: PriorityWorkQueue(
+                workers=stage.workers,
+                reserved_workers=stage.reserved_workers,
+                name=f"{name}.{stage.name}",
+                max_pending=stage.max_pending,
+            )
+            for stage in self.stages
+        }
+
+    def submit(self, stage_name, job, priority="routine"):
+        """Queue job at stage_name; blocks while that stage's queue is full. After shutdown it runs inline"""
+        if not self.queues[stage_name].accepting:
+            self.run(stage_name, job, priority)
+            return
+        self.queues[stage_name].submit(
+            priority, bind_context(self.run), stage_name, job, priority,
+            key=self.key(job) if self.key is not None else None,
+        )
+
+    def run(self, stage_name, job, priority="routine"):
+        """Run one stage on the calling thread and queue the result at the next stage"""
+        stage = self.stages[self._index[stage_name]]
+        try:
+            with start_span(f"pipeline.{stage_name}", pipeline=self.name), \
+                    STAGE_SECONDS.time(pipeline=self.name, stage=stage_name):
+                result = stage.func(job)
+        except Exception as e:
+            if self.on_error is None:
+                raise
+            logger.exception("%s stage %s failed: %s", self.name, stage_name, e)
+            self.on_error(job, e)
+            return None
+        next_index = self._index[stage_name] + 1
+        if result is not None and next_index < len(self.stages):
+            self.submit(self.stages[next_index].name, result, priority)
+        return result
+
+    def get_stats(self):
+        return {stage_name: queue.get_stats() for stage_name, queue in self.queues.items()}
+
+    def shutdown(self, timeout=None, discard_pending=False):
+        """
+        Finish the queued jobs stage by stage, so later stages still see what earlier ones pass on.
+        With discard_pending queued jobs are dropped, e.g. once their messages were handed back to Pub/Sub.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for stage in self.stages:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            self.queues[stage.name].shutdown(timeout=remaining, discard_pending=discard_pending)
@@ -0,0 +1,202 @@
+import atexit
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+TRACEPARENT_ATTRIBUTE = "traceparent"  # W3C trace context: 00-<trace id>-<parent span id>-01
+SENT_AT_ATTRIBUTE = "sent-at"  # Publish time in epoch microseconds
+
+SpanContext = namedtuple("SpanContext", ["trace_id", "span_id"])
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def now_us():
+    return time.time_ns() // 1000
+
+
+def _new_id(bits):
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_us", "end_us", "thread_id", "attributes")
+
+    def __init__(self, name, parent=None, start_us=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else _new_id(128)
+        self.span_id = _new_id(64)
+        self.parent_id = parent.span_id if parent else None
+        self.start_us = start_us if start_us is not None else now_us()
+        self.end_us = None
+        self.thread_id = threading.get_ident()
+        self.attributes = attributes or {}
+
+    @property
+    def context(self):
+        return SpanContext(self.trace_id, self.span_id)
+
+    @property
+    def duration_us(self):
+        return (self.end_us or now_us()) - self.start_us
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, end_us=None):
+        self.end_us = end_us if end_us is not None else now_us()
+        if _exporter is not None:
+            _exporter.export(self)
+
+
+class ChromeTraceExporter:
+    """
+    Appends finished spans to a file in the Chrome trace event format, which chrome://tracing and
+    Perfetto open directly. Each process shows as its own track, each thread as a row in it, and the
+    trace and span ids are kept in the event args so one request can be followed across services.
+    """
+
+    def __init__(self, path, process_name=None):
+        self.path = path
+        self.exported = 0
+        self._lock = threading.Lock()
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", encoding="utf-8")
+        if is_new:
+            # The array format allows a missing closing bracket, so events can be appended forever
+            self._file.write("[\n")
+        self._write({
+            "name": "process_name", "ph": "M", "pid": os.getpid(),
+            "args": {"name": process_name or f"pid {os.getpid()}"},
+        })
+
+    def _write(self, event):
+        line = json.dumps(event, default=str, ensure_ascii=False) + ",\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+
+    def export(self, span):
+        args = {"trace_id": span.trace_id, "span_id": span.span_id, "parent_id": span.parent_id}
+        args.update(span.attributes)
+        self._write({
+            "name": span.name,
+            "cat": span.name.split(".", 1)[0],
+            "ph": "X",
+            "ts": span.start_us,
+            "dur": max(0, span.end_us - span.start_us),
+            "pid": os.getpid(),
+            "tid": span.thread_id,
+            "args": args,
+        })
+        self.exported += 1
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def configure_tracing(path=None, process_name=None):
+    """
+    Export spans to path, or to TRACE_FILE when not given ("{pid}" in it is replaced by the process id).
+    Without either, spans are still created and propagated through Pub/Sub but not written anywhere.
+    """
+    global _exporter
+    path = path or os.getenv("TRACE_FILE")
+    if not path:
+        return None
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = ChromeTraceExporter(path.replace("{pid}", str(os.getpid())), process_name)
+            atexit.register(shutdown_tracing)
+            logger.info("Writing trace spans to %s", _exporter.path)
+        return _exporter
+
+
+def shutdown_tracing():
+    global _exporter
+    with _exporter_lock:
+        if _exporter is not None:
+            _exporter.close()
+            _exporter = None
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def start_span(name, parent=None, **attributes):
+    """
+    Run the block as a span. The parent defaults to the current span of this thread or task;
+    pass a SpanContext from extract() to continue a trace that arrived over Pub/Sub.
+    """
+    if parent is None:
+        current = _current_span.get()
+        parent = current.context if current is not None else None
+    span = Span(name, parent, attributes=attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.set_attribute("error", repr(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def record_span(name, start_us, end_us=None, parent=None, **attributes):
+    """Export a span whose timing was measured elsewhere, e.g. the time a message spent on the bus"""
+    span = Span(name, parent, start_us=start_us, attributes=attributes)
+    span.end(end_us)
+    return span
+
+
+def inject(attributes, span=None):
+    """Add the trace context of span (default: the current one) and the send time to message attributes"""
+    span = span or _current_span.get()
+    if span is not None:
+        attributes[TRACEPARENT_ATTRIBUTE] = f"00-{span.trace_id}-{span.span_id}-01"
+    attributes[SENT_AT_ATTRIBUTE] = str(now_us())
+    return attributes
+
+
+def extract(attributes):
+    """Return (SpanContext or None, sent-at in epoch microseconds or None) from message attributes"""
+    attributes = attributes or {}
+    context = None
+    traceparent = attributes.get(TRACEPARENT_ATTRIBUTE)
+    if traceparent:
+        parts = traceparent.split("-")
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+            context = SpanContext(parts[1], parts[2])
+    sent_at = attributes.get(SENT_AT_ATTRIBUTE)
+    try:
+        sent_at = int(sent_at) if sent_at else None
+    except ValueError:
+        sent_at = None
+    return context, sent_at
+
+
+def bind_context(func):
+    """Wrap func so it runs with the caller's current span, for work handed to another thread"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
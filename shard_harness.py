@@ -0,0 +1,185 @@
+"""
+Local multi-process check that sharded managers scale with the number of shards.
+
+    python shard_harness.py --shards 1,2,4 --messages 4000 --users 1000 --work-ms 2
+    python shard_harness.py --shards 1,2,4,8 --work sleep --work-ms 5
+
+Each shard runs in its own process with the same routing as a sharded ManagerAgent: it sees every
+message (its own subscription copy), skips users another shard owns, and for its own users keeps the
+session in a SessionStore, runs the red flag pre-triage and then a stand-in for the analysis, busy
+CPU (--work cpu) or waiting like an LLM call (--work sleep). The report gives throughput per shard
+count, the speedup over one shard, and the load balance of the ring, plus how many users move when a
+shard is added. With --work cpu the ideal speedup is capped by the number of cores.
+
+This measures the routing and the ring, not a real deployment: the analysis is the stand-in above rather
+than ManagerAgent with its LLM calls, and messages come from in-process queues, not Pub/Sub. Like the
+real subscriptions, every shard still receives every message (N-fold fan-out); the foreign counts in
+the report show that share of each shard's input.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import time
+import uuid
+
+from helper_methods import hash_user_id
+from services.shard_ring import ConsistentHashRing
+
+STOP = None
+SYNTHETIC_MESSAGES = [
+    {"chief_complaint": "fever", "symptoms": "fever 39.2 since yesterday, coughing"},
+    {"chief_complaint": "rash", "symptoms": "red rash on the arms, no fever"},
+    {"chief_complaint": "vomiting", "symptoms": "vomiting three times today, drinking a little"},
+]
+
+
+def run_shard(index, shard_count, inbox, results, work, work_ms):
+    # Imported here so each spawned process builds its own metrics, matcher and store
+    from all_classes.session_store_class import SessionStore
+    from medical_analyzer.red_flag_matcher import RED_FLAG_MATCHER
+    from services.shard_ring import ShardAssignment
+
+    shard = ShardAssignment(index, shard_count)
+    sessions = SessionStore(max_sessions=100000, idle_ttl_seconds=3600, name=f"shard{index}")
+    handled = foreign = 0
+    started = None
+    while True:
+        message = inbox.get()
+        if message is STOP:
+            break
+        if started is None:
+            started = time.perf_counter()
+        hashed_user_id = hash_user_id(message["user_id"])
+        if not shard.owns(hashed_user_id):
+            foreign += 1
+            continue
+        if sessions.get(hashed_user_id) is None:
+            sessions.put(hashed_user_id, object())
+        RED_FLAG_MATCHER.match(f"{message['chief_complaint']} | {message['symptoms']}")
+        if work == "cpu":
+            end = time.perf_counter() + work_ms / 1000
+            while time.perf_counter() < end:
+                pass
+        else:
+            time.sleep(work_ms / 1000)
+        handled += 1
+    sessions.stop()
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    results.put({"shard": index, "handled": handled, "foreign": foreign, "sessions": len(sessions),
+                 "elapsed": elapsed})
+
+
+def collect_results(processes, results, timeout):
+    """One result per shard; fails instead of hanging when a shard dies or runs past the timeout"""
+    deadline = time.monotonic() + timeout
+    collected = []
+    while len(collected) < len(processes):
+        try:
+            collected.append(results.get(timeout=1))
+            continue
+        except queue.Empty:
+            pass
+        crashed = [index for index, process in enumerate(processes) if process.exitcode not in (None, 0)]
+        if crashed or time.monotonic() > deadline:
+            for process in processes:
+                process.terminate()
+            reason = f"shards {crashed} exited with an error" if crashed else f"no result after {timeout}s"
+            raise RuntimeError(f"Sharded run failed: {reason}")
+    return collected
+
+
+def run_sharded(shard_count, messages, work, work_ms, timeout):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    inboxes = [context.Queue() for _ in range(shard_count)]
+    processes = [
+        context.Process(target=run_shard, args=(index, shard_count, inboxes[index], results, work, work_ms))
+        for index in range(shard_count)
+    ]
+    for process in processes:
+        process.start()
+    for message in messages:
+        for inbox in inboxes:
+            inbox.put(message)
+    for inbox in inboxes:
+        inbox.put(STOP)
+    shards = sorted(collect_results(processes, results, timeout), key=lambda result: result["shard"])
+    for process in processes:
+        process.join()
+
+    handled = sum(shard["handled"] for shard in shards)
+    elapsed = max(shard["elapsed"] for shard in shards)
+    mean = handled / shard_count
+    return {
+        "shards": shard_count,
+        "handled": handled,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(handled / elapsed, 1) if elapsed else None,
+        "load_imbalance": round(max(shard["handled"] for shard in shards) / mean, 3) if mean else None,
+        "per_shard": [shard["handled"] for shard in shards],
+        "foreign_per_shard": [shard["foreign"] for shard in shards],
+    }
+
+
+def ring_movement(user_ids, shard_count):
+    """Share of users that change owner going from shard_count to shard_count + 1, and whether all go to the new one"""
+    before = ConsistentHashRing.of_size(shard_count)
+    after = ConsistentHashRing.of_size(shard_count + 1)
+    moved = [(before.shard_for(user), after.shard_for(user)) for user in user_ids]
+    moved = [(old, new) for old, new in moved if old != new]
+    return {
+        "from": shard_count,
+        "to": shard_count + 1,
+        "moved_fraction": round(len(moved) / len(user_ids), 3),
+        "ideal_fraction": round(1 / (shard_count + 1), 3),
+        "only_to_new_shard": all(new == shard_count for _, new in moved),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", default="1,2,4", help="Comma separated shard counts to compare")
+    parser.add_argument("--messages", type=int, default=4000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--work", choices=("cpu", "sleep"), default="cpu", help="Stand-in for the analysis")
+    parser.add_argument("--work-ms", type=float, default=2.0, help="Analysis time per message")
+    parser.add_argument("--min-efficiency", type=float, default=0.8,
+                        help="Lowest accepted speedup / ideal speedup before the check fails")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for the shards of one run")
+    args = parser.parse_args()
+
+    shard_counts = [int(count) for count in args.shards.split(",")]
+    users = [str(uuid.uuid4()) for _ in range(args.users)]
+    messages = [
+        dict(SYNTHETIC_MESSAGES[i % len(SYNTHETIC_MESSAGES)], user_id=users[i % len(users)])
+        for i in range(args.messages)
+    ]
+    cores = os.cpu_count() or 1
+
+    runs = [run_sharded(count, messages, args.work, args.work_ms, args.timeout) for count in shard_counts]
+    baseline = runs[0]["throughput_per_second"] / shard_counts[0]
+    passed = True
+    for run in runs:
+        ideal = run["shards"] if args.work == "sleep" else min(run["shards"], cores)
+        run["speedup"] = round(run["throughput_per_second"] / baseline, 2)
+        run["ideal_speedup"] = ideal
+        run["efficiency"] = round(run["speedup"] / ideal, 2)
+        passed = passed and run["efficiency"] >= args.min_efficiency
+
+    hashed_users = [hash_user_id(user) for user in users]
+    report = {
+        "work": args.work,
+        "work_ms": args.work_ms,
+        "cores": cores,
+        "runs": runs,
+        "rebalance": [ring_movement(hashed_users, count) for count in shard_counts],
+        "linear": passed,
+    }
+    print(json.dumps(report, indent=2))
+    raise SystemExit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,18 @@ from pymongo import MongoClient
 from dotenv import load_dotenv
 from entities import NURSING_ADVISORY_COLLECTION_NAME
 from helper_methods import get_time_in_epoc
+from services.metrics_service import METRICS
+from services.tracing_service import start_span
 
 load_dotenv()
 
+MONGO_LATENCY = METRICS.histogram("mongo_operation_duration_seconds", "MongoDB operation time per operation")
+
+
+def _as_document(analysis):
+    """An agent's pydantic result as a plain dict, nested models included, so BSON can encode it"""
+    return analysis.model_dump() if analysis is not None else None
+
 
 class MongoConnection:
     def __init__(self):
@@ -21,33 +30,40 @@ class MongoConnection:
     def close(self):
         self.client.close()
 
+    def get_session(self, session_id):
+        """Return the session document, or None for a user we have not seen"""
+        with start_span("mongo.get_session"), MONGO_LATENCY.time(operation="get_session"):
+            return self.collection.find_one({"session_id": session_id})
+
     def create_new_session(self, session_id, user_id):
-        self.collection.insert_one({
-            "session_id": session_id,
-            "user_id": user_id,
-            "session_start_time": get_time_in_epoc(),
-            "messages": [],
-            "all_decisions": [],
-            "staff_ids": [],
-            "session_status": "init",
-            "medical_analysis": None
-        })
+        with start_span("mongo.create_new_session"), MONGO_LATENCY.time(operation="create_new_session"):
+            self.collection.insert_one({
+                "session_id": session_id,
+                "user_id": user_id,
+                "session_start_time": get_time_in_epoc(),
+                "messages": [],
+                "all_decisions": [],
+                "staff_ids": [],
+                "session_status": "init",
+                "medical_analysis": None
+            })
 
     def store_medical_analysis(self, session_id, analysis_results):
         """
         Store medical analysis results in the session document.
         """
-        self.collection.update_one(
-            {"session_id": session_id},
-            {
-                "$set": {
-                    "medical_analysis": {
-                        "emergency_analysis": analysis_results.get("emergency_analysis").__dict__ if analysis_results.get("emergency_analysis") else None,
-                        "staff_analysis": analysis_results.get("staff_analysis").__dict__ if analysis_results.get("staff_analysis") else None,
-                        "details_analysis": analysis_results.get("details_analysis").__dict__ if analysis_results.get("details_analysis") else None,
-                        "session_guidance": analysis_results.get("session_guidance"),
-                        "analysis_timestamp": get_time_in_epoc()
+        with start_span("mongo.store_medical_analysis"), MONGO_LATENCY.time(operation="store_medical_analysis"):
+            self.collection.update_one(
+                {"session_id": session_id},
+                {
+                    "$set": {
+                        "medical_analysis": {
+                            "emergency_analysis": _as_document(analysis_results.get("emergency_analysis")),
+                            "staff_analysis": _as_document(analysis_results.get("staff_analysis")),
+                            "details_analysis": _as_document(analysis_results.get("details_analysis")),
+                            "session_guidance": analysis_results.get("session_guidance"),
+                            "analysis_timestamp": get_time_in_epoc()
+                        }
                     }
                 }
-            }
-        )
+            )
@@ -0,0 +1,78 @@
+import random
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from services import latency_window
+from services.latency_window import LatencyWindow
+
+
+class LatencyWindowTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        mock.patch.object(latency_window, "time", SimpleNamespace(monotonic=lambda: self.now)).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_size_is_bounded_by_capacity(self):
+        window = LatencyWindow(capacity=100)
+        for value in range(1000):
+            window.record({"total": value})
+
+        self.assertEqual(len(window), 100)
+        self.assertEqual(window.total_recorded, 1000)
+        summary = window.summary()["total"]
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual((summary["mean"], summary["max"]), (949.5, 999))
+
+    def test_percentiles(self):
+        window = LatencyWindow(percentiles=(0, 50, 90, 95, 99, 100))
+        values = list(range(101))
+        random.Random(7).shuffle(values)
+        for value in values:
+            window.record({"total": value, "llm": value * 2})
+
+        summary = window.summary()
+        self.assertEqual(summary["total"], {"count": 101, "mean": 50.0, "p0": 0, "p50": 50, "p90": 90, "p95": 95,
+                                            "p99": 99, "p100": 100, "max": 100})
+        self.assertEqual((summary["llm"]["p50"], summary["llm"]["p99"]), (100, 198))
+
+    def test_single_value(self):
+        window = LatencyWindow()
+        window.record({"total": 12.5})
+
+        self.assertEqual(window.summary()["total"], {"count": 1, "mean": 12.5, "p50": 12.5, "p95": 12.5,
+                                                     "p99": 12.5, "max": 12.5})
+
+    def test_components_are_summarized_independently_and_non_numbers_ignored(self):
+        window = LatencyWindow()
+        window.record({"total": 10, "status": "ok"})
+        window.record({"total": 20, "pubsub": 5, "error": None})
+
+        summary = window.summary()
+        self.assertEqual(set(summary), {"total", "pubsub"})
+        self.assertEqual((summary["total"]["count"], summary["pubsub"]["count"]), (2, 1))
+
+    def test_recent_window(self):
+        window = LatencyWindow()
+        window.record({"total": 1000})
+        self.now += 60
+        window.record({"total": 10})
+
+        self.assertEqual(window.summary(window_seconds=30)["total"]["max"], 10)
+        self.assertEqual(window.summary()["total"]["max"], 1000)
+        self.now += 60
+        self.assertEqual(window.summary(window_seconds=30), {})
+
+    def test_recorded_breakdown_is_copied(self):
+        window = LatencyWindow()
+        breakdown = {"total": 10}
+        window.record(breakdown)
+        breakdown["total"] = 99
+
+        self.assertEqual(window.summary()["total"]["max"], 10)
+        window.clear()
+        self.assertEqual((len(window), window.summary()), (0, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from unittest import mock
+
+from services import llm_client_registry
+from services.llm_client_registry import LLMClientRegistry
+
+
+class SessionCreationTest(unittest.TestCase):
+    """Sessions and their analyzers must not build SDK clients, open pools or read secrets"""
+
+    def setUp(self):
+        self.registry = LLMClientRegistry()
+        self.sdk = {
+            name: mock.patch.object(llm_client_registry, name).start()
+            for name in ("Anthropic", "OpenAI", "genai", "httpx", "SecretManagerService")
+        }
+        self.sdk["SecretManagerService"].return_value.access_secret.return_value = (
+            '{"claude_key": "a", "openai_key": "o", "gemini_key": "g"}'
+        )
+        mock.patch("agents.llm_agents.llm_base_agent.LLM_CLIENTS", self.registry).start()
+        mock.patch("all_classes.active_session_class.MongoConnection").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def assert_nothing_built(self):
+        for name, sdk in self.sdk.items():
+            self.assertFalse(sdk.called, f"{name} was constructed")
+            self.assertFalse(sdk.client.Client.called, f"{name}.client.Client was constructed")
+        self.assertEqual(self.registry.get_stats()["clients"], [])
+
+    def test_coordinator_creation_builds_no_clients(self):
+        from medical_analyzer import MedicalAnalyzerCoordinator
+
+        for _ in range(5):
+            MedicalAnalyzerCoordinator()
+        self.assert_nothing_built()
+
+    def test_session_creation_builds_no_clients(self):
+        from all_classes.active_session_class import ActiveSession
+
+        for index in range(5):
+            ActiveSession(f"session{index}", f"user{index}")
+        self.assert_nothing_built()
+
+    def test_agents_share_one_client_per_provider(self):
+        from medical_analyzer import MedicalAnalyzerCoordinator
+
+        coordinators = [MedicalAnalyzerCoordinator() for _ in range(3)]
+        agents = [agent for c in coordinators for agent in (c.emergency_agent, c.staff_agent, c.details_agent)]
+        clients = {id(agent.anthropic_client) for agent in agents}
+        self.assertEqual(len(clients), 1)
+        self.assertEqual(self.sdk["Anthropic"].call_count, 1)
+        self.assertEqual(self.sdk["SecretManagerService"].call_count, 1)
+
+
+class SecretRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = LLMClientRegistry(secret_retry_seconds=1.0, secret_retry_max_seconds=4.0)
+        self.secret_manager = mock.patch.object(llm_client_registry, "SecretManagerService").start()
+        self.access_secret = self.secret_manager.return_value.access_secret
+        self.now = 100.0
+        mock.patch.object(llm_client_registry.time, "monotonic", lambda: self.now).start()
+        mock.patch.object(llm_client_registry, "Anthropic").start()
+        mock.patch.object(llm_client_registry, "httpx").start()
+        mock.patch.dict("os.environ", {"LOCAL_CLAUDE_KEY": ""}).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_failure_is_not_cached(self):
+        self.access_secret.side_effect = [RuntimeError("unavailable"), '{"claude_key": "a"}']
+
+        with self.assertRaises(RuntimeError):
+            self.registry.anthropic()
+        self.now += 1.0
+        self.assertIsNotNone(self.registry.anthropic())
+        self.assertEqual(self.access_secret.call_count, 2)
+        llm_client_registry.Anthropic.assert_called_once_with(api_key="a", http_client=mock.ANY)
+
+    def test_retries_back_off(self):
+        self.access_secret.side_effect = RuntimeError("unavailable")
+
+        attempts = []
+        for _ in range(12):
+            calls = self.access_secret.call_count
+            with self.assertRaises(RuntimeError):
+                self.registry.anthropic()
+            if self.access_secret.call_count > calls:
+                attempts.append(self.now)
+            self.now += 1.0
+        # Waits of 1, 2, 4 and then the 4 second cap
+        self.assertEqual(attempts, [100.0, 101.0, 103.0, 107.0, 111.0])
+
+    def test_local_key_is_used_while_secret_manager_is_down(self):
+        self.access_secret.side_effect = RuntimeError("unavailable")
+
+        with mock.patch.dict("os.environ", {"LOCAL_CLAUDE_KEY": "local"}):
+            self.registry.anthropic()
+        llm_client_registry.Anthropic.assert_called_once_with(api_key="local", http_client=mock.ANY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from all_classes.active_session_class import ActiveSession
+from all_classes.manager_class import ManagerAgent, _CaseJob
+from medical_analyzer.emergency_detection_agent import EmergencyAnalysis
+from medical_analyzer.medical_analyzer_coordinator import AGENT_INPUTS
+from medical_analyzer.medical_details_agent import MedicalDetailsAnalysis
+from medical_analyzer.staff_analysis_agent import StaffAnalysis
+from talk_to_mongo import _as_document
+
+REPLIES = {
+    "Emergency Detection Agent": {
+        "is_emergency": False, "emergency_level": "low", "emergency_reason": "Mild fever",
+        "recommended_action": "Nursing advice", "time_sensitivity": "routine",
+    },
+    "Staff Analysis Agent": {
+        "required_specialties": [{"specialty_hebrew": "רופא ילדים", "specialty_english": "Pediatrician",
+                                  "priority": "medium", "reason": "Fever in a child"}],
+        "recommended_staff_roles": ["אחות מוסמכת"], "consultation_type": "scheduled",
+        "coordination_needed": False, "additional_notes": "",
+    },
+    "Medical Details Agent": {
+        "provided_details": [{"category": "symptoms", "information": "fever", "completeness": "partial"}],
+        "missing_details": [{"detail_category": "vital_signs", "specific_question": "How high is the fever?",
+                             "importance": "high", "reason": "Severity"}],
+        "information_completeness_score": 4, "recommended_questions": [], "next_assessment_steps": ["Measure"],
+        "case_clarity": "needs_clarification",
+    },
+}
+
+
+class StubProvider:
+    """Anthropic stand-in answering each medical agent, recognised by its system prompt, with a valid reply"""
+
+    def __init__(self):
+        self.calls = []
+        self.messages = SimpleNamespace(create=self._create)
+
+    def anthropic(self):
+        return self
+
+    def _create(self, system, **_):
+        agent_name = next(name for name in REPLIES if name in system)
+        self.calls.append(agent_name)
+        return SimpleNamespace(content=[SimpleNamespace(text=json.dumps(REPLIES[agent_name]))])
+
+
+class MedicalAnalysisTestCase(unittest.TestCase):
+    def setUp(self):
+        self.provider = StubProvider()
+        mock.patch("agents.llm_agents.llm_base_agent.LLM_CLIENTS", self.provider).start()
+        self.mongo = mock.patch("all_classes.active_session_class.MongoConnection").start()
+        self.addCleanup(mock.patch.stopall)
+
+
+class AnalysisResultTest(MedicalAnalysisTestCase):
+    def test_agents_return_their_analysis_models(self):
+        session = ActiveSession("session1", "user1")
+        results = session.analyze_medical_case(patient_info="4 years old", chief_complaint="fever",
+                                               symptoms="fever 38.5 since this morning")
+
+        self.assertIsInstance(results["emergency_analysis"], EmergencyAnalysis)
+        self.assertIsInstance(results["staff_analysis"], StaffAnalysis)
+        self.assertIsInstance(results["details_analysis"], MedicalDetailsAnalysis)
+        self.assertEqual(session.get_required_staff()[0]["specialty"], "Pediatrician")
+        self.assertEqual(session.get_questions_to_ask(), ["How high is the fever?"])
+
+    def test_manager_analyze_stage_reports_no_failure(self):
+        job = _CaseJob("user1", {}, None, "routine")
+        job.session = ActiveSession("session1", "user1")
+        job.case = {"patient_info": "", "chief_complaint": "fever", "symptoms": "fever 38.5"}
+
+        ManagerAgent._analyze_stage(object.__new__(ManagerAgent), job)
+
+        self.assertIsNone(job.error)
+
+    def test_unparsable_reply_is_a_failure(self):
+        unparsable = SimpleNamespace(content=[SimpleNamespace(text="not json")])
+        self.provider.messages.create = lambda system, **_: unparsable
+        job = _CaseJob("user1", {}, None, "routine")
+        job.session = ActiveSession("session1", "user1")
+        job.case = {"patient_info": "", "chief_complaint": "fever", "symptoms": "fever 38.5"}
+
+        ManagerAgent._analyze_stage(object.__new__(ManagerAgent), job)
+
+        self.assertIsNotNone(job.error)
+
+    def test_stored_analysis_is_plain_data(self):
+        session = ActiveSession("session1", "user1")
+        results = session.analyze_medical_case(patient_info="", chief_complaint="fever", symptoms="fever 38.5")
+
+        stored = _as_document(results["staff_analysis"])
+        self.assertIsInstance(stored["required_specialties"][0], dict)
+        self.assertEqual(json.loads(json.dumps(stored)), stored)
+
+
+class IncrementalAnalysisTest(MedicalAnalysisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = ActiveSession("session1", "user1")
+        self.session.analyze_medical_case(patient_info="4 years old", chief_complaint="fever",
+                                          symptoms="fever 38.5", allergies="none")
+        self.provider.calls.clear()
+
+    def test_only_agents_reading_the_changed_field_run(self):
+        expected = {"allergies": ["Medical Details Agent"], "severity": ["Emergency Detection Agent"]}
+        for field, agents in expected.items():
+            readers = sorted(agent for agent, fields in AGENT_INPUTS.items() if field in fields)
+            self.assertEqual(len(readers), 1, field)
+            self.provider.calls.clear()
+
+            self.session.analyze_medical_case(patient_info="", chief_complaint="", **{field: f"new {field}"})
+
+            self.assertEqual(self.provider.calls, agents, field)
+        self.assertIsInstance(self.session.medical_analysis_results["staff_analysis"], StaffAnalysis)
+
+    def test_unchanged_case_makes_no_calls(self):
+        self.session.analyze_medical_case(patient_info="", chief_complaint="fever")
+
+        self.assertEqual(self.provider.calls, [])
+
+    def test_rehydrated_results_are_models_and_reused(self):
+        results = self.session.medical_analysis_results
+        document = {"medical_analysis": {key: _as_document(results[key]) for key in
+                                         ("emergency_analysis", "staff_analysis", "details_analysis")}}
+        document["medical_analysis"]["session_guidance"] = results["session_guidance"]
+
+        restored = ActiveSession("session1", "user1", session_doc=document)
+        for key, model in (("emergency_analysis", EmergencyAnalysis), ("staff_analysis", StaffAnalysis),
+                           ("details_analysis", MedicalDetailsAnalysis)):
+            self.assertIsInstance(restored.medical_analysis_results[key], model)
+
+        case = dict(self.session._case_inputs, allergies="penicillin")
+        restored.medical_analyzer.reanalyze_medical_case(case, restored.medical_analysis_results, {"allergies"})
+        self.assertEqual(self.provider.calls, ["Medical Details Agent"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from all_classes.message_coalescer_class import MessageCoalescer, merge_messages
+from services.priority_work_queue import PriorityWorkQueue
+
+SESSION = SimpleNamespace(session_id="session1")
+
+
+class CoalescerTestCase(unittest.TestCase):
+    window_seconds = 0.2
+
+    def setUp(self):
+        self.flushes = []
+        self.flushed = threading.Condition()
+        self.gate = None
+        self.work_queue = PriorityWorkQueue(workers=2, reserved_workers=1, name="test-coalescer-queue")
+        self.coalescer = MessageCoalescer(self.on_flush, self.work_queue, window_seconds=self.window_seconds,
+                                          max_delay_seconds=5.0, name="test-coalescer")
+        self.addCleanup(self.work_queue.shutdown, 1.0)
+        self.addCleanup(self.coalescer.stop, 1.0)
+
+    def on_flush(self, session, message, triage, priority, waiters):
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        if message.get("fail"):
+            raise RuntimeError("analysis failed")
+        for waiter in waiters:
+            waiter.set_result(message)
+        with self.flushed:
+            self.flushes.append((message, priority, len(waiters)))
+            self.flushed.notify_all()
+
+    def submit(self, message, **kwargs):
+        waiter = Future()
+        self.coalescer.submit(SESSION, message, waiters=[waiter], **kwargs)
+        return waiter
+
+    def wait_for_flushes(self, count):
+        with self.flushed:
+            self.assertTrue(self.flushed.wait_for(lambda: len(self.flushes) >= count, timeout=5), self.flushes)
+
+
+class BurstTest(CoalescerTestCase):
+    def test_burst_is_merged_into_one_analysis(self):
+        waiters = [self.submit({"symptoms": symptoms}) for symptoms in ("fever", "cough", "fever")]
+        self.wait_for_flushes(1)
+        time.sleep(self.window_seconds)
+
+        self.assertEqual(self.flushes, [({"symptoms": "fever; cough"}, "routine", 3)])
+        for waiter in waiters:
+            self.assertEqual(waiter.result(timeout=1), {"symptoms": "fever; cough"})
+
+    def test_batch_runs_at_its_highest_priority(self):
+        self.submit({"symptoms": "fever"})
+        self.submit({"symptoms": "rash"}, priority="urgent")
+        self.wait_for_flushes(1)
+
+        self.assertEqual(self.flushes[0][1], "urgent")
+
+    def test_emergency_flushes_without_waiting_for_the_window(self):
+        self.coalescer.window_seconds = self.coalescer.max_delay_seconds = 60
+        waiter = self.submit({"symptoms": "not breathing"}, triage=SimpleNamespace(is_emergency=True))
+
+        self.assertEqual(waiter.result(timeout=1), {"symptoms": "not breathing"})
+        self.assertEqual(self.flushes[0][1], "emergency")
+
+    def test_failed_analysis_reaches_every_waiter(self):
+        waiters = [self.submit({"symptoms": "fever", "fail": True}), self.submit({"symptoms": "cough"})]
+
+        for waiter in waiters:
+            with self.assertRaises(RuntimeError):
+                waiter.result(timeout=5)
+        self.assertEqual(self.coalescer.pending(), 0)
+
+    def test_stop_flushes_what_is_buffered(self):
+        self.coalescer.window_seconds = self.coalescer.max_delay_seconds = 60
+        waiter = self.submit({"symptoms": "fever"})
+
+        self.coalescer.stop(timeout=5)
+        self.assertEqual(waiter.result(timeout=1), {"symptoms": "fever"})
+
+
+class NoWindowTest(CoalescerTestCase):
+    window_seconds = 0
+
+    def test_each_message_is_analyzed_on_arrival(self):
+        for symptoms in ("fever", "cough"):
+            self.assertEqual(self.submit({"symptoms": symptoms}).result(timeout=5), {"symptoms": symptoms})
+
+        self.assertEqual([flush[0] for flush in self.flushes], [{"symptoms": "fever"}, {"symptoms": "cough"}])
+
+    def test_messages_behind_a_running_analysis_are_merged(self):
+        self.gate = threading.Event()
+        first = self.submit({"symptoms": "fever"})
+        time.sleep(0.05)
+        later = [self.submit({"symptoms": "cough"}), self.submit({"allergies": "penicillin"})]
+        self.assertEqual(self.coalescer.pending(), 2)
+        self.gate.set()
+
+        self.assertEqual(first.result(timeout=5), {"symptoms": "fever"})
+        merged = {"symptoms": "cough", "allergies": "penicillin"}
+        for waiter in later:
+            self.assertEqual(waiter.result(timeout=5), merged)
+        self.assertEqual(len(self.flushes), 2)
+
+
+class MergeMessagesTest(unittest.TestCase):
+    def test_distinct_values_are_joined_in_arrival_order(self):
+        merged = merge_messages([
+            {"symptoms": "fever", "age": None, "severity": ""},
+            {"symptoms": "cough", "age": 4, "severity": "mild"},
+            {"symptoms": "fever", "age": 5},
+        ])
+        self.assertEqual(merged, {"symptoms": "fever; cough", "age": 5, "severity": "mild"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import threading
+import time
+import unittest
+
+from services.priority_work_queue import PriorityWorkQueue, priority_rank
+
+
+class WorkQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.runs = []
+        self.run_lock = threading.Lock()
+        self.gates = {}
+
+    def make_queue(self, **kwargs):
+        work_queue = PriorityWorkQueue(name="test-work", **kwargs)
+        self.addCleanup(work_queue.shutdown, 1.0, True)
+        self.addCleanup(self.open_gates)  # Runs first, so the running tasks can finish
+        return work_queue
+
+    def open_gates(self):
+        for gate in self.gates.values():
+            gate.set()
+
+    def task(self, name):
+        with self.run_lock:
+            self.runs.append(name)
+        gate = self.gates.get(name)
+        if gate is not None:
+            gate.wait(timeout=5)
+
+    def gate(self, name):
+        self.gates[name] = threading.Event()
+        return self.gates[name]
+
+    def wait_for_runs(self, *names):
+        deadline = time.monotonic() + 5
+        while not set(names) <= set(self.runs):
+            if time.monotonic() > deadline:
+                raise AssertionError(f"{names} did not run, ran {self.runs}")
+            time.sleep(0.01)
+
+
+class ReservedWorkerTest(WorkQueueTestCase):
+    def test_emergency_runs_while_routine_work_holds_every_general_worker(self):
+        work_queue = self.make_queue(workers=3, reserved_workers=1)
+        for name in ("routine-1", "routine-2", "routine-3"):
+            self.gate(name)
+            work_queue.submit("routine", self.task, name)
+        self.wait_for_runs("routine-1", "routine-2")
+
+        work_queue.submit("emergency", self.task, "emergency")
+        self.wait_for_runs("emergency")
+        self.assertNotIn("routine-3", self.runs)
+
+    def test_reserved_workers_never_take_routine_or_urgent_work(self):
+        work_queue = self.make_queue(workers=2, reserved_workers=1)
+        for name, priority in (("routine", "routine"), ("urgent", "urgent")):
+            self.gate(name)
+            work_queue.submit(priority, self.task, name)
+        time.sleep(0.2)
+
+        self.assertEqual(len(self.runs), 1, self.runs)
+        self.assertEqual(sum(work_queue.get_stats()["waiting"].values()), 1)
+
+    def test_every_worker_cannot_be_reserved(self):
+        with self.assertRaises(ValueError):
+            PriorityWorkQueue(workers=2, reserved_workers=2)
+
+
+class OrderingTest(WorkQueueTestCase):
+    def test_highest_priority_runs_first(self):
+        work_queue = self.make_queue(workers=1, reserved_workers=0)
+        blocker = self.gate("blocker")
+        work_queue.submit("routine", self.task, "blocker")
+        self.wait_for_runs("blocker")
+        for name in ("routine-1", "urgent", "routine-2", "emergency"):
+            work_queue.submit(name.split("-")[0], self.task, name)
+        blocker.set()
+        self.wait_for_runs("routine-2")
+
+        self.assertEqual(self.runs, ["blocker", "emergency", "urgent", "routine-1", "routine-2"])
+
+    def test_same_key_runs_in_submit_order_across_priorities(self):
+        work_queue = self.make_queue(workers=4, reserved_workers=1)
+        first = self.gate("session1-routine")
+        work_queue.submit("routine", self.task, "session1-routine", key="session1")
+        self.wait_for_runs("session1-routine")
+        work_queue.submit("emergency", self.task, "session1-emergency", key="session1")
+        work_queue.submit("urgent", self.task, "session1-urgent", key="session1")
+        work_queue.submit("routine", self.task, "session2-routine", key="session2")
+        self.wait_for_runs("session2-routine")
+        self.assertNotIn("session1-emergency", self.runs)
+
+        first.set()
+        self.wait_for_runs("session1-urgent")
+        session1 = [name for name in self.runs if name.startswith("session1")]
+        self.assertEqual(session1, ["session1-routine", "session1-emergency", "session1-urgent"])
+
+    def test_unknown_priority_is_routine(self):
+        self.assertEqual(priority_rank("whenever"), priority_rank("routine"))
+
+
+class BackpressureTest(WorkQueueTestCase):
+    def test_submit_blocks_while_max_pending_tasks_wait(self):
+        work_queue = self.make_queue(workers=1, reserved_workers=0, max_pending=1)
+        blocker = self.gate("blocker")
+        work_queue.submit("routine", self.task, "blocker")
+        self.wait_for_runs("blocker")
+        work_queue.submit("routine", self.task, "waiting")
+
+        submitted = threading.Event()
+        threading.Thread(target=lambda: (work_queue.submit("routine", self.task, "blocked"), submitted.set())).start()
+        self.assertFalse(submitted.wait(timeout=0.2))
+
+        blocker.set()
+        self.assertTrue(submitted.wait(timeout=5))
+        self.wait_for_runs("blocked")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+import unittest
+
+from services import pubsub_codec
+from services.pubsub_codec import (
+    MessageCodec, UnsupportedContentType, CONTENT_TYPE_ATTRIBUTE, CONTENT_ENCODING_ATTRIBUTE, JSON_CONTENT_TYPE,
+    MSGPACK_CONTENT_TYPE, TEXT_CONTENT_TYPE, BYTES_CONTENT_TYPE, ZLIB_ENCODING
+)
+
+MESSAGE = {
+    "user_id": "972501234567",
+    "message_id": "m1",
+    "symptoms": "חום 39 מאתמול, fever since yesterday",
+    "nested": {"ages": [4, 7], "urgent": False, "weight": 17.5, "note": None},
+}
+
+
+class RoundTripTest(unittest.TestCase):
+    def assert_round_trip(self, codec, data=MESSAGE):
+        payload, attributes = codec.encode(data)
+        self.assertEqual(codec.decode(payload, attributes), data)
+        return payload, attributes
+
+    @unittest.skipIf(pubsub_codec.orjson is None, "orjson is not installed")
+    def test_orjson(self):
+        _, attributes = self.assert_round_trip(MessageCodec("orjson"))
+        self.assertEqual(attributes, {CONTENT_TYPE_ATTRIBUTE: JSON_CONTENT_TYPE})
+
+    def test_json(self):
+        payload, _ = self.assert_round_trip(MessageCodec("json"))
+        self.assertEqual(json.loads(payload), MESSAGE)
+
+    @unittest.skipIf(pubsub_codec.msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        _, attributes = self.assert_round_trip(MessageCodec("msgpack", consumer_codecs=("json", "msgpack")))
+        self.assertEqual(attributes[CONTENT_TYPE_ATTRIBUTE], MSGPACK_CONTENT_TYPE)
+
+    @unittest.skipIf(pubsub_codec.msgpack is None, "msgpack is not installed")
+    def test_msgpack_falls_back_to_json_unless_every_consumer_has_it(self):
+        _, attributes = self.assert_round_trip(MessageCodec("msgpack"))
+        self.assertEqual(attributes[CONTENT_TYPE_ATTRIBUTE], JSON_CONTENT_TYPE)
+
+    def test_zlib_above_the_threshold(self):
+        for codec_name in pubsub_codec.available_codecs():
+            codec = MessageCodec(codec_name, compression_threshold=64, consumer_codecs=("json", "msgpack"))
+            _, attributes = self.assert_round_trip(codec, dict(MESSAGE, history="fever " * 200))
+            self.assertEqual(attributes[CONTENT_ENCODING_ATTRIBUTE], ZLIB_ENCODING, codec_name)
+
+            _, attributes = self.assert_round_trip(codec, {"n": 1})
+            self.assertNotIn(CONTENT_ENCODING_ATTRIBUTE, attributes, codec_name)
+
+    def test_text_and_bytes(self):
+        codec = MessageCodec()
+        _, attributes = self.assert_round_trip(codec, "שלום")
+        self.assertEqual(attributes[CONTENT_TYPE_ATTRIBUTE], TEXT_CONTENT_TYPE)
+        _, attributes = self.assert_round_trip(codec, b"\x00\x01")
+        self.assertEqual(attributes[CONTENT_TYPE_ATTRIBUTE], BYTES_CONTENT_TYPE)
+
+
+class LegacyPayloadTest(unittest.TestCase):
+    """Messages from publishers that predate the content-type attribute"""
+
+    def setUp(self):
+        self.codec = MessageCodec()
+
+    def test_plain_json_without_attributes(self):
+        payload = json.dumps(MESSAGE, ensure_ascii=False).encode("utf-8")
+        self.assertEqual(self.codec.decode(payload), MESSAGE)
+        self.assertEqual(self.codec.decode(payload, {"retry_count": "1"}), MESSAGE)
+
+    def test_plain_text_without_attributes(self):
+        self.assertEqual(self.codec.decode("not json".encode("utf-8")), "not json")
+
+    def test_unknown_content_type_or_encoding_is_rejected(self):
+        with self.assertRaises(UnsupportedContentType):
+            self.codec.decode(b"{}", {CONTENT_TYPE_ATTRIBUTE: "application/x-unknown"})
+        with self.assertRaises(UnsupportedContentType):
+            self.codec.decode(b"{}", {CONTENT_ENCODING_ATTRIBUTE: "gzip"})
+
+
+if __name__ == "__main__":
+    unittest.main()
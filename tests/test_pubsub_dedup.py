@@ -0,0 +1,139 @@
+import itertools
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from entities import PUBSUB_BACKEND_MEMORY
+from services import pubsub_dedup
+from services.pubsub_codec import CONTENT_TYPE_ATTRIBUTE
+from services.pubsub_dedup import MessageDedupCache
+from services.pubsub_leases import LeaseExtender
+from services.pubsub_service import PubSubService
+
+_projects = itertools.count(1)
+
+
+class FakeMessage:
+    def __init__(self, message_id, data, attributes=None):
+        self.message_id = message_id
+        self.data = data
+        self.attributes = attributes or {}
+        self.acks = 0
+        self.nacks = 0
+        self.extensions = []
+
+    def ack(self):
+        self.acks += 1
+
+    def nack(self):
+        self.nacks += 1
+
+    def modify_ack_deadline(self, seconds):
+        self.extensions.append(seconds)
+
+
+class DedupCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        mock.patch.object(pubsub_dedup, "time", SimpleNamespace(monotonic=lambda: self.now)).start()
+        self.addCleanup(mock.patch.stopall)
+        self.cache = MessageDedupCache(max_size=3, ttl_seconds=60)
+
+    def test_repeat_within_ttl_is_a_duplicate(self):
+        self.assertFalse(self.cache.check_and_mark("sub:1"))
+        self.now += 59
+        self.assertTrue(self.cache.check_and_mark("sub:1"))
+        self.assertEqual(self.cache.get_stats()["duplicates_suppressed"], 1)
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.check_and_mark("sub:1")
+        self.now += 60
+        self.assertFalse(self.cache.check_and_mark("sub:1"))
+
+    def test_size_is_bounded_by_evicting_the_oldest(self):
+        for index in range(5):
+            self.cache.check_and_mark(f"sub:{index}")
+
+        self.assertEqual(self.cache.get_stats()["size"], 3)
+        self.assertFalse(self.cache.check_and_mark("sub:0"))
+        self.assertTrue(self.cache.check_and_mark("sub:4"))
+
+    def test_forgotten_key_is_accepted_again(self):
+        self.cache.check_and_mark("sub:1")
+        self.cache.forget("sub:1")
+        self.assertFalse(self.cache.check_and_mark("sub:1"))
+
+
+class AcceptMessageTest(unittest.TestCase):
+    def setUp(self):
+        self.service = PubSubService(f"dedup-test-{next(_projects)}", backend=PUBSUB_BACKEND_MEMORY)
+        self.addCleanup(self.service.close, 0.1)
+
+    def test_redelivery_is_acked_and_dropped(self):
+        data, _ = self.service.codec.encode({"n": 1})
+        first, redelivery = FakeMessage("m1", data), FakeMessage("m1", data)
+
+        self.assertEqual(self.service.accept_message(first, "sub")[0], {"n": 1})
+        self.assertIsNone(self.service.accept_message(redelivery, "sub"))
+        self.assertEqual((redelivery.acks, redelivery.nacks), (1, 0))
+        self.assertEqual(self.service.lease_extender.in_flight(), 1)
+
+    def test_undecodable_message_is_not_marked_seen(self):
+        with mock.patch.object(self.service, "_dead_letter", return_value=False):
+            for _ in range(2):
+                message = FakeMessage("m1", b"payload", {CONTENT_TYPE_ATTRIBUTE: "application/x-unknown"})
+                self.assertIsNone(self.service.accept_message(message, "sub"))
+                self.assertEqual((message.acks, message.nacks), (0, 1))
+
+        self.assertEqual(self.service.dedup_cache.get_stats()["size"], 0)
+        self.assertEqual(self.service.lease_extender.in_flight(), 0)
+
+
+class LeaseExtenderTest(unittest.TestCase):
+    def make_extender(self, **kwargs):
+        extender = LeaseExtender(ack_deadline_seconds=2, name="test-lease-extender", **kwargs)
+        self.addCleanup(extender.stop)
+        return extender
+
+    def test_tracked_message_is_extended(self):
+        extender = self.make_extender()
+        message = FakeMessage("m1", b"")
+        extender.track("sub:m1", message)
+
+        time.sleep(1.2)
+        self.assertEqual(message.extensions[:1], [2])
+        self.assertGreaterEqual(extender.get_stats()["extensions_sent"], 1)
+
+    def test_extension_stops_at_max_lease(self):
+        extender = self.make_extender(max_lease_seconds=1)
+        message = FakeMessage("m1", b"")
+        extender.track("sub:m1", message)
+
+        time.sleep(1.2)
+        self.assertEqual(message.extensions, [])
+        self.assertEqual(extender.get_stats()["leases_expired"], 1)
+        self.assertEqual(extender.in_flight(), 0)
+
+    def test_without_extension_leases_are_only_tracked(self):
+        extender = self.make_extender(extend_leases=False)
+        message = FakeMessage("m1", b"")
+        extender.track("sub:m1", message)
+
+        self.assertFalse(extender.wait_idle(timeout=0.05))
+        threading.Timer(0.05, extender.release, ["sub:m1"]).start()
+        self.assertTrue(extender.wait_idle(timeout=2))
+        self.assertEqual(message.extensions, [])
+
+    def test_release_all_returns_what_is_left(self):
+        extender = self.make_extender(extend_leases=False)
+        message = FakeMessage("m1", b"")
+        extender.track("sub:m1", message)
+
+        self.assertEqual(extender.release_all(), [("sub:m1", message)])
+        self.assertTrue(extender.wait_idle(timeout=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import itertools
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+
+from entities import PUBSUB_BACKEND_MEMORY
+from services.pubsub_dispatcher import KeyPartitionedDispatcher
+from services.pubsub_memory_backend import InMemoryBroker
+from services.pubsub_service import PubSubService, HANDLER_ERRORS
+
+_projects = itertools.count(1)
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.01)
+
+
+class DispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.dispatcher = KeyPartitionedDispatcher(num_partitions=4, max_queue_size=2, name="test-dispatcher")
+        self.addCleanup(self.dispatcher.shutdown)
+
+    def test_same_key_runs_in_submit_order(self):
+        runs = {key: [] for key in ("session-a", "session-b", "session-c")}
+
+        def record(key, index):
+            time.sleep(0.001)
+            runs[key].append(index)
+
+        for index in range(20):
+            for key in runs:
+                self.dispatcher.submit(key, record, key, index)
+        self.assertTrue(self.dispatcher.drain(timeout=5))
+
+        for key, indexes in runs.items():
+            self.assertEqual(indexes, list(range(20)), key)
+
+    def test_full_partition_blocks_submit(self):
+        partition = self.dispatcher.partition_for("session-a")
+        release = threading.Event()
+        self.dispatcher.submit("session-a", release.wait, 5)
+        wait_until(lambda: partition.queue.empty())
+        for _ in range(2):
+            self.dispatcher.submit("session-a", lambda: None)
+
+        submitted = threading.Event()
+        submitter = threading.Thread(target=lambda: (self.dispatcher.submit("session-a", lambda: None),
+                                                     submitted.set()))
+        submitter.start()
+        self.assertFalse(submitted.wait(timeout=0.2), "submit returned while the partition was full")
+
+        release.set()
+        self.assertTrue(submitted.wait(timeout=5))
+        submitter.join()
+        self.assertEqual(self.dispatcher.get_stats()[partition.index]["blocked_submits"], 1)
+
+    def test_handler_error_does_not_stop_the_partition(self):
+        ran = []
+
+        def fail():
+            raise ValueError("handler failed")
+
+        self.dispatcher.submit("session-a", fail)
+        self.dispatcher.submit("session-a", ran.append, "after")
+        self.assertTrue(self.dispatcher.drain(timeout=5))
+
+        self.assertEqual(ran, ["after"])
+
+    def test_drain_times_out_on_a_running_handler(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.dispatcher.submit("session-a", release.wait, 5)
+
+        self.assertFalse(self.dispatcher.drain(timeout=0.1))
+
+    def test_shutdown_rejects_new_work(self):
+        self.dispatcher.shutdown()
+
+        with self.assertRaises(RuntimeError):
+            self.dispatcher.submit("session-a", lambda: None)
+
+
+class HandlerOutcomeTest(unittest.TestCase):
+    """How a handler's result or error reaches the Pub/Sub ack, on the memory backend"""
+
+    def setUp(self):
+        self.service = PubSubService(f"dispatcher-test-{next(_projects)}", backend=PUBSUB_BACKEND_MEMORY)
+        self.addCleanup(self.service.close, 1.0)
+        self.subscription_name = "outcome_subscription"
+        self.calls = []
+
+    def subscribe(self, handler):
+        def record(message):
+            self.calls.append(message["n"])
+            return handler(message)
+
+        self.service.subscribe_to_topic("outcome_topic", self.subscription_name, record)
+        self.subscription = InMemoryBroker.default().get_subscription(
+            self.service.subscription_path.format(self.subscription_name)
+        )
+
+    def outstanding(self):
+        with self.subscription.condition:
+            return len(self.subscription.pending) + len(self.subscription.leases)
+
+    def test_raising_handler_is_acked_and_counted(self):
+        def fail(message):
+            raise ValueError("bad message")
+
+        self.subscribe(fail)
+        errors = HANDLER_ERRORS.get(subscription=self.subscription_name)
+        self.service.publish_message("outcome_topic", {"n": 1})
+
+        wait_until(lambda: self.calls and self.service.lease_extender.in_flight() == 0)
+        self.assertEqual(self.outstanding(), 0)
+        self.assertEqual(HANDLER_ERRORS.get(subscription=self.subscription_name), errors + 1)
+        time.sleep(0.1)
+        self.assertEqual(self.calls, [1])
+
+    def test_declined_message_is_acked_without_an_info_log(self):
+        self.subscribe(lambda message: False)
+
+        with self.assertNoLogs("services.pubsub_service", level="INFO"):
+            self.service.publish_message("outcome_topic", {"n": 1})
+            wait_until(lambda: self.calls and self.service.lease_extender.in_flight() == 0)
+        self.assertEqual(self.outstanding(), 0)
+
+    def test_returned_future_holds_the_message_until_it_completes(self):
+        pending = Future()
+        self.subscribe(lambda message: pending)
+        self.service.publish_message("outcome_topic", {"n": 1})
+
+        wait_until(lambda: self.calls)
+        time.sleep(0.1)
+        self.assertEqual(self.service.lease_extender.in_flight(), 1)
+        self.assertEqual(self.outstanding(), 1)
+
+        pending.set_exception(ValueError("analysis failed"))
+        wait_until(lambda: self.service.lease_extender.in_flight() == 0)
+        self.assertEqual(self.outstanding(), 0)
+        self.assertEqual(self.calls, [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import itertools
+import threading
+import time
+import unittest
+
+from entities import PUBSUB_BACKEND_MEMORY
+from services.pubsub_memory_backend import InMemoryBroker
+from services.pubsub_service import PubSubService
+
+_projects = itertools.count(1)
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.01)
+
+
+class DrainTest(unittest.TestCase):
+    """PubSubService.close on the memory backend, with a handler still running when it starts"""
+
+    def setUp(self):
+        self.service = PubSubService(f"drain-test-{next(_projects)}", backend=PUBSUB_BACKEND_MEMORY)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.handled = []
+        self.service.subscribe_to_topic("drain_topic", "drain_subscription", self.handler)
+        self.stream = self.service._active_streaming_futures["drain_topic:drain_subscription"]
+        self.subscription = InMemoryBroker.default().get_subscription(
+            self.service.subscription_path.format("drain_subscription")
+        )
+
+    def handler(self, message):
+        self.handled.append(message["n"])
+        self.started.set()
+        self.release.wait(timeout=10)
+        return True
+
+    def close_in_background(self, drain_timeout):
+        report = {}
+        closer = threading.Thread(target=lambda: report.update(self.service.close(drain_timeout=drain_timeout)))
+        closer.start()
+        wait_until(lambda: self.service._draining)
+        return closer, report
+
+    def outstanding(self):
+        with self.subscription.condition:
+            return len(self.subscription.pending) + len(self.subscription.leases)
+
+    def test_handler_finishing_during_the_drain_is_acked(self):
+        self.service.publish_message("drain_topic", {"n": 1})
+        self.assertTrue(self.started.wait(timeout=5))
+
+        closer, report = self.close_in_background(drain_timeout=5.0)
+        time.sleep(0.2)
+        self.assertTrue(closer.is_alive(), "close returned while the handler was running")
+        # The stream, and with it the client's leaser and ack dispatcher, stays up until the handler is done
+        self.assertFalse(self.stream.cancelled())
+        self.release.set()
+        closer.join(timeout=5)
+
+        self.assertTrue(self.stream.cancelled())
+        self.assertTrue(report["handlers_finished"])
+        self.assertEqual((report["in_flight_at_start"], report["nacked"]), (1, 0))
+        self.assertEqual(self.outstanding(), 0)
+        self.assertEqual(self.handled, [1])
+
+    def test_handler_overrunning_the_drain_is_nacked(self):
+        self.service.publish_message("drain_topic", {"n": 1})
+        self.assertTrue(self.started.wait(timeout=5))
+
+        closer, report = self.close_in_background(drain_timeout=0.3)
+        closer.join(timeout=5)
+        self.release.set()
+
+        self.assertFalse(report["handlers_finished"])
+        self.assertEqual(report["nacked"], 1)
+        with self.subscription.condition:
+            self.assertEqual([envelope.delivery_attempt for envelope in self.subscription.pending], [1])
+
+    def test_messages_arriving_during_the_drain_are_not_handled(self):
+        self.service.publish_message("drain_topic", {"n": 1})
+        self.assertTrue(self.started.wait(timeout=5))
+
+        closer, report = self.close_in_background(drain_timeout=5.0)
+        self.service.publish_message("drain_topic", {"n": 2})
+        time.sleep(0.2)
+        self.release.set()
+        closer.join(timeout=5)
+
+        self.assertEqual(self.handled, [1])
+        self.assertEqual(self.outstanding(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import contextlib
+import io
+import unittest
+
+from all_classes.manager_class import ManagerAgent
+from medical_analyzer.red_flag_matcher import evaluate_corpus
+
+
+class PreTriageTest(unittest.TestCase):
+    """ManagerAgent._pre_triage on messages as the manager receives them"""
+
+    def assert_emergency(self, message, expected):
+        triage = ManagerAgent._pre_triage(dict(message, user_id="user1", message_id="m1"))
+        self.assertEqual(triage.is_emergency, expected, f"{message} -> {triage.reasons}")
+        return triage
+
+    def test_ambiguous_phrases_without_a_red_flag_do_not_alert(self):
+        for symptoms in (
+            "he hit his head yesterday, fine now and playing as usual",
+            "What a stroke of bad luck",
+            "ingested some water the wrong way",
+            "fell from the couch onto the carpet, has a mild cough",
+        ):
+            self.assert_emergency({"chief_complaint": "question", "symptoms": symptoms}, False)
+
+    def test_ambiguous_phrases_with_a_red_flag_alert(self):
+        for symptoms in (
+            "he hit his head and has been vomiting since",
+            "ingested something from under the sink and is now confused",
+            "fell from the top bunk, now very sleepy",
+        ):
+            self.assert_emergency({"symptoms": symptoms}, True)
+
+    def test_commas_end_negation(self):
+        for symptoms in ("Not sure, he fainted", "No, he fainted", "לא יודע, הוא התעלף"):
+            self.assert_emergency({"symptoms": symptoms}, True)
+        self.assert_emergency({"symptoms": "no chest pain, mild cough"}, False)
+
+    def test_field_names_are_not_findings(self):
+        triage = self.assert_emergency({"chief_complaint": "refill", "symptoms": "stroke of luck"}, False)
+        self.assertEqual(triage.categories, [])
+        self.assertTrue(triage.is_medical)
+
+    def test_message_without_case_fields_is_not_medical(self):
+        triage = self.assert_emergency({"message": "thank you!"}, False)
+        self.assertFalse(triage.is_medical)
+
+    def test_vulnerable_patient_alone_is_not_urgent(self):
+        for symptoms, priority in (
+            ("my baby has a mild cough", "routine"),
+            ("תינוק בן חודשיים עם נזלת", "routine"),
+            ("my baby has been vomiting since the morning", "urgent"),
+            ("high fever since yesterday", "urgent"),
+            ("baby is dehydrated and not drinking", "emergency"),
+        ):
+            triage = ManagerAgent._pre_triage({"symptoms": symptoms, "user_id": "user1", "message_id": "m1"})
+            self.assertEqual(triage.priority, priority, f"{symptoms} -> {triage.categories}")
+
+    def test_corpus(self):
+        with contextlib.redirect_stdout(io.StringIO()) as misses:
+            result = evaluate_corpus()
+        self.assertEqual((result["recall"], result["precision"]), (1.0, 1.0), misses.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
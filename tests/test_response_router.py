@@ -0,0 +1,76 @@
+import asyncio
+import queue
+import time
+import unittest
+
+from services.response_router import ResponseRouter
+
+
+class ResponseRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.replies = queue.Queue()
+        self.router = ResponseRouter(self.replies)
+        self.addCleanup(self.router.stop)
+
+    def reply(self, **response):
+        self.replies.put((1, response))
+
+    def wait_for_unmatched(self, count):
+        deadline = time.monotonic() + 5
+        while self.router.unmatched < count:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_reply_goes_to_the_request_with_its_message_id(self):
+        first = self.router.register("m1", "user1")
+        second = self.router.register("m2", "user1")
+
+        self.reply(message_id="m2", user_id="user1", text="second")
+        self.assertEqual(second.result(timeout=5)["text"], "second")
+        self.assertFalse(first.done())
+
+        self.reply(message_id="m1", user_id="user1", text="first")
+        self.assertEqual(first.result(timeout=5)["text"], "first")
+        self.assertEqual((self.router.pending(), self.router.routed_by_user), (0, 0))
+
+    def test_reply_without_a_known_message_id_goes_to_the_users_oldest_request(self):
+        oldest = self.router.register("m1", "user1")
+        newer = self.router.register("m2", "user1")
+        other_user = self.router.register("m3", "user2")
+
+        self.reply(user_id="user1", text="no id")
+        self.assertEqual(oldest.result(timeout=5)["text"], "no id")
+        self.reply(message_id="unknown", user_id="user1", text="unknown id")
+        self.assertEqual(newer.result(timeout=5)["text"], "unknown id")
+
+        self.assertFalse(other_user.done())
+        self.assertEqual(self.router.routed_by_user, 2)
+
+    def test_reply_for_nobody_is_dropped(self):
+        request = self.router.register("m1", "user1")
+
+        self.reply(message_id="m9", user_id="user2")
+        self.reply(text="no ids at all")
+        self.wait_for_unmatched(2)
+        self.assertFalse(request.done())
+
+    def test_discarded_request_gets_no_reply(self):
+        discarded = self.router.register("m1", "user1")
+        waiting = self.router.register("m2", "user1")
+        self.router.discard("m1")
+
+        self.reply(user_id="user1", text="reply")
+        self.assertEqual(waiting.result(timeout=5)["text"], "reply")
+        self.assertFalse(discarded.done())
+
+    def test_async_request(self):
+        async def request():
+            future = self.router.register_async("m1", "user1")
+            self.reply(message_id="m1", text="async")
+            return await asyncio.wait_for(future, timeout=5)
+
+        self.assertEqual(asyncio.run(request())["text"], "async")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,198 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from all_classes import session_store_class
+from all_classes.active_session_class import ActiveSession
+from all_classes.manager_class import ManagerAgent, SESSION_BUILD_STRIPES
+from all_classes.session_store_class import SessionStore
+
+
+class FakeSession:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.pending_work = 0
+        self.cleaned_up = False
+
+    def hold(self):
+        self.pending_work += 1
+
+    def release(self):
+        self.pending_work -= 1
+
+    def is_busy(self):
+        return self.pending_work > 0
+
+    def cleanup(self):
+        self.cleaned_up = True
+
+
+class SessionStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        mock.patch.object(session_store_class, "time", SimpleNamespace(monotonic=lambda: self.now)).start()
+        self.addCleanup(mock.patch.stopall)
+        self.evicted = []
+        self.store = SessionStore(max_sessions=2, idle_ttl_seconds=60, sweep_interval_seconds=3600,
+                                  name="test-sessions", on_evict=lambda *args: self.evicted.append(args))
+        self.addCleanup(self.store.stop)
+
+    def put(self, session_id):
+        session = FakeSession(session_id)
+        self.store.put(session_id, session)
+        return session
+
+    def test_idle_sessions_expire(self):
+        first = self.put("first")
+        self.now += 30
+        self.put("second")
+        self.now += 40
+
+        self.assertEqual(self.store.evict_idle(), 1)
+        self.assertEqual(self.store.session_ids(), ["second"])
+        self.assertTrue(first.cleaned_up)
+        self.assertEqual(self.evicted, [("first", first, "ttl")])
+
+    def test_access_renews_the_ttl(self):
+        self.put("first")
+        self.now += 50
+        self.store.get("first")
+        self.now += 50
+
+        self.assertEqual(self.store.evict_idle(), 0)
+        self.assertIn("first", self.store)
+
+    def test_least_recently_used_makes_room(self):
+        self.put("first")
+        second = self.put("second")
+        self.store.get("first")
+        self.put("third")
+
+        self.assertEqual(self.store.session_ids(), ["first", "third"])
+        self.assertTrue(second.cleaned_up)
+        self.assertEqual(self.store.get_stats()["evicted_lru"], 1)
+
+    def test_busy_sessions_are_never_evicted(self):
+        busy = self.put("busy")
+        busy.hold()
+        self.put("second")
+        self.put("third")
+        self.now += 120
+
+        self.assertIn("busy", self.store)
+        self.store.evict_idle()
+        self.assertEqual(self.store.session_ids(), ["busy"])
+        self.assertEqual(self.store.evict_matching(lambda session_id: True, "handoff"), 1)
+        self.assertFalse(busy.cleaned_up)
+
+        busy.release()
+        self.store.evict_idle()
+        self.assertEqual(len(self.store), 0)
+
+    def test_store_stays_over_capacity_when_every_session_is_busy(self):
+        for session_id in ("first", "second", "third"):
+            self.put(session_id).hold()
+
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.evicted, [])
+
+    def test_hold_keeps_an_active_session(self):
+        with mock.patch("all_classes.active_session_class.MongoConnection"):
+            session = ActiveSession("held", "user1")
+        self.store.put("held", session)
+        self.assertTrue(self.store.hold("held", session))
+        self.put("second")
+        self.put("third")
+        self.now += 120
+        self.store.evict_idle()
+
+        self.assertEqual(self.store.session_ids(), ["held"])
+        session.release()
+        self.store.evict_idle()
+        self.assertNotIn("held", self.store)
+
+    def test_hold_fails_once_evicted(self):
+        session = self.put("first")
+        self.now += 120
+        self.store.evict_idle()
+
+        self.assertFalse(self.store.hold("first", session))
+        self.assertFalse(session.is_busy())
+
+
+class SessionBuildTest(unittest.TestCase):
+    """ManagerAgent.get_or_create_session builds each user's session once, however many messages race for it"""
+
+    def setUp(self):
+        self.manager = object.__new__(ManagerAgent)
+        self.manager.active_sessions = SessionStore(max_sessions=100, idle_ttl_seconds=600, name="test-builds")
+        self.addCleanup(self.manager.active_sessions.stop)
+        self.manager._session_builds = [(threading.Lock(), {}) for _ in range(SESSION_BUILD_STRIPES)]
+        self.builds = []
+        self.gates = {}
+        self.manager._build_session = self.build_session
+
+    def build_session(self, hashed_user_id, user_id):
+        self.builds.append(user_id)
+        gate = self.gates.get(user_id)
+        if gate is not None:
+            gate.wait(timeout=5)
+        if user_id == "failing":
+            raise RuntimeError("Mongo unavailable")
+        session = FakeSession(hashed_user_id)
+        self.manager.active_sessions.put(hashed_user_id, session)
+        return session
+
+    def run_concurrently(self, user_ids):
+        results = [None] * len(user_ids)
+
+        def run(index, user_id):
+            try:
+                results[index] = self.manager.get_or_create_session(user_id)
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=run, args=item) for item in enumerate(user_ids)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_concurrent_first_messages_build_once(self):
+        self.gates["user1"] = gate = threading.Event()
+        threads, results = self.run_concurrently(["user1"] * 10)
+        time.sleep(0.1)
+        gate.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(self.builds, ["user1"])
+        self.assertEqual(len({id(session) for session in results}), 1)
+        self.assertIs(self.manager.get_or_create_session("user1"), results[0])
+
+    def test_other_users_are_not_blocked_by_a_slow_build(self):
+        self.gates["slow"] = gate = threading.Event()
+        self.addCleanup(gate.set)
+        threads, _ = self.run_concurrently(["slow"])
+
+        self.assertIsInstance(self.manager.get_or_create_session("fast"), FakeSession)
+        self.assertTrue(threads[0].is_alive())
+
+    def test_failed_build_reaches_every_waiter_and_is_retried(self):
+        self.gates["failing"] = gate = threading.Event()
+        threads, results = self.run_concurrently(["failing"] * 3)
+        time.sleep(0.1)
+        gate.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(self.builds, ["failing"])
+        with self.assertRaises(RuntimeError):
+            self.manager.get_or_create_session("failing")
+        self.assertEqual(self.builds, ["failing", "failing"])
+
+
+if __name__ == "__main__":
+    unittest.main()
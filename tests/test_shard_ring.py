@@ -0,0 +1,87 @@
+import unittest
+
+from helper_methods import hash_user_id
+from services.shard_ring import ConsistentHashRing, ShardAssignment
+
+USERS = [hash_user_id(f"97250{index:07d}") for index in range(20000)]
+
+
+def owners(ring):
+    return {user: ring.shard_for(user) for user in USERS}
+
+
+class ConsistentHashRingTest(unittest.TestCase):
+    def assert_moved_fraction(self, before, after, expected):
+        moved = [user for user in USERS if before[user] != after[user]]
+        self.assertAlmostEqual(len(moved) / len(USERS), expected, delta=expected * 0.25)
+        return moved
+
+    def test_adding_a_shard_moves_about_one_in_n_plus_one_users_onto_it(self):
+        for shard_count in (1, 2, 4, 7):
+            before = owners(ConsistentHashRing.of_size(shard_count))
+            after = owners(ConsistentHashRing.of_size(shard_count + 1))
+
+            moved = self.assert_moved_fraction(before, after, 1 / (shard_count + 1))
+            self.assertEqual({after[user] for user in moved}, {shard_count}, shard_count)
+
+    def test_removing_a_shard_only_moves_its_users(self):
+        for shard_count in (2, 4, 8):
+            before = owners(ConsistentHashRing.of_size(shard_count))
+            after = owners(ConsistentHashRing.of_size(shard_count - 1))
+
+            moved = self.assert_moved_fraction(before, after, 1 / shard_count)
+            self.assertEqual({before[user] for user in moved}, {shard_count - 1}, shard_count)
+
+    def test_removing_a_middle_shard_only_moves_its_users(self):
+        before = owners(ConsistentHashRing([0, 1, 2, 3]))
+        after = owners(ConsistentHashRing([0, 1, 3]))
+
+        moved = self.assert_moved_fraction(before, after, 1 / 4)
+        self.assertEqual({before[user] for user in moved}, {2})
+
+    def test_users_are_spread_evenly(self):
+        counts = {}
+        for shard in owners(ConsistentHashRing.of_size(4)).values():
+            counts[shard] = counts.get(shard, 0) + 1
+
+        for shard in range(4):
+            self.assertAlmostEqual(counts[shard] / len(USERS), 1 / 4, delta=0.05, msg=counts)
+
+
+class ShardAssignmentTest(unittest.TestCase):
+    def test_each_user_is_owned_by_exactly_one_shard(self):
+        shards = [ShardAssignment(index, 3) for index in range(3)]
+
+        for user in USERS[:1000]:
+            self.assertEqual(sum(shard.owns(user) for shard in shards), 1)
+
+    def test_single_shard_owns_everything(self):
+        shard = ShardAssignment()
+
+        self.assertTrue(all(shard.owns(user) for user in USERS[:1000]))
+        self.assertEqual(shard.subscription_suffix, "")
+
+    def test_rebalance_keeps_the_subscription_and_hands_users_over(self):
+        shard = ShardAssignment(1, 2)
+        owned = {user for user in USERS if shard.owns(user)}
+
+        self.assertTrue(shard.rebalance(3))
+        self.assertEqual(shard.subscription_suffix, "_shard1")
+        self.assertLess({user for user in USERS if shard.owns(user)}, owned)
+
+    def test_shard_rebalanced_out_of_the_ring_owns_nothing(self):
+        shard = ShardAssignment(2, 3)
+
+        self.assertFalse(shard.rebalance(2))
+        self.assertFalse(any(shard.owns(user) for user in USERS[:1000]))
+
+    def test_invalid_shard_counts_are_rejected(self):
+        for shard_count in (0, -1, 1.5, True, "2"):
+            with self.assertRaises(ValueError):
+                ShardAssignment(0, shard_count)
+        with self.assertRaises(ValueError):
+            ShardAssignment(3, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
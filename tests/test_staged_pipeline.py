@@ -0,0 +1,84 @@
+import threading
+import unittest
+
+from all_classes.manager_class import _CaseJob
+from services.staged_pipeline import PipelineStage, StagedPipeline
+
+
+class StagedPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.ran = []
+        self.ran_lock = threading.Lock()
+        self.pipeline = StagedPipeline("test-pipeline", [
+            PipelineStage("first", self.stage("first"), 2, 0, 10),
+            PipelineStage("second", self.stage("second"), 2, 0, 10),
+            PipelineStage("last", self.last_stage, 2, 0, 10),
+        ], key=lambda job: job.session_id, on_error=lambda job, error: job.finish(error))
+        self.addCleanup(self.pipeline.shutdown, 1.0)
+
+    def stage(self, name):
+        def run(job):
+            with self.ran_lock:
+                self.ran.append((name, job.message["n"]))
+            if job.message.get("fail") == name:
+                raise ValueError(f"{name} failed")
+            return job
+        return run
+
+    def last_stage(self, job):
+        self.stage("last")(job)
+        job.finish(job.error)
+
+    def submit(self, message, user_id="user1", priority="routine"):
+        job = _CaseJob(user_id, message, None, priority)
+        self.pipeline.submit("first", job, priority)
+        return job.waiters[0]
+
+    def test_job_runs_every_stage_and_finishes(self):
+        self.assertTrue(self.submit({"n": 1}).result(timeout=5))
+
+        self.assertEqual(self.ran, [("first", 1), ("second", 1), ("last", 1)])
+
+    def test_stage_error_skips_the_remaining_stages_and_finishes_the_job(self):
+        waiter = self.submit({"n": 1, "fail": "first"})
+
+        with self.assertRaisesRegex(ValueError, "first failed"):
+            waiter.result(timeout=5)
+        self.pipeline.shutdown(timeout=5)
+        self.assertEqual(self.ran, [("first", 1)])
+
+    def test_error_does_not_affect_the_next_job_of_the_session(self):
+        failed = self.submit({"n": 1, "fail": "second"})
+        succeeded = self.submit({"n": 2})
+
+        with self.assertRaises(ValueError):
+            failed.result(timeout=5)
+        self.assertTrue(succeeded.result(timeout=5))
+        self.assertEqual([name for name, n in self.ran if n == 1], ["first", "second"])
+        self.assertEqual([name for name, n in self.ran if n == 2], ["first", "second", "last"])
+
+    def test_jobs_of_a_session_keep_their_order_at_every_stage(self):
+        waiters = [self.submit({"n": n}) for n in range(10)]
+        for waiter in waiters:
+            waiter.result(timeout=5)
+
+        for stage in ("first", "second", "last"):
+            self.assertEqual([n for name, n in self.ran if name == stage], list(range(10)), stage)
+
+    def test_without_on_error_the_exception_propagates(self):
+        pipeline = StagedPipeline("bare-pipeline", [PipelineStage("only", self.stage("only"), 1, 0, 10)])
+        self.addCleanup(pipeline.shutdown, 1.0)
+        job = _CaseJob("user1", {"n": 1, "fail": "only"}, None, "routine")
+
+        with self.assertRaises(ValueError):
+            pipeline.run("only", job)
+
+    def test_after_shutdown_jobs_run_inline(self):
+        self.pipeline.shutdown(timeout=5)
+
+        self.assertTrue(self.submit({"n": 1}).result(timeout=0))
+        self.assertEqual(self.ran, [("first", 1), ("second", 1), ("last", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()